@@ -0,0 +1,113 @@
+"""
+Memoized Amnesia Mode assessments.
+LLM assessments are keyed by the fingerprints of the original solution and
+the reconstruction (comments and formatting ignored), so a repeat check
+returns without a model call. Entries live in an in-process LRU with a TTL
+and are persisted to Firestore through the write-behind queue; a miss in
+memory falls through to Firestore, so the cache survives restarts and is
+shared by every instance. Expired documents are ignored on read and can be
+reaped with a Firestore TTL policy on `expiresAt`.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Tuple
+
+from memory_prescore import SolutionProfile
+from persistence import FirestoreWriteQueue
+
+logger = logging.getLogger(__name__)
+
+ASSESSMENT_FIELDS = ("logicScore", "keyConcepts", "missedConcepts", "feedback")
+
+
+class AssessmentCache:
+    """TTL + LRU cache of LLM assessments, backed by a Firestore collection"""
+
+    def __init__(
+        self,
+        collection: Any = None,
+        write_queue: Optional[FirestoreWriteQueue] = None,
+        max_entries: int = 5000,
+        ttl: float = 30 * 24 * 3600,
+    ):
+        self.collection = collection
+        self.write_queue = write_queue
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self.stats = {"hits": 0, "persistentHits": 0, "misses": 0, "stores": 0, "evictions": 0, "readErrors": 0}
+
+    @classmethod
+    def from_env(cls, db: Any, write_queue: FirestoreWriteQueue) -> "AssessmentCache":
+        """Build a cache from ASSESSMENT_CACHE_* environment variables"""
+        persist = os.getenv("ASSESSMENT_CACHE_PERSIST", "true").lower() != "false"
+        return cls(
+            collection=db.collection("amnesiaAssessmentCache") if persist else None,
+            write_queue=write_queue if persist else None,
+            max_entries=int(os.getenv("ASSESSMENT_CACHE_MAX_ENTRIES", 5000)),
+            ttl=float(os.getenv("ASSESSMENT_CACHE_TTL_DAYS", 30)) * 24 * 3600,
+        )
+
+    @staticmethod
+    def key(original: SolutionProfile, reconstruction: SolutionProfile) -> str:
+        return f"{original.fingerprint[:32]}-{reconstruction.fingerprint[:32]}"
+
+    def snapshot(self) -> dict:
+        return {"entries": len(self._entries), **self.stats}
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.time():
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return dict(entry[0])
+        if entry is not None:
+            del self._entries[key]
+
+        result = await self._load(key)
+        if result is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["persistentHits"] += 1
+        return dict(result)
+
+    async def _load(self, key: str) -> Optional[dict]:
+        if self.collection is None:
+            return None
+        try:
+            snapshot = await asyncio.to_thread(self.collection.document(key).get)
+            data = snapshot.to_dict() if snapshot.exists else None
+        except Exception as e:
+            self.stats["readErrors"] += 1
+            logger.warning(f"Assessment cache read failed: {e}")
+            return None
+        if not isinstance(data, dict) or not all(field in data for field in ASSESSMENT_FIELDS):
+            return None
+        expires_at = data.get("expiresAt")
+        if not isinstance(expires_at, datetime) or expires_at <= datetime.now(timezone.utc):
+            return None
+        result = {field: data[field] for field in ASSESSMENT_FIELDS}
+        self._remember(key, result, expires_at.timestamp())
+        return result
+
+    async def put(self, key: str, result: dict) -> None:
+        result = {field: result[field] for field in ASSESSMENT_FIELDS}
+        expires_at = time.time() + self.ttl
+        self._remember(key, result, expires_at)
+        self.stats["stores"] += 1
+        if self.collection is not None:
+            await self.write_queue.set(self.collection.document(key), {
+                **result,
+                "expiresAt": datetime.now(timezone.utc) + timedelta(seconds=self.ttl),
+            })
+
+    def _remember(self, key: str, result: dict, expires_at: float) -> None:
+        self._entries[key] = (result, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
@@ -0,0 +1,175 @@
+"""
+Verified Firebase ID token cache.
+Decoded tokens are kept in a bounded LRU keyed by a SHA-256 of the raw token
+and expire no later than the token's own `exp` claim. A background task keeps
+Google's signing certificates warm so a cold cert fetch never lands on a
+user request.
+
+The SDK keeps the certificates in the HTTP cache of its token verifier's
+transport, which firebase_admin doesn't expose, so the prefetch goes through
+that transport (SDK_CERT_TRANSPORT). This is why firebase-admin is pinned in
+requirements.txt. The transport is looked up once at start(); if it isn't
+there (an upgrade moved it, or no default app), the prefetch stays off with
+a startup warning and tokens are still verified, only with the occasional
+cold certificate fetch.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from firebase_admin import auth
+
+logger = logging.getLogger(__name__)
+
+ID_TOKEN_CERT_URI = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+# Where firebase-admin 6.5 keeps the cache-aware transport verify_id_token fetches certificates with
+SDK_CERT_TRANSPORT = ("_token_verifier", "request")
+
+
+class CertPrefetchUnsupported(Exception):
+    """Raised when the installed firebase_admin doesn't keep its certificate transport where expected"""
+
+
+def sdk_cert_transport() -> Callable[..., Any]:
+    """The default app's certificate transport, shared with verify_id_token"""
+    get_client = getattr(auth, "_get_client", None)
+    if get_client is None:
+        raise CertPrefetchUnsupported("firebase_admin.auth has no _get_client")
+    try:
+        transport = get_client(None)
+    except Exception as e:
+        raise CertPrefetchUnsupported(f"no auth client for the default app: {e}") from e
+    for name in SDK_CERT_TRANSPORT:
+        transport = getattr(transport, name, None)
+    if not callable(transport):
+        raise CertPrefetchUnsupported("firebase_admin's token verifier has no certificate transport")
+    return transport
+
+
+class VerifiedTokenCache:
+    """Bounded LRU/TTL cache in front of auth.verify_id_token"""
+
+    def __init__(
+        self,
+        verify: Callable[[str], Dict[str, Any]] = auth.verify_id_token,
+        max_entries: int = 10000,
+        max_ttl: float = 600.0,
+        cert_refresh_interval: float = 1800.0,
+        cert_transport: Callable[[], Callable[..., Any]] = sdk_cert_transport,
+    ):
+        self._verify = verify
+        self._cert_transport = cert_transport
+        self._request: Optional[Callable[..., Any]] = None
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.cert_refresh_interval = cert_refresh_interval
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.cert_prefetch = False
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "certRefreshes": 0}
+
+    @classmethod
+    def from_env(cls) -> "VerifiedTokenCache":
+        """Build a cache from AUTH_CACHE_* environment variables"""
+        return cls(
+            max_entries=int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000)),
+            max_ttl=float(os.getenv("AUTH_CACHE_MAX_TTL_SECONDS", 600)),
+            cert_refresh_interval=float(os.getenv("AUTH_CERT_REFRESH_SECONDS", 1800)),
+        )
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return the cached decoded token, or None on miss/expiry"""
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        expires_at, decoded = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return decoded
+
+    def put(self, token: str, decoded: Dict[str, Any]) -> None:
+        expires_at = time.time() + self.max_ttl
+        if "exp" in decoded:
+            expires_at = min(expires_at, float(decoded["exp"]))
+        if expires_at <= time.time():
+            return
+        key = self._key(token)
+        self._entries[key] = (expires_at, decoded)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Verify a token, serving repeat callers from the cache"""
+        decoded = self.get(token)
+        if decoded is not None:
+            return decoded
+        decoded = await asyncio.to_thread(self._verify, token)
+        self.put(token, decoded)
+        return decoded
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "size": len(self._entries),
+            "hitRate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "certPrefetch": self.cert_prefetch,
+            **self.stats,
+        }
+
+    def start(self) -> None:
+        if self._refresh_task is not None:
+            return
+        try:
+            self._request = self._cert_transport()
+        except CertPrefetchUnsupported as e:
+            logger.warning(
+                f"Signing certificate prefetch disabled: {e}. "
+                "Tokens are still verified; the SDK fetches certificates on demand"
+            )
+            return
+        self.cert_prefetch = True
+        self._refresh_task = asyncio.create_task(self._refresh_certs_loop())
+
+    async def stop(self) -> None:
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def _fetch_certs(self) -> None:
+        # no-cache forces a revalidation instead of a cache read
+        response = self._request(ID_TOKEN_CERT_URI, method="GET", headers={"Cache-Control": "no-cache"})
+        if response.status != 200:
+            raise RuntimeError(f"certificate fetch returned HTTP {response.status}")
+
+    async def _refresh_certs_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self._fetch_certs)
+                self.stats["certRefreshes"] += 1
+                logger.info("Refreshed Firebase ID token signing certificates")
+                delay = self.cert_refresh_interval
+            except Exception as e:
+                logger.warning(f"Signing certificate prefetch failed: {e}")
+                delay = min(60.0, self.cert_refresh_interval)
+            await asyncio.sleep(delay)
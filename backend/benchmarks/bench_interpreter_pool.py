@@ -0,0 +1,76 @@
+"""
+p50/p99 latency of small snippets: spawn-per-request vs warm InterpreterPool.
+
+The spawn path mirrors the original execute_code: write the source to a file,
+then subprocess.run the interpreter on it.
+
+    python benchmarks/bench_interpreter_pool.py --runs 100
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from interpreter_pool import InterpreterPool  # noqa: E402
+
+SNIPPETS = {
+    "python": ("py", ["python3"], "n = int(input())\nprint(sum(range(n)))\n"),
+    "javascript": ("js", ["node"], "const n = parseInt(require('fs').readFileSync(0, 'utf8'));\n"
+                                   "let s = 0; for (let i = 0; i < n; i++) s += i;\nconsole.log(s);\n"),
+}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(label, samples):
+    print(f"{label:<28} p50 {percentile(samples, 50) * 1000:7.1f} ms   "
+          f"p99 {percentile(samples, 99) * 1000:7.1f} ms   mean {statistics.mean(samples) * 1000:7.1f} ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--gap", type=float, default=0.05, help="idle time between requests")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_exec_")
+    for language, (ext, argv, code) in SNIPPETS.items():
+        spawn = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            path = os.path.join(workdir, f"job.{ext}")
+            with open(path, "w") as f:
+                f.write(code)
+            result = subprocess.run(argv + [path], input="1000\n", capture_output=True, text=True, timeout=10)
+            spawn.append(time.perf_counter() - start)
+            assert result.stdout.strip() == "499500", result
+            await asyncio.sleep(args.gap)
+
+        pool = InterpreterPool(language, size=args.pool_size)
+        await pool.start()
+        warm = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            result = await pool.run(code, "1000\n", timeout=10)
+            warm.append(time.perf_counter() - start)
+            assert result.stdout.strip() == "499500", result
+            await asyncio.sleep(args.gap)
+        await pool.stop()
+
+        report(f"{language} spawn-per-request", spawn)
+        report(f"{language} warm pool", warm)
+        print(f"{'':<28} pool stats {pool.stats}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,110 @@
+"""
+Concurrent-request throughput per worker: blocking Groq client vs LLMClient.
+
+Runs a local stub of the chat completions API that answers after a fixed
+delay, then fires N concurrent "handler" coroutines on one event loop.
+
+    python benchmarks/bench_llm_concurrency.py --requests 50 --latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from groq import Groq  # noqa: E402
+from llm import LLMClient  # noqa: E402
+
+COMPLETION = {
+    "id": "bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [{
+        "index": 0,
+        "finish_reason": "stop",
+        "message": {"role": "assistant", "content": "{\"text\": \"ok\"}"},
+    }],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+def start_stub(latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            body = json.dumps(COMPLETION).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def probe_health(stop: asyncio.Event, samples: list) -> None:
+    """Measure how long a trivial coroutine (like /health) waits for the loop"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0)
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+
+async def run(label: str, handler, n: int) -> None:
+    stop = asyncio.Event()
+    samples: list = []
+    probe = asyncio.create_task(probe_health(stop, samples))
+    start = time.perf_counter()
+    await asyncio.gather(*(handler() for _ in range(n)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+    worst = max(samples) * 1000 if samples else float("nan")
+    print(f"{label:<10} {n} requests in {elapsed:6.2f}s -> {n / elapsed:7.2f} req/s, "
+          f"worst /health loop wait {worst:8.1f} ms")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    server = start_stub(args.latency)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    messages = [{"role": "user", "content": "hi"}]
+
+    blocking = Groq(api_key="bench", base_url=base_url)
+
+    async def blocking_handler():
+        blocking.chat.completions.create(model="stub", messages=messages)
+
+    pooled = LLMClient(api_key="bench", base_url=base_url, max_concurrency=args.requests)
+
+    async def async_handler():
+        await pooled.complete(messages, model="stub")
+
+    await run("before", blocking_handler, args.requests)
+    await run("after", async_handler, args.requests)
+    await pooled.aclose()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+"""
+Tail latency and error rate of LLM calls: one LLMClient vs the LLMGateway.
+
+Starts local stubs of the chat completions API that inject latency and
+errors: most answers take --latency seconds, --slow-rate of them take
+--slow-latency, and --error-rate of them fail with a 429 or 503. The primary
+stub can be made to fail outright with --primary-down to exercise the
+circuit breaker. The same request mix is sent through a single client on the
+primary and through a gateway over the primary and a secondary stub.
+
+    python benchmarks/bench_llm_gateway.py --requests 400 --slow-rate 0.03 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm import LLMClient  # noqa: E402
+from llm_gateway import Backend, CircuitBreaker, LLMGateway  # noqa: E402
+
+COMPLETION = {
+    "id": "bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [{
+        "index": 0,
+        "finish_reason": "stop",
+        "message": {"role": "assistant", "content": "{\"text\": \"ok\"}"},
+    }],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+def start_stub(latency: float, slow_latency: float, slow_rate: float, error_rate: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if random.random() < error_rate:
+                time.sleep(latency / 4)
+                status, body = random.choice([429, 503]), json.dumps({"error": {"message": "injected"}}).encode()
+            else:
+                time.sleep(slow_latency if random.random() < slow_rate else latency)
+                status, body = 200, json.dumps(COMPLETION).encode()
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The losing side of a hedge was cancelled
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run(label: str, client, requests: int, concurrency: int) -> None:
+    messages = [{"role": "user", "content": "hi"}]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await client.complete(messages, model="stub", timeout=10)
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    ms = [sample * 1000 for sample in latencies] or [float("nan")]
+    print(f"{label:<8} ok={len(latencies):4d} errors={errors:4d}  p50={percentile(ms, 50):7.1f} ms  "
+          f"p95={percentile(ms, 95):7.1f} ms  p99={percentile(ms, 99):7.1f} ms  max={max(ms):7.1f} ms")
+
+
+def client(base_url: str) -> LLMClient:
+    # Retries happen in the gateway, not in the SDK
+    return LLMClient(api_key="bench", base_url=base_url, max_concurrency=256, max_retries=0)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=1.5)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--primary-down", action="store_true")
+    args = parser.parse_args()
+
+    primary = start_stub(args.latency, args.slow_latency, args.slow_rate, 1.0 if args.primary_down else args.error_rate)
+    secondary = start_stub(args.latency, args.slow_latency, args.slow_rate, args.error_rate)
+    primary_url = f"http://127.0.0.1:{primary.server_address[1]}"
+    secondary_url = f"http://127.0.0.1:{secondary.server_address[1]}"
+
+    single = client(primary_url)
+    await run("before", single, args.requests, args.concurrency)
+    await single.aclose()
+
+    gateway = LLMGateway(
+        [Backend("primary", client(primary_url), CircuitBreaker(reset_timeout=5)),
+         Backend("secondary", client(secondary_url), CircuitBreaker(reset_timeout=5))],
+        hedge_initial_delay=args.latency * 4,
+    )
+    # Warm the latency history the hedge delay is taken from
+    await run("warmup", gateway, 100, args.concurrency)
+    await run("after", gateway, args.requests, args.concurrency)
+    stats = gateway.stats()
+    print(f"gateway  hedges={stats['hedges']} hedgeWins={stats['hedgeWins']} failovers={stats['failovers']} "
+          f"hedgeDelayMs={stats['hedgeDelayMs']} breakers={[b['state'] for b in stats['backends'].values()]}")
+    await gateway.aclose()
+    primary.shutdown()
+    secondary.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
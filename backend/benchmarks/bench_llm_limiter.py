@@ -0,0 +1,142 @@
+"""
+Classroom spike against a rate-limited provider: no limit vs AdaptiveLimiter.
+
+Runs a local stub of the chat completions API that serves at most
+--capacity requests at once and answers anything beyond that with a 429,
+then fires --requests calls at the same moment, a third of them hint
+unlocks (priority 0) and the rest memory checks (priority 2). Without a
+limit every call goes straight out and most bounce off the provider; with
+the limiter the overflow waits in the queue, hints first.
+
+    python benchmarks/bench_llm_limiter.py --requests 200 --capacity 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm import LLMClient  # noqa: E402
+from llm_gateway import Backend, CircuitBreaker, LLMGateway  # noqa: E402
+from llm_limiter import AdaptiveLimiter  # noqa: E402
+
+COMPLETION = {
+    "id": "bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [{
+        "index": 0,
+        "finish_reason": "stop",
+        "message": {"role": "assistant", "content": "{\"text\": \"ok\"}"},
+    }],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+def start_stub(latency: float, capacity: int) -> ThreadingHTTPServer:
+    lock = threading.Lock()
+    active = [0]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                admitted = active[0] < capacity
+                if admitted:
+                    active[0] += 1
+            if admitted:
+                time.sleep(latency)
+                with lock:
+                    active[0] -= 1
+                status, body = 200, json.dumps(COMPLETION).encode()
+            else:
+                status, body = 429, json.dumps({"error": {"message": "rate limited"}}).encode()
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(samples, pct):
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run(label: str, gateway: LLMGateway, requests: int, timeout: float) -> None:
+    messages = [{"role": "user", "content": "hi"}]
+    results = {0: [], 2: []}
+    failures = {0: 0, 2: 0}
+
+    async def one(priority: int):
+        start = time.perf_counter()
+        try:
+            await gateway.complete(messages, model="stub", timeout=timeout, priority=priority)
+        except Exception:
+            failures[priority] += 1
+            return
+        results[priority].append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one(0 if i % 3 == 0 else 2) for i in range(requests)))
+    for priority, name in ((0, "hints"), (2, "memory")):
+        ms = results[priority]
+        print(f"{label:<9} {name:<7} ok={len(ms):4d} failed={failures[priority]:4d}  "
+              f"p50={percentile(ms, 50):7.1f} ms  p95={percentile(ms, 95):7.1f} ms")
+    limiter = gateway.backends[0].limiter.snapshot()
+    print(f"{label:<9} limiter limit={limiter['limit']} throttled={limiter['throttled']} queued={limiter['queued']}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--capacity", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--timeout", type=float, default=20)
+    args = parser.parse_args()
+
+    server = start_stub(args.latency, args.capacity)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def gateway(limiter: AdaptiveLimiter) -> LLMGateway:
+        client = LLMClient(api_key="bench", base_url=base_url, max_concurrency=1000,
+                           max_connections=1000, max_retries=1)
+        # One backend and no breaker trips, so only the limiter differs between runs
+        breaker = CircuitBreaker(failure_threshold=10 ** 9)
+        return LLMGateway([Backend("stub", client, breaker, limiter=limiter)], max_attempts=1,
+                          hedge_initial_delay=args.timeout)
+
+    unlimited = gateway(AdaptiveLimiter(initial=10 ** 6, max_limit=10 ** 6))
+    await run("unlimited", unlimited, args.requests, args.timeout)
+    await unlimited.aclose()
+
+    adaptive = gateway(AdaptiveLimiter(initial=8, max_limit=64))
+    await run("adaptive", adaptive, args.requests, args.timeout)
+    await run("adaptive", adaptive, args.requests, args.timeout)
+    await adaptive.aclose()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+"""
+Equivalence check and micro-benchmark for the precompiled phrase matcher.
+
+Replays the original per-category `any(p in msg_lower for p in ...)` scans
+against PhraseMatcher.classify on a hand-written corpus of edge cases plus
+randomly spliced messages, fails loudly on any difference, then times both.
+
+    python benchmarks/bench_phrase_matcher.py --fuzz 20000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import phrase_matcher  # noqa: E402
+from tests.phrase_corpus import CORPUS, fuzz_messages, legacy_classify  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fuzz", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    messages = [m.lower().strip() for m in CORPUS]
+    messages += [m.lower().strip() for m in fuzz_messages(args.fuzz)]
+
+    for msg in messages:
+        expected = legacy_classify(msg)
+        actual = phrase_matcher.matcher.classify(msg)
+        assert expected == actual, f"{msg!r}: legacy={sorted(expected)} compiled={sorted(actual)}"
+    print(f"equivalent on {len(messages)} messages ({len(CORPUS)} corpus + {args.fuzz} fuzzed)")
+
+    sample = [m.lower().strip() for m in CORPUS]
+    legacy = timeit.timeit(lambda: [legacy_classify(m) for m in sample], number=args.repeat)
+    compiled = timeit.timeit(lambda: [phrase_matcher.matcher.classify(m) for m in sample], number=args.repeat)
+    per_msg = args.repeat * len(sample)
+    print(f"legacy any() scans: {legacy / per_msg * 1e6:7.2f} us/message")
+    print(f"compiled matcher  : {compiled / per_msg * 1e6:7.2f} us/message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Per-request auth overhead: uncached RS256 verification vs VerifiedTokenCache.
+
+Signs a Firebase-shaped ID token with a throwaway RSA key and verifies it the
+way firebase_admin does (google.auth.jwt.decode against a cert map), with and
+without the cache in front. No network or Firebase project is needed.
+
+    python benchmarks/bench_token_cache.py --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.hazmat.primitives import serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: E402
+from google.auth import crypt, jwt  # noqa: E402
+
+from auth_cache import VerifiedTokenCache  # noqa: E402
+
+
+def make_token():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    signer = crypt.RSASigner.from_string(private_pem, key_id="bench")
+    now = int(time.time())
+    payload = {
+        "iss": "https://securetoken.google.com/bench",
+        "aud": "bench",
+        "sub": "user-1",
+        "uid": "user-1",
+        "iat": now,
+        "exp": now + 3600,
+    }
+    return jwt.encode(signer, payload).decode(), {"bench": public_pem}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    token, certs = make_token()
+
+    def verify(raw):
+        return jwt.decode(raw, certs=certs, audience="bench")
+
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        verify(token)
+    uncached = (time.perf_counter() - start) / args.requests
+
+    cache = VerifiedTokenCache(verify=verify)
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        await cache.verify(token)
+    cached = (time.perf_counter() - start) / args.requests
+
+    print(f"uncached verify: {uncached * 1e6:10.1f} us/request")
+    print(f"cached verify  : {cached * 1e6:10.1f} us/request")
+    print(f"cache stats    : {cache.snapshot()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""
+p50/p99 latency of a job that writes scratch files: shared on-disk exec_tmp vs
+a private tmpfs workspace.
+
+The shared path mirrors the original execute_code: write the source into
+exec_tmp next to everyone else's, run it there, then delete the known
+artifact extensions one by one. The workspace path pipes the source in, runs
+in a fresh directory from WorkspaceManager and removes the whole directory.
+
+    python benchmarks/bench_workspace.py --runs 200 --scratch-kb 1024
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workspace import WorkspaceManager  # noqa: E402
+
+PROGRAM = """
+import os, sys
+size = int(sys.argv[1]) * 1024
+with open("scratch.bin", "wb") as f:
+    f.write(os.urandom(size))
+    f.flush()
+    os.fsync(f.fileno())
+with open("scratch.bin", "rb") as f:
+    print(len(f.read()))
+"""
+
+LEGACY_EXTENSIONS = [".py", ".js", ".java", ".class", ".c", ".cpp", ".out", ".exe"]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(label, samples):
+    print(f"{label:<28} p50 {percentile(samples, 50) * 1000:7.1f} ms   "
+          f"p99 {percentile(samples, 99) * 1000:7.1f} ms   mean {statistics.mean(samples) * 1000:7.1f} ms")
+
+
+def shared_dir_job(workdir, index, scratch_kb):
+    base = os.path.join(workdir, f"job_{index}")
+    with open(base + ".py", "w") as f:
+        f.write(PROGRAM)
+    result = subprocess.run([sys.executable, base + ".py", str(scratch_kb)], cwd=workdir,
+                            capture_output=True, text=True, timeout=10)
+    for ext in LEGACY_EXTENSIONS:
+        if os.path.exists(base + ext):
+            os.remove(base + ext)
+    os.remove(os.path.join(workdir, "scratch.bin"))
+    return result
+
+
+def workspace_job(workspaces, scratch_kb):
+    with workspaces.job() as cwd:
+        return subprocess.run([sys.executable, "-", str(scratch_kb)], cwd=cwd, input=PROGRAM,
+                              capture_output=True, text=True, timeout=10)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--scratch-kb", type=int, default=1024)
+    parser.add_argument("--disk-dir", default="exec_tmp", help="on-disk directory for the shared path")
+    parser.add_argument("--root", default=None, help="workspace root (defaults to /dev/shm)")
+    args = parser.parse_args()
+
+    os.makedirs(args.disk_dir, exist_ok=True)
+    workspaces = WorkspaceManager(args.root)
+    expected = str(args.scratch_kb * 1024)
+
+    shared, private = [], []
+    for index in range(args.runs):
+        start = time.perf_counter()
+        result = shared_dir_job(args.disk_dir, index, args.scratch_kb)
+        shared.append(time.perf_counter() - start)
+        assert result.stdout.strip() == expected, result
+
+        start = time.perf_counter()
+        result = workspace_job(workspaces, args.scratch_kb)
+        private.append(time.perf_counter() - start)
+        assert result.stdout.strip() == expected, result
+
+    report(f"shared {os.path.abspath(args.disk_dir)}", shared)
+    report(f"workspace {workspaces.root}", private)
+    print(f"{'':<28} workspace stats {workspaces.stats}")
+
+
+if __name__ == "__main__":
+    main()
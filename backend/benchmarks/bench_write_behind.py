@@ -0,0 +1,72 @@
+"""
+Request-path cost of Firestore persistence: synchronous writes vs FirestoreWriteQueue.
+
+Uses an in-process fake Firestore that injects commit latency and transient
+failures, then checks that every queued write landed after the drain.
+
+    python benchmarks/bench_write_behind.py --requests 200 --latency 0.03 --failure-rate 0.1
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from persistence import FirestoreWriteQueue  # noqa: E402
+from tests.fake_firestore import FakeFirestore, Increment  # noqa: E402
+
+
+def sync_request(db, i):
+    session = db.collection("sessions").document(f"s{i % 20}")
+    session.collection("messages").add({"role": "user", "text": f"q{i}"})
+    session.collection("messages").add({"role": "assistant", "text": f"a{i}"})
+    session.set({"attemptCount": i}, merge=True)
+    db.collection("users").document("u").set({"totalAttempts": Increment(1)}, merge=True)
+
+
+async def queued_request(db, queue, i):
+    session = db.collection("sessions").document(f"s{i % 20}")
+    await queue.add(session.collection("messages"), {"role": "user", "text": f"q{i}"})
+    await queue.add(session.collection("messages"), {"role": "assistant", "text": f"a{i}"})
+    await queue.set(session, {"attemptCount": i}, merge=True)
+    await queue.set(db.collection("users").document("u"), {"totalAttempts": Increment(1)}, merge=True)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.03)
+    parser.add_argument("--failure-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    sync_db = FakeFirestore(args.latency)
+    start = time.perf_counter()
+    for i in range(args.requests):
+        sync_request(sync_db, i)
+    sync_per_request = (time.perf_counter() - start) / args.requests
+
+    db = FakeFirestore(args.latency, args.failure_rate)
+    queue = FirestoreWriteQueue(db, flush_interval=0.05, base_backoff=0.01, max_retries=10)
+    queue.start()
+    start = time.perf_counter()
+    for i in range(args.requests):
+        await queued_request(db, queue, i)
+    queued_per_request = (time.perf_counter() - start) / args.requests
+    await queue.stop()
+
+    messages = [p for p in db.docs if "/messages/" in p]
+    assert len(messages) == 2 * args.requests, f"expected {2 * args.requests} messages, got {len(messages)}"
+    assert db.docs["users/u"]["totalAttempts"] == args.requests, db.docs["users/u"]
+    assert queue.stats["dropped"] == 0, queue.stats
+
+    print(f"sync writes : {sync_per_request * 1000:8.2f} ms/request ({sync_db.commits} commits)")
+    print(f"write-behind: {queued_per_request * 1000:8.2f} ms/request ({db.commits} commits, "
+          f"{args.failure_rate:.0%} injected failures)")
+    print(f"queue stats : {queue.stats}")
+    print("all writes persisted, increments preserved")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,204 @@
+"""
+Single-flight coalescing of duplicate requests.
+Double-clicks and client retries send the same chat turn or memory check
+twice within a second. Requests are keyed by a fingerprint of the caller and
+the canonical request body; while one is being handled, an identical one
+waits for it and gets the same response instead of making its own model
+call and Firestore writes. The shared work runs in its own task, so a
+caller that disconnects doesn't cancel it for the others.
+
+When the client sends a request ID, the completed response is also kept for
+a short idempotency window: a retry with that ID gets the stored response
+(or joins the call still in flight), and reusing the ID for a different
+request is rejected. Failures are never stored, so a retry after an error
+runs again.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyConflict(Exception):
+    """Raised when a request ID is reused for a different request"""
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable hash of JSON-serializable parts (dict key order doesn't matter)"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class EventReplay:
+    """Events produced by one shared stream, readable from the start by any number of followers"""
+
+    def __init__(self):
+        self.events: List[str] = []
+        self.finished = False
+        self.failed = False
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def push(self, event: str) -> None:
+        self.events.append(event)
+        self._notify()
+
+    def finish(self, failed: bool = False) -> None:
+        self.finished, self.failed = True, failed
+        self._notify()
+
+    async def follow(self) -> AsyncIterator[str]:
+        position = 0
+        while True:
+            while position < len(self.events):
+                yield self.events[position]
+                position += 1
+            if self.finished:
+                return
+            await self._changed.wait()
+
+
+@dataclass
+class Flight:
+    key: str
+    task: asyncio.Task
+    replay: Optional[EventReplay] = None
+    # Request IDs remembered for this flight, settled when it lands
+    request_keys: List[str] = field(default_factory=list)
+
+
+@dataclass
+class IdempotentEntry:
+    key: str
+    flight: Flight
+    # Set when the flight succeeds; until then the entry never expires
+    expires_at: float = float("inf")
+
+
+class SingleFlight:
+    """Shares one in-flight call among identical requests and replays completed ones by request ID"""
+
+    def __init__(self, window: float = 60.0, max_entries: int = 10000):
+        self.window = window
+        self.max_entries = max_entries
+        self._flights: Dict[str, Flight] = {}
+        self._completed: "OrderedDict[str, IdempotentEntry]" = OrderedDict()
+        self.stats = {"leaders": 0, "coalesced": 0, "replayed": 0, "conflicts": 0}
+
+    @classmethod
+    def from_env(cls) -> "SingleFlight":
+        """Build a coalescer from IDEMPOTENCY_* environment variables"""
+        return cls(
+            window=float(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", 60)),
+            max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", 10000)),
+        )
+
+    def snapshot(self) -> dict:
+        return {"inFlight": len(self._flights), "remembered": len(self._completed), **self.stats}
+
+    def _remembered(self, key: str, request_key: Optional[str]) -> Optional[Flight]:
+        """The flight a request ID already belongs to, if it is still in flight or inside the window"""
+        if request_key is None:
+            return None
+        entry = self._completed.get(request_key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._completed[request_key]
+            return None
+        if entry.key != key:
+            self.stats["conflicts"] += 1
+            raise IdempotencyConflict("This request ID was already used for a different request")
+        self.stats["replayed"] += 1
+        return entry.flight
+
+    def _join(self, key: str, request_key: Optional[str]) -> Optional[Flight]:
+        flight = self._remembered(key, request_key)
+        if flight is None:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.stats["coalesced"] += 1
+        if flight is not None and request_key is not None and request_key not in self._completed:
+            self._remember(request_key, flight)
+        return flight
+
+    def _remember(self, request_key: str, flight: Flight) -> None:
+        self._completed[request_key] = IdempotentEntry(flight.key, flight)
+        self._completed.move_to_end(request_key)
+        flight.request_keys.append(request_key)
+        while len(self._completed) > self.max_entries:
+            self._completed.popitem(last=False)
+
+    def _launch(self, key: str, work: Awaitable[Any], request_key: Optional[str], replay: Optional[EventReplay] = None) -> Flight:
+        self.stats["leaders"] += 1
+        flight = Flight(key, asyncio.create_task(work), replay)
+        self._flights[key] = flight
+        if request_key is not None:
+            self._remember(request_key, flight)
+        flight.task.add_done_callback(lambda task: self._landed(flight))
+        return flight
+
+    def _landed(self, flight: Flight) -> None:
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+        failed = flight.task.cancelled() or flight.task.exception() is not None
+        if flight.replay is not None:
+            failed = failed or flight.replay.failed
+        for request_key in flight.request_keys:
+            entry = self._completed.get(request_key)
+            # Skips keys already evicted or taken over by a later flight
+            if entry is None or entry.flight is not flight:
+                continue
+            if failed:
+                del self._completed[request_key]
+            else:
+                entry.expires_at = time.monotonic() + self.window
+        flight.request_keys.clear()
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]], request_key: Optional[str] = None) -> Any:
+        """Result of `call()`, shared with every identical request in flight (or replayed by request ID)"""
+        flight = self._join(key, request_key) or self._launch(key, call(), request_key)
+        return await asyncio.shield(flight.task)
+
+    def joinable(self, key: str, request_key: Optional[str] = None) -> Optional[AsyncIterator[str]]:
+        """Follow an identical stream already in flight (or replayed by request ID), if there is one"""
+        flight = self._join(key, request_key)
+        return flight.replay.follow() if flight is not None and flight.replay is not None else None
+
+    def stream(
+        self,
+        key: str,
+        source: Callable[[], AsyncIterator[str]],
+        request_key: Optional[str] = None,
+        succeeded: Callable[[List[str]], bool] = lambda events: True,
+    ) -> AsyncIterator[str]:
+        """
+        Events of `source()`, produced once and replayed to every identical request
+        `succeeded` decides from the events whether the stream may be replayed by request ID
+        """
+        joined = self.joinable(key, request_key)
+        if joined is not None:
+            return joined
+        replay = EventReplay()
+
+        async def produce() -> None:
+            try:
+                async for event in source():
+                    replay.push(event)
+            except Exception as e:
+                logger.error(f"Shared stream failed: {e}")
+                replay.finish(failed=True)
+                return
+            replay.finish(failed=not succeeded(replay.events))
+
+        self._launch(key, produce(), request_key, replay)
+        return replay.follow()
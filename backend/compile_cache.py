@@ -0,0 +1,317 @@
+"""
+Content-addressed cache of compiled C, C++ and Java submissions.
+Entries are keyed by a hash of language, compiler version and flags, and
+source and live in their own directory under the cache root. Successful builds and compile errors
+are both cached, so re-running unchanged code only pays process start. A
+compiler that was killed (signal, rlimit, out of memory) says nothing about
+the source, so that failure is returned but never cached.
+Compilers run on user code, so they run like jobs do: under the launcher
+with their own (roomier) rlimits, in a private workspace. The output is
+copied to a temp directory in the cache and published with an atomic
+rename, which keeps concurrent requests (and uvicorn workers) from seeing
+half-written artifacts. Total size is bounded with LRU eviction by mtime.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from interpreter_pool import java_options
+from sandbox import ResourceLimits, SandboxProcess
+from workspace import WorkspaceManager
+
+logger = logging.getLogger(__name__)
+
+COMPILERS: Dict[str, List[str]] = {
+    "c": ["gcc"],
+    "cpp": ["g++", "-std=c++17"],
+    "java": ["javac"],
+}
+
+VERSION_FLAGS: Dict[str, str] = {"c": "--version", "cpp": "--version", "java": "-version"}
+
+# Compilers need more memory and time than the programs they build
+COMPILE_LIMITS = ResourceLimits(
+    cpu_seconds=30, memory_mb=1024, address_space_mb=1024, processes=256, file_size_mb=64, output_kb=256
+)
+
+_JAVA_MAIN_CLASS = re.compile(
+    r"(?:public\s+)?(?:final\s+)?class\s+(\w+)[^{]*\{(?:(?!\bclass\b).)*?public\s+static\s+void\s+main\s*\(",
+    re.S,
+)
+_JAVA_PUBLIC_MAIN_CLASS = re.compile(
+    r"public\s+(?:final\s+)?class\s+(\w+)[^{]*\{(?:(?!\bclass\b).)*?public\s+static\s+void\s+main\s*\(",
+    re.S,
+)
+_JAVA_PUBLIC_CLASS = re.compile(r"public\s+(?:final\s+)?class\s+(\w+)")
+_JAVA_PACKAGE = re.compile(r"^\s*package\s+([\w.]+)\s*;", re.M)
+
+# A compiler that exits non-zero with one of these ran out of a resource, not into a compile error
+_RESOURCE_FAILURE = re.compile(
+    r"signal terminated program|internal compiler error|virtual memory exhausted"
+    r"|out of memory allocating|Cannot allocate memory|OutOfMemoryError|File size limit exceeded"
+    r"|Resource temporarily unavailable"
+)
+
+# Half-finished builds older than this are leftovers from a crashed worker
+STALE_BUILD_SECONDS = 3600
+
+
+def java_main_class(source: str) -> str:
+    """Name of the class declaring main(), preferring the public one, falling back to the public class or Main"""
+    match = (
+        _JAVA_PUBLIC_MAIN_CLASS.search(source)
+        or _JAVA_MAIN_CLASS.search(source)
+        or _JAVA_PUBLIC_CLASS.search(source)
+    )
+    return match.group(1) if match else "Main"
+
+
+def java_source_name(source: str) -> str:
+    """File name javac requires: the public class's, else the main class's"""
+    match = _JAVA_PUBLIC_CLASS.search(source)
+    return f"{match.group(1) if match else java_main_class(source)}.java"
+
+
+def java_qualified_main_class(source: str) -> str:
+    package = _JAVA_PACKAGE.search(source)
+    name = java_main_class(source)
+    return f"{package.group(1)}.{name}" if package else name
+
+
+@dataclass
+class CompiledArtifact:
+    ok: bool
+    stderr: str
+    run_argv: List[str]
+    cached: bool
+
+
+def cacheable(meta: dict) -> bool:
+    """Whether a build's outcome depends only on the source"""
+    if meta["ok"]:
+        return True
+    return meta.get("returncode", 0) > 0 and not _RESOURCE_FAILURE.search(meta["stderr"])
+
+
+class CompileCache:
+    """Size-bounded on-disk LRU of compiled programs and compile errors"""
+
+    def __init__(
+        self,
+        root: str = "exec_cache",
+        max_bytes: int = 512 * 1024 * 1024,
+        eviction_grace: float = 60.0,
+        limits: ResourceLimits = COMPILE_LIMITS,
+        workspaces: Optional[WorkspaceManager] = None,
+    ):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        # Entries used more recently than this are never evicted, so a program
+        # that was just looked up cannot disappear before it is executed
+        self.eviction_grace = eviction_grace
+        self.limits = limits
+        self.workspaces = workspaces or WorkspaceManager()
+        self._versions: Dict[str, str] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._sizes: Dict[str, int] = {}
+        self.stats = {"hits": 0, "misses": 0, "compileErrors": 0, "compilerKilled": 0, "evictions": 0}
+        os.makedirs(self.root, exist_ok=True)
+        self._scan()
+
+    @classmethod
+    def from_env(cls, workspaces: Optional[WorkspaceManager] = None) -> "CompileCache":
+        """Build a cache from EXEC_COMPILE_CACHE_* and EXEC_COMPILE_LIMIT_* environment variables"""
+        memory_mb = int(os.getenv("EXEC_COMPILE_LIMIT_MEMORY_MB", COMPILE_LIMITS.memory_mb))
+        limits = ResourceLimits(
+            cpu_seconds=int(os.getenv("EXEC_COMPILE_LIMIT_CPU_SECONDS", COMPILE_LIMITS.cpu_seconds)),
+            memory_mb=memory_mb,
+            address_space_mb=memory_mb,
+            processes=int(os.getenv("EXEC_LIMIT_PROCESSES", COMPILE_LIMITS.processes)),
+            file_size_mb=int(os.getenv("EXEC_COMPILE_LIMIT_FILE_SIZE_MB", COMPILE_LIMITS.file_size_mb)),
+            output_kb=int(os.getenv("EXEC_LIMIT_OUTPUT_KB", COMPILE_LIMITS.output_kb)),
+        )
+        return cls(
+            root=os.getenv("EXEC_COMPILE_CACHE_DIR", "exec_cache"),
+            max_bytes=int(os.getenv("EXEC_COMPILE_CACHE_MAX_MB", 512)) * 1024 * 1024,
+            limits=limits,
+            workspaces=workspaces,
+        )
+
+    @staticmethod
+    def key(language: str, source: str, version: str = "") -> str:
+        flags = "\0".join(COMPILERS[language])
+        return hashlib.sha256(f"{language}\0{version}\0{flags}\0{source}".encode()).hexdigest()
+
+    async def compiler_version(self, language: str) -> str:
+        """The compiler's version banner, probed once per process; empty if it can't be run"""
+        version = self._versions.get(language)
+        if version is not None:
+            return version
+        argv = [COMPILERS[language][0], VERSION_FLAGS[language]]
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *argv, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+            )
+        except OSError:
+            return ""
+        try:
+            output, _ = await asyncio.wait_for(process.communicate(), timeout=10)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return ""
+        version = output.decode("utf-8", errors="replace").strip()
+        self._versions[language] = version
+        return version
+
+    def _scan(self) -> None:
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(".tmp-"):
+                if time.time() - os.path.getmtime(path) > STALE_BUILD_SECONDS:
+                    shutil.rmtree(path, ignore_errors=True)
+            elif os.path.isdir(path):
+                self._sizes[name] = _dir_size(path)
+
+    @staticmethod
+    def _run_argv(language: str, entry: str, meta: dict) -> List[str]:
+        if language == "java":
+            return ["java", "-cp", entry, meta["mainClass"]]
+        return [os.path.join(entry, "prog")]
+
+    def _lookup(self, language: str, key: str) -> Optional[CompiledArtifact]:
+        entry = os.path.join(self.root, key)
+        try:
+            with open(os.path.join(entry, "meta.json")) as f:
+                meta = json.load(f)
+            os.utime(entry)
+        except (OSError, ValueError):
+            return None
+        return CompiledArtifact(meta["ok"], meta["stderr"], self._run_argv(language, entry, meta), cached=True)
+
+    async def get_or_compile(self, language: str, source: str, timeout: float = 10) -> CompiledArtifact:
+        """Return the cached build for this source, compiling it on a miss"""
+        key = self.key(language, source, await self.compiler_version(language))
+        artifact = self._lookup(language, key)
+        if artifact:
+            self.stats["hits"] += 1
+            return artifact
+
+        # Coalesce concurrent compiles of the same source within this process.
+        # The build runs as its own task so a caller that is cancelled (client
+        # disconnected) doesn't fail the compile for the others waiting on it
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["misses"] += 1
+            task = asyncio.ensure_future(self._compile(language, source, key, timeout))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._compile_done(key, done))
+        return await asyncio.shield(task)
+
+    def _compile_done(self, key: str, task: asyncio.Future) -> None:
+        del self._inflight[key]
+        if not task.cancelled():
+            # Mark retrieved so a failure nobody awaited doesn't log a warning
+            task.exception()
+
+    async def build(self, language: str, source: str, dest: str, timeout: float = 10) -> dict:
+        """
+        Compile `source` in a private workspace under the compile limits and copy the output to `dest`
+        Returns the build's meta (ok, stderr, returncode, mainClass for Java); raises subprocess.TimeoutExpired on timeout
+        """
+        meta = {"ok": False, "stderr": "", "returncode": 0}
+        limits = self.limits.for_language(language)
+        if language == "java":
+            meta["mainClass"] = java_qualified_main_class(source)
+            src_name = java_source_name(source)
+            # javac is a JVM: the heap flag carries the memory limit, as for Java jobs
+            argv = COMPILERS[language] + [f"-J{option}" for option in java_options(limits)] + ["-d", ".", src_name]
+        else:
+            src_name = "main.c" if language == "c" else "main.cpp"
+            argv = COMPILERS[language] + ["-o", "prog", src_name]
+        if shutil.which(argv[0]) is None:
+            # The launcher would report this as a failed compile, which would then be cached
+            raise FileNotFoundError(f"{argv[0]} not found")
+
+        with self.workspaces.job() as workspace:
+            with open(os.path.join(workspace, src_name), "w") as f:
+                f.write(source)
+            process = await SandboxProcess.spawn(argv, cwd=workspace, limits=limits)
+            result = await process.communicate(b"", timeout)
+            meta["ok"] = result.returncode == 0 and not result.output_truncated
+            meta["stderr"] = result.stderr
+            meta["returncode"] = result.returncode
+            if result.returncode < 0:
+                meta["stderr"] += "\nCompiler stopped: resource limit exceeded"
+            os.remove(os.path.join(workspace, src_name))
+            shutil.copytree(workspace, dest)
+        return meta
+
+    async def _compile(self, language: str, source: str, key: str, timeout: float) -> CompiledArtifact:
+        build = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        try:
+            meta = await self.build(language, source, build, timeout)
+            if not cacheable(meta):
+                self.stats["compilerKilled"] += 1
+                return CompiledArtifact(False, meta["stderr"], [], cached=False)
+            if not meta["ok"]:
+                self.stats["compileErrors"] += 1
+            with open(os.path.join(build, "meta.json"), "w") as f:
+                json.dump(meta, f)
+
+            entry = os.path.join(self.root, key)
+            try:
+                os.rename(build, entry)
+                self._sizes[key] = _dir_size(entry)
+            except OSError:
+                # Another worker published the same key first; use theirs
+                shutil.rmtree(build, ignore_errors=True)
+            self._evict()
+            return CompiledArtifact(meta["ok"], meta["stderr"], self._run_argv(language, entry, meta), cached=False)
+        finally:
+            if os.path.exists(build):
+                shutil.rmtree(build, ignore_errors=True)
+
+    def _evict(self) -> None:
+        total = sum(self._sizes.values())
+        if total <= self.max_bytes:
+            return
+        now = time.time()
+        entries = []
+        for key in list(self._sizes):
+            try:
+                entries.append((os.path.getmtime(os.path.join(self.root, key)), key))
+            except OSError:
+                total -= self._sizes.pop(key)
+        for mtime, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if now - mtime < self.eviction_grace:
+                continue
+            trash = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+            try:
+                os.rename(os.path.join(self.root, key), trash)
+            except OSError:
+                continue
+            shutil.rmtree(trash, ignore_errors=True)
+            total -= self._sizes.pop(key)
+            self.stats["evictions"] += 1
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
@@ -0,0 +1,156 @@
+"""
+Empirical complexity profiling for student code.
+A program is run on generated inputs of doubling size, its CPU time and peak
+RSS are taken from rusage, and both series are fitted against the usual
+growth classes with a least-squares `a + b*f(n)` model. The intercept soaks
+up fixed costs such as interpreter startup, so only the growth is compared.
+Sizes stop increasing once a run gets slow, so a quadratic solution is
+measured without ever hitting the execution timeout.
+"""
+import logging
+import math
+import random
+import string
+import subprocess
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+from executor import CodeExecutor, ExecutionOutcome, PreparedProgram
+
+logger = logging.getLogger(__name__)
+
+INPUT_KINDS = ("number", "array", "sorted_array", "string")
+
+GROWTH_CLASSES: List[Tuple[str, Callable[[float], float]]] = [
+    ("O(1)", lambda n: 0.0),
+    ("O(log n)", lambda n: math.log2(n)),
+    ("O(n)", lambda n: n),
+    ("O(n log n)", lambda n: n * math.log2(n)),
+    ("O(n^2)", lambda n: n * n),
+]
+
+# Below these spreads the series is indistinguishable from noise
+MIN_CPU_SPREAD = 0.02
+MIN_MEMORY_SPREAD_KB = 1024
+
+
+def generate_input(kind: str, n: int, min_value: int, max_value: int, include_size: bool, seed: int) -> str:
+    """Deterministic stdin for one input size"""
+    rng = random.Random(f"{seed}:{n}")
+    if kind == "number":
+        return f"{n}\n"
+    if kind == "string":
+        body = "".join(rng.choices(string.ascii_lowercase, k=n))
+    else:
+        values = [rng.randint(min_value, max_value) for _ in range(n)]
+        if kind == "sorted_array":
+            values.sort()
+        body = " ".join(map(str, values))
+    return f"{n}\n{body}\n" if include_size else f"{body}\n"
+
+
+def fit_growth(sizes: Sequence[int], values: Sequence[float], min_spread: float) -> Optional[str]:
+    """Best-fitting growth class, preferring the simpler class when fits are close"""
+    if len(sizes) < 3:
+        return None
+    if max(values) - min(values) < max(min_spread, 0.1 * max(values)):
+        return "O(1)"
+
+    mean_y = sum(values) / len(values)
+    scores = []
+    for name, f in GROWTH_CLASSES:
+        xs = [f(n) for n in sizes]
+        mean_x = sum(xs) / len(xs)
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, values)) / var_x if var_x else 0.0
+        if slope < 0:
+            continue
+        intercept = mean_y - slope * mean_x
+        residual = sum((intercept + slope * x - y) ** 2 for x, y in zip(xs, values))
+        scores.append((residual, name))
+
+    best = min(residual for residual, _ in scores)
+    # Classes are listed simplest first; take the first one that fits about as well
+    for residual, name in scores:
+        if residual <= best * 1.2 + 1e-12:
+            return name
+    return None
+
+
+@dataclass
+class ProfileSample:
+    size: int
+    cpu_time: float
+    wall_time: float
+    peak_memory_kb: int
+    memory_floor_kb: int = 0
+
+
+@dataclass
+class ComplexityProfile:
+    samples: List[ProfileSample] = field(default_factory=list)
+    time_complexity: Optional[str] = None
+    space_complexity: Optional[str] = None
+    error: Optional[str] = None
+    note: Optional[str] = None
+
+
+async def profile_program(
+    executor: CodeExecutor,
+    program: PreparedProgram,
+    generator: Callable[[int], str],
+    sizes: Sequence[int],
+    repeats: int = 1,
+    slow_run_seconds: float = 1.0,
+    budget_seconds: float = 20.0,
+    run: Optional[Callable[[PreparedProgram, str], Awaitable[ExecutionOutcome]]] = None,
+) -> ComplexityProfile:
+    """
+    Run `program` on growing inputs and fit the measured CPU time and memory
+    `run` executes one measurement (default executor.run); callers pass one that takes a scheduler slot per run
+    """
+    run = run or executor.run
+    profile = ComplexityProfile()
+    if program.error:
+        profile.error = program.error
+        return profile
+
+    spent = 0.0
+    for size in sorted(set(sizes)):
+        stdin = generator(size)
+        best = None
+        for _ in range(repeats):
+            try:
+                outcome = await run(program, stdin)
+            except subprocess.TimeoutExpired:
+                profile.note = f"Stopped at n={size}: run exceeded the {executor.timeout:g}s time limit"
+                best = None
+                break
+            spent += outcome.wall_time
+            if not outcome.success:
+                profile.error = f"Program failed at n={size}:\n{outcome.error or ''}"
+                return profile
+            if best is None or outcome.cpu_time < best.cpu_time:
+                best = outcome
+        if best is None:
+            break
+
+        profile.samples.append(
+            ProfileSample(size, best.cpu_time, best.wall_time, best.peak_memory_kb, best.memory_floor_kb)
+        )
+        if best.cpu_time > slow_run_seconds or spent > budget_seconds:
+            profile.note = f"Stopped growing input at n={size} to stay within execution limits"
+            break
+
+    measured = [sample.size for sample in profile.samples]
+    profile.time_complexity = fit_growth(measured, [s.cpu_time for s in profile.samples], MIN_CPU_SPREAD)
+    if any(s.peak_memory_kb <= s.memory_floor_kb for s in profile.samples):
+        floor_mb = max(s.memory_floor_kb for s in profile.samples) / 1024
+        profile.note = profile.note or f"Memory use was too small to measure (below ~{floor_mb:.0f} MB)"
+    else:
+        profile.space_complexity = fit_growth(
+            measured, [float(s.peak_memory_kb) for s in profile.samples], MIN_MEMORY_SPREAD_KB
+        )
+    if len(measured) < 3 and not profile.note:
+        profile.note = "At least 3 input sizes are needed to estimate complexity"
+    return profile
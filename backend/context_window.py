@@ -0,0 +1,155 @@
+"""
+Token-budgeted history window for chat prompts.
+Recent turns are packed newest-first into a configurable token budget; turns
+that fall out of the window are folded into a rolling per-session summary.
+The summary is updated incrementally in the background (only newly evicted
+turns are sent to the summarizer), so assembling a prompt never waits on it.
+The summary records how many of the session's messages it covers, so the
+window starts exactly where it ends: turns the summary hasn't caught up
+with yet stay in the window (past the budget if need be) instead of being
+dropped, and turns already summarized are never sent twice.
+"""
+import asyncio
+import logging
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+Summarizer = Callable[[str, List[Dict[str, str]]], Awaitable[str]]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap tokenizer-free estimate: one token per punctuation mark and per
+    ~4 characters of each word, which tracks Llama's BPE closely enough for budgeting
+    """
+    return sum((len(piece) + 3) // 4 for piece in _TOKEN_PIECES.findall(text)) + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Keep the head and tail of an oversized message (e.g. a pasted code block)"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    keep = max(max_tokens * 4 // 2, 1)
+    return f"{text[:keep]}\n...[truncated]...\n{text[-keep:]}"
+
+
+@dataclass
+class RollingSummary:
+    text: str
+    # Messages covered, counted from the start of the session
+    covered: int
+
+
+class HistoryAssembler:
+    """Fit conversation history into a token budget with a cached rolling summary"""
+
+    def __init__(
+        self,
+        summarize: Optional[Summarizer] = None,
+        budget_tokens: int = 3000,
+        max_message_tokens: int = 1200,
+        max_sessions: int = 5000,
+        overflow_tokens: Optional[int] = None,
+    ):
+        self.summarize = summarize
+        self.budget_tokens = budget_tokens
+        # How far past the budget unsummarized turns may go before the oldest are dropped
+        self.overflow_tokens = budget_tokens if overflow_tokens is None else overflow_tokens
+        self.max_message_tokens = max_message_tokens
+        self.max_sessions = max_sessions
+        self._summaries: "OrderedDict[str, RollingSummary]" = OrderedDict()
+        self._updating: Dict[str, asyncio.Task] = {}
+        self.stats = {"summaryUpdates": 0, "summaryFailures": 0, "truncatedMessages": 0, "droppedMessages": 0}
+
+    @classmethod
+    def from_env(cls, summarize: Optional[Summarizer] = None) -> "HistoryAssembler":
+        """Build an assembler from HISTORY_* environment variables"""
+        return cls(
+            summarize,
+            budget_tokens=int(os.getenv("HISTORY_TOKEN_BUDGET", 3000)),
+            max_message_tokens=int(os.getenv("HISTORY_MAX_MESSAGE_TOKENS", 1200)),
+            overflow_tokens=int(os.environ["HISTORY_OVERFLOW_TOKENS"]) if os.getenv("HISTORY_OVERFLOW_TOKENS") else None,
+        )
+
+    def assemble(
+        self,
+        session_id: Optional[str],
+        history: List[Dict[str, str]],
+        offset: int = 0,
+    ) -> Tuple[Optional[str], List[Dict[str, str]]]:
+        """
+        Return (rolling summary or None, history window that fits the budget)
+        `offset` is how many of the session's messages were trimmed off the front of `history`
+        """
+        summary = self._summaries.get(session_id) if session_id else None
+        if summary and summary.covered > offset + len(history):
+            # The summary covers messages this history doesn't have; it isn't this history's summary
+            del self._summaries[session_id]
+            summary = None
+        # Turns the summary already covers are left out of the window
+        fresh = max(0, summary.covered - offset) if summary else 0
+        budget = self.budget_tokens
+        if summary:
+            budget -= estimate_tokens(summary.text)
+        # Unsummarized turns may overflow the budget while the summary catches up; without a summarizer they can't
+        limit = budget + (self.overflow_tokens if self.summarize and session_id else 0)
+
+        window: List[Dict[str, str]] = []
+        used = 0
+        start = split = len(history)
+        for message in reversed(history[fresh:]):
+            text = truncate_to_tokens(message["text"], self.max_message_tokens)
+            if text is not message["text"]:
+                self.stats["truncatedMessages"] += 1
+            cost = estimate_tokens(text) + 4
+            if window and used + cost > limit:
+                break
+            window.append({"role": message["role"], "text": text})
+            used += cost
+            start -= 1
+            if used <= budget or len(window) == 1:
+                split = start
+        window.reverse()
+        if start > fresh:
+            self.stats["droppedMessages"] += start - fresh
+
+        if session_id and split > fresh:
+            # Everything before the budget's edge goes into the summary, including any turns dropped above
+            self._schedule_update(session_id, history[fresh:split], offset + fresh, offset + split)
+
+        if session_id in self._summaries:
+            self._summaries.move_to_end(session_id)
+        return (summary.text if summary else None), window
+
+    def _schedule_update(self, session_id: str, pending: List[Dict[str, str]], first: int, end: int) -> None:
+        """Fold `pending` (the session's messages first..end) into the summary in the background"""
+        if not self.summarize or session_id in self._updating:
+            return
+        task = asyncio.create_task(self._update(session_id, pending, first, end))
+        self._updating[session_id] = task
+        task.add_done_callback(lambda _: self._updating.pop(session_id, None))
+
+    async def _update(self, session_id: str, pending: List[Dict[str, str]], first: int, end: int) -> None:
+        previous = self._summaries.get(session_id)
+        if previous and previous.covered < first:
+            # Only possible after summary failures: the turns in between were trimmed off the history
+            logger.warning(f"Rolling summary for session {session_id} skips {first - previous.covered} trimmed message(s)")
+        try:
+            text = await self.summarize(previous.text if previous else "", pending)
+        except Exception as e:
+            self.stats["summaryFailures"] += 1
+            logger.warning(f"Rolling summary update failed for session {session_id}: {e}")
+            return
+        self._summaries[session_id] = RollingSummary(text.strip(), end)
+        self._summaries.move_to_end(session_id)
+        while len(self._summaries) > self.max_sessions:
+            self._summaries.popitem(last=False)
+        self.stats["summaryUpdates"] += 1
+        logger.info(f"Rolling summary for session {session_id} now covers {len(pending)} more message(s)")
@@ -0,0 +1,162 @@
+"""
+Fair scheduler for sandboxed code execution.
+A global cap (one slot per CPU core by default) bounds how many jobs run at
+once. Waiting jobs are queued per uid and granted slots round-robin, so one
+user submitting in a loop cannot starve everybody else. A job that runs
+several programs in parallel (a batch of test cases) takes several slots. Queues are bounded;
+callers over the limit get QueueFullError with a Retry-After estimate.
+"""
+import asyncio
+import logging
+import math
+import os
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class QueueFullError(Exception):
+    """Raised when a job cannot be queued; retry_after is in seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away and its job was cancelled"""
+
+
+class ExecutionScheduler:
+    """Bounded concurrency with per-user round-robin queuing"""
+
+    def __init__(
+        self,
+        max_concurrency: int = os.cpu_count() or 1,
+        max_queued_per_user: int = 3,
+        max_queued_total: int = 100,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queued_per_user = max_queued_per_user
+        self.max_queued_total = max_queued_total
+        self._active = 0
+        self._waiting = 0
+        self._queues: "OrderedDict[str, Deque[Tuple[asyncio.Future, int]]]" = OrderedDict()
+        self._avg_job_seconds = 1.0
+        self.stats = {"started": 0, "enqueued": 0, "rejected": 0, "cancelled": 0}
+
+    @classmethod
+    def from_env(cls) -> "ExecutionScheduler":
+        """Build a scheduler from EXEC_* environment variables"""
+        return cls(
+            max_concurrency=int(os.getenv("EXEC_MAX_CONCURRENCY") or os.cpu_count() or 1),
+            max_queued_per_user=int(os.getenv("EXEC_MAX_QUEUED_PER_USER", 3)),
+            max_queued_total=int(os.getenv("EXEC_MAX_QUEUED_TOTAL", 100)),
+        )
+
+    def snapshot(self) -> dict:
+        return {
+            "active": self._active,
+            "queued": self._waiting,
+            "maxConcurrency": self.max_concurrency,
+            "avgJobSeconds": round(self._avg_job_seconds, 3),
+            **self.stats,
+        }
+
+    def _retry_after(self) -> int:
+        backlog = (self._waiting + 1) / self.max_concurrency
+        return max(1, math.ceil(backlog * self._avg_job_seconds))
+
+    async def run(self, uid: str, job: Callable[[], Awaitable[T]], slots: int = 1) -> T:
+        """Run `job` once `slots` execution slots are free for this user"""
+        slots = max(1, min(slots, self.max_concurrency))
+        await self._acquire(uid, slots)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        self.stats["started"] += 1
+        try:
+            return await job()
+        finally:
+            elapsed = loop.time() - started
+            self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed
+            self._release(slots)
+
+    async def _acquire(self, uid: str, slots: int) -> None:
+        if self._active + slots <= self.max_concurrency and not self._waiting:
+            self._active += slots
+            return
+
+        queue = self._queues.get(uid)
+        if self._waiting >= self.max_queued_total or (queue and len(queue) >= self.max_queued_per_user):
+            self.stats["rejected"] += 1
+            raise QueueFullError("Too many queued executions", self._retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(uid, deque()).append((future, slots))
+        self._waiting += 1
+        self.stats["enqueued"] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            if future.done() and not future.cancelled():
+                # The slot was granted just as we were cancelled: hand it on
+                self._release(slots)
+            else:
+                self._forget(uid, future)
+            raise
+
+    def _forget(self, uid: str, future: asyncio.Future) -> None:
+        queue = self._queues.get(uid)
+        for entry in queue or ():
+            if entry[0] is future:
+                queue.remove(entry)
+                self._waiting -= 1
+                if not queue:
+                    del self._queues[uid]
+                return
+
+    def _release(self, slots: int) -> None:
+        self._active -= slots
+        while self._queues:
+            uid = next(iter(self._queues))
+            queue = self._queues[uid]
+            future, wanted = queue[0]
+            if future.done():
+                wanted = 0
+            elif self._active + wanted > self.max_concurrency:
+                # Don't let smaller jobs jump the queue and starve a multi-slot one
+                return
+            queue.popleft()
+            self._waiting -= 1
+            if queue:
+                self._queues.move_to_end(uid)
+            else:
+                del self._queues[uid]
+            if wanted:
+                self._active += wanted
+                future.set_result(None)
+
+
+async def cancel_on_disconnect(request: Any, awaitable: Awaitable[T], poll_interval: float = 0.5) -> T:
+    """Await `awaitable`, cancelling it if the HTTP client disconnects first"""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info("Client disconnected, cancelling execution")
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
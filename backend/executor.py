@@ -0,0 +1,215 @@
+"""
+Language dispatch for /api/execute.
+Interpreted languages run on warm interpreter pools; compiled languages go
+through the compile cache and then run as sandboxed subprocesses, each in a
+private scratch directory. Source and stdin travel over pipes. Nothing on
+this path blocks the event loop, and cancelling a job (e.g. because the
+client disconnected) kills whatever process it was running.
+"""
+import asyncio
+import json
+import logging
+import signal
+import subprocess
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from compile_cache import CompileCache
+from interpreter_pool import InterpreterPool, java_options
+from sandbox import NO_LIMITS, ProcessResult, ResourceLimits, run_process
+from workspace import WorkspaceManager
+
+logger = logging.getLogger(__name__)
+
+LANGUAGE_ALIASES: Dict[str, str] = {
+    "python": "python",
+    "py": "python",
+    "javascript": "javascript",
+    "js": "javascript",
+    "node": "javascript",
+    "java": "java",
+    "cpp": "cpp",
+    "c++": "cpp",
+    "c": "c",
+}
+
+
+def normalize_language(language: str) -> Optional[str]:
+    return LANGUAGE_ALIASES.get(language.lower())
+
+
+def outputs_match(actual: str, expected: str) -> bool:
+    """Compare program output the way judges do: ignore trailing whitespace"""
+    def lines(text: str) -> List[str]:
+        return [line.rstrip() for line in text.rstrip().splitlines()]
+    return lines(actual) == lines(expected)
+
+
+@dataclass
+class ExecutionOutcome:
+    output: str
+    error: Optional[str]
+    success: bool
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    peak_memory_kb: int = 0
+    memory_floor_kb: int = 0
+    timed_out: bool = False
+    # Stopped by a CPU/file/output limit or a signal rather than finishing on its own
+    limit_exceeded: bool = False
+
+
+@dataclass
+class PreparedProgram:
+    """A submission ready to run: compiled if needed, or the reason it can't run"""
+    language: str
+    code: str
+    run_argv: Optional[List[str]] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class TestCase:
+    stdin: Optional[str]
+    expected_output: Optional[str] = None
+
+
+@dataclass
+class CaseOutcome:
+    outcome: Optional[ExecutionOutcome]
+    passed: bool
+    skipped: bool = False
+
+
+LIMIT_MESSAGES: Dict[int, str] = {
+    signal.SIGXCPU: "CPU time limit exceeded",
+    signal.SIGXFSZ: "File size limit exceeded",
+    signal.SIGSEGV: "Segmentation fault (or memory limit exceeded)",
+}
+
+
+def _outcome(result: ProcessResult, limits: ResourceLimits) -> ExecutionOutcome:
+    error = result.stderr if result.returncode != 0 else None
+    if result.output_truncated:
+        error = f"{error or ''}\nOutput limit exceeded ({limits.output_kb} KB); the program was stopped".lstrip()
+    elif result.returncode < 0:
+        reason = LIMIT_MESSAGES.get(-result.returncode) or f"Terminated by {signal.Signals(-result.returncode).name}"
+        error = f"{error or ''}\n{reason}".lstrip()
+    return ExecutionOutcome(
+        output=result.stdout,
+        error=error,
+        success=result.returncode == 0 and not result.output_truncated,
+        limit_exceeded=result.output_truncated or result.returncode < 0,
+        wall_time=result.wall_time,
+        cpu_time=result.cpu_time,
+        peak_memory_kb=result.peak_memory_kb,
+        memory_floor_kb=result.memory_floor_kb,
+    )
+
+
+class CodeExecutor:
+    """Runs submissions in any supported language"""
+
+    def __init__(
+        self,
+        pools: Dict[str, InterpreterPool],
+        compile_cache: CompileCache,
+        timeout: float = 10,
+        limits: ResourceLimits = NO_LIMITS,
+        workspaces: Optional[WorkspaceManager] = None,
+    ):
+        self.pools = pools
+        self.compile_cache = compile_cache
+        self.timeout = timeout
+        self.limits = limits
+        self.workspaces = workspaces or WorkspaceManager()
+
+    async def prepare(self, language: str, code: str) -> PreparedProgram:
+        """Resolve the language and compile if needed; compile errors land in `error`"""
+        normalized = normalize_language(language)
+        if normalized is None:
+            return PreparedProgram(language, code, error=f"Unsupported language: {language}")
+        if normalized in self.pools:
+            return PreparedProgram(normalized, code)
+
+        artifact = await self.compile_cache.get_or_compile(normalized, code, timeout=self.timeout)
+        if not artifact.ok:
+            return PreparedProgram(normalized, code, error=f"Compilation Error:\n{artifact.stderr}")
+        return PreparedProgram(normalized, code, run_argv=artifact.run_argv)
+
+    async def run(self, program: PreparedProgram, stdin: Optional[str]) -> ExecutionOutcome:
+        """Run a prepared program once; raises subprocess.TimeoutExpired on timeout"""
+        if program.error:
+            return ExecutionOutcome("", program.error, False)
+        if program.run_argv:
+            limits = self.limits.for_language(program.language)
+            argv = program.run_argv
+            if program.language == "java":
+                argv = [argv[0], *java_options(limits), *argv[1:]]
+            with self.workspaces.job() as workspace:
+                result = await run_process(argv, stdin, timeout=self.timeout, cwd=workspace, limits=limits)
+            return _outcome(result, limits)
+
+        code = program.code
+        if program.language == "javascript" and stdin is not None:
+            code = f"const input = {json.dumps(stdin)};\n{code}"
+        pool = self.pools[program.language]
+        return _outcome(await pool.run(code, stdin, timeout=self.timeout), pool.limits)
+
+    async def execute(self, language: str, code: str, stdin: Optional[str]) -> ExecutionOutcome:
+        """Prepare and run `code`; raises subprocess.TimeoutExpired if it exceeds the time limit"""
+        return await self.run(await self.prepare(language, code), stdin)
+
+    async def _run_case(self, program: PreparedProgram, case: TestCase) -> CaseOutcome:
+        try:
+            outcome = await self.run(program, case.stdin)
+        except subprocess.TimeoutExpired:
+            outcome = ExecutionOutcome(
+                "", f"Execution timed out ({self.timeout:g} seconds limit)", False,
+                wall_time=self.timeout, timed_out=True,
+            )
+        passed = outcome.success and (
+            case.expected_output is None or outputs_match(outcome.output, case.expected_output)
+        )
+        return CaseOutcome(outcome, passed)
+
+    async def run_batch(
+        self,
+        program: PreparedProgram,
+        cases: Sequence[TestCase],
+        parallelism: int = 4,
+        stop_on_failure: bool = False,
+    ) -> List[CaseOutcome]:
+        """
+        Run every case against one prepared program, at most `parallelism` at a
+        time. With stop_on_failure, cases after the first failing one are
+        cancelled or never started and come back as skipped
+        """
+        results: List[Optional[CaseOutcome]] = [None] * len(cases)
+        tasks: Dict[int, asyncio.Task] = {}
+        limit = asyncio.Semaphore(max(1, parallelism))
+        first_failure = len(cases)
+
+        async def run_one(index: int) -> None:
+            nonlocal first_failure
+            async with limit:
+                if index > first_failure:
+                    return
+                results[index] = result = await self._run_case(program, cases[index])
+            if stop_on_failure and not result.passed and index < first_failure:
+                first_failure = index
+                for later, task in tasks.items():
+                    if later > index:
+                        task.cancel()
+
+        tasks.update({index: asyncio.create_task(run_one(index)) for index in range(len(cases))})
+        try:
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+        for task in tasks.values():
+            if not task.cancelled() and task.exception():
+                raise task.exception()
+        return [result or CaseOutcome(None, False, skipped=True) for result in results]
@@ -0,0 +1,116 @@
+"""
+Precomputed hint ladders for Time-Travel mode.
+When a learning topic starts in a Time-Travel session, all four hint levels
+(Conceptual, Approach, Pseudocode, Solution) are generated in one background
+LLM call and cached per (session, topic, question). A hint request that passes the
+unlock gating is then answered from the ladder without a model round trip;
+if the ladder is still being generated the request waits for it briefly and
+otherwise falls back to the regular chat call. The question text is part of
+the key because topics are only a few words long: a second two-sum problem in
+the same session must not be answered with the first one's solution.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HINT_LEVELS: Dict[int, str] = {1: "Conceptual", 2: "Approach", 3: "Pseudocode", 4: "Solution"}
+
+LadderGenerator = Callable[[str, str], Awaitable[Optional[Dict[int, str]]]]
+LadderKey = Tuple[str, str, str]
+
+
+def ladder_key(session_id: str, topic: str, question: str) -> LadderKey:
+    return session_id, topic, hashlib.sha256(question.strip().encode("utf-8")).hexdigest()
+
+
+class HintLadderCache:
+    """Per-(session, topic, question) ladders of hint texts, generated in the background"""
+
+    def __init__(
+        self,
+        generate: LadderGenerator,
+        max_entries: int = 2000,
+        ttl: float = 2 * 3600,
+        wait_timeout: float = 8.0,
+    ):
+        self.generate = generate
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # How long a hint request waits on a ladder that is still being generated
+        self.wait_timeout = wait_timeout
+        self._ladders: "OrderedDict[LadderKey, Tuple[Dict[int, str], float]]" = OrderedDict()
+        self._generating: Dict[LadderKey, asyncio.Task] = {}
+        self.stats = {"generated": 0, "failures": 0, "hits": 0, "waited": 0, "misses": 0}
+
+    @classmethod
+    def from_env(cls, generate: LadderGenerator) -> "HintLadderCache":
+        """Build a cache from HINT_LADDER_* environment variables"""
+        return cls(
+            generate,
+            max_entries=int(os.getenv("HINT_LADDER_MAX_ENTRIES", 2000)),
+            ttl=float(os.getenv("HINT_LADDER_TTL_SECONDS", 2 * 3600)),
+            wait_timeout=float(os.getenv("HINT_LADDER_WAIT_SECONDS", 8)),
+        )
+
+    def _fresh(self, key: LadderKey) -> Optional[Dict[int, str]]:
+        entry = self._ladders.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._ladders[key]
+            return None
+        self._ladders.move_to_end(key)
+        return entry[0]
+
+    def prefetch(self, session_id: str, topic: str, question: str) -> None:
+        """Start generating the ladder for this question unless it exists or is underway"""
+        key = ladder_key(session_id, topic, question)
+        if key in self._generating or self._fresh(key) is not None:
+            return
+        task = asyncio.create_task(self._build(key, topic, question))
+        self._generating[key] = task
+        task.add_done_callback(lambda _: self._generating.pop(key, None))
+
+    async def _build(self, key: LadderKey, topic: str, question: str) -> None:
+        try:
+            ladder = await self.generate(topic, question)
+        except Exception as e:
+            ladder = None
+            logger.warning(f"Hint ladder generation failed for topic '{topic}': {e}")
+        if not ladder or any(not ladder.get(level) for level in HINT_LEVELS):
+            self.stats["failures"] += 1
+            return
+        self._ladders[key] = (ladder, time.monotonic() + self.ttl)
+        self._ladders.move_to_end(key)
+        while len(self._ladders) > self.max_entries:
+            self._ladders.popitem(last=False)
+        self.stats["generated"] += 1
+        logger.info(f"Hint ladder ready for topic '{topic}'")
+
+    async def get(self, session_id: str, topic: str, question: str, level: int) -> Optional[str]:
+        """The cached hint for a level, waiting briefly on an in-flight ladder; None on a miss"""
+        key = ladder_key(session_id, topic, question)
+        ladder = self._fresh(key)
+        if ladder is None and key in self._generating:
+            self.stats["waited"] += 1
+            try:
+                await asyncio.wait_for(asyncio.shield(self._generating[key]), timeout=self.wait_timeout)
+            except asyncio.TimeoutError:
+                pass
+            ladder = self._fresh(key)
+        if ladder is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return ladder[level]
+
+    async def stop(self) -> None:
+        for task in list(self._generating.values()):
+            task.cancel()
+        await asyncio.gather(*self._generating.values(), return_exceptions=True)
@@ -0,0 +1,280 @@
+"""
+Server-authoritative Time-Travel timers.
+The server records when each session's question started (a client-supplied
+start is accepted only a few seconds into the past) and computes unlocked
+hints from its own clock. The start it issues is saved with the session's
+Time-Travel context, so after a restart, or on another worker, a client
+echoing that start resumes its timer instead of starting over. Every timed
+session shares one hashed timing wheel, advanced by a single task, so tens
+of thousands of sessions cost one wheel entry each rather than a task each.
+When a hint tier unlocks, by time passing or by an attempt, subscribers of
+that session (the SSE endpoint) get an event immediately instead of having
+to poll through /api/chat.
+"""
+import asyncio
+import itertools
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sessions import SessionOwnershipError
+
+logger = logging.getLogger(__name__)
+
+# Seconds after which a hint can unlock on time alone (given enough attempts)
+UNLOCK_TIMES = (30, 60, 90, 120)
+
+
+def unlocked_hints(elapsed: int, attempts: int) -> List[int]:
+    """
+    Hints unlocked after `elapsed` seconds and `attempts` attempts
+    - Hint 1: 30s OR 1 attempt
+    - Hint 2: 60s AND 1 attempt
+    - Hint 3: 90s AND 2 attempts
+    - Solution: 120s OR 3 attempts
+    """
+    unlocked = []
+    if elapsed >= 30 or attempts >= 1:
+        unlocked.append(1)
+    if elapsed >= 60 and attempts >= 1:
+        unlocked.append(2)
+    if elapsed >= 90 and attempts >= 2:
+        unlocked.append(3)
+    if elapsed >= 120 or attempts >= 3:
+        unlocked.append(4)
+    return unlocked
+
+
+class TimerWheel:
+    """Hashed timing wheel: O(1) schedule and cancel, one task advancing a slot per tick"""
+
+    def __init__(self, tick: float = 0.5, slots: int = 512):
+        self.tick = tick
+        self._slots: List[Dict[int, Tuple[int, Callable[[], None]]]] = [{} for _ in range(slots)]
+        self._where: Dict[int, int] = {}
+        self._ids = itertools.count()
+        self._position = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> int:
+        """Call `callback` on the first tick at least `delay` seconds from now; returns a handle"""
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self._position + ticks) % len(self._slots)
+        handle = next(self._ids)
+        # Full turns of the wheel to skip before the entry is due
+        self._slots[slot][handle] = ((ticks - 1) // len(self._slots), callback)
+        self._where[handle] = slot
+        return handle
+
+    def cancel(self, handle: int) -> None:
+        slot = self._where.pop(handle, None)
+        if slot is not None:
+            del self._slots[slot][handle]
+
+    def _advance(self) -> None:
+        self._position = (self._position + 1) % len(self._slots)
+        slot = self._slots[self._position]
+        due = []
+        for handle, (rounds, callback) in list(slot.items()):
+            if rounds:
+                slot[handle] = (rounds - 1, callback)
+            else:
+                del slot[handle]
+                del self._where[handle]
+                due.append(callback)
+        for callback in due:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Timer callback failed")
+
+    async def _run(self) -> None:
+        # Ticks are laid out on a fixed grid so a slow tick doesn't push back the rest
+        next_tick = time.monotonic() + self.tick
+        while True:
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+            next_tick += self.tick
+            self._advance()
+
+
+@dataclass
+class TimedSession:
+    uid: str
+    started_at: float
+    client_start_ms: Optional[int]
+    attempts: int = 0
+    unlocked: List[int] = field(default_factory=list)
+    timer: Optional[int] = None
+    subscribers: Set[asyncio.Queue] = field(default_factory=set)
+
+
+class HintTimers:
+    """Per-session question timers that push hint unlocks to subscribers"""
+
+    def __init__(self, max_sessions: int = 50000, max_backdate: float = 5.0, wheel: Optional[TimerWheel] = None):
+        self.max_sessions = max_sessions
+        # How far before its first chat turn a client may claim the question started
+        self.max_backdate = max_backdate
+        self.wheel = wheel or TimerWheel()
+        self._sessions: "OrderedDict[str, TimedSession]" = OrderedDict()
+        self.stats = {"started": 0, "resumed": 0, "unlockEvents": 0, "droppedEvents": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls) -> "HintTimers":
+        """Build timers from HINT_TIMER_* environment variables"""
+        return cls(
+            max_sessions=int(os.getenv("HINT_TIMER_MAX_SESSIONS", 50000)),
+            max_backdate=float(os.getenv("HINT_TIMER_MAX_BACKDATE_SECONDS", 5)),
+        )
+
+    def snapshot(self) -> dict:
+        subscribers = sum(len(session.subscribers) for session in self._sessions.values())
+        return {"sessions": len(self._sessions), "timers": len(self.wheel), "subscribers": subscribers, **self.stats}
+
+    def start(self) -> None:
+        self.wheel.start()
+
+    async def stop(self) -> None:
+        await self.wheel.stop()
+
+    def owner(self, session_id: str) -> Optional[str]:
+        session = self._sessions.get(session_id)
+        return session.uid if session else None
+
+    def begin(
+        self,
+        session_id: str,
+        uid: str,
+        client_start_ms: Optional[int] = None,
+        saved_start_ms: Optional[int] = None,
+    ) -> TimedSession:
+        """
+        The session's timer, started now if it has none or the client reports a new
+        question (a different questionStartTime); the client's start is clamped to
+        at most max_backdate seconds ago unless it is the server-issued start saved
+        with the session (`saved_start_ms`)
+        """
+        session = self._sessions.get(session_id)
+        if session is not None and session.uid != uid:
+            raise SessionOwnershipError("Session belongs to another user")
+        # Clients echo back either their own start or the server's from the last response
+        if session is not None and client_start_ms in (None, session.client_start_ms, int(session.started_at * 1000)):
+            self._sessions.move_to_end(session_id)
+            return session
+
+        now = time.time()
+        started_at = now
+        if client_start_ms is not None and client_start_ms == saved_start_ms:
+            started_at = min(now, saved_start_ms / 1000)
+            self.stats["resumed"] += 1
+        elif client_start_ms is not None:
+            started_at = min(now, max(client_start_ms / 1000, now - self.max_backdate))
+        if session is not None:
+            self.wheel.cancel(session.timer)
+            session.started_at, session.client_start_ms = started_at, client_start_ms
+            session.attempts, session.unlocked, session.timer = 0, [], None
+        else:
+            session = self._sessions[session_id] = TimedSession(uid, started_at, client_start_ms)
+            self._evict()
+        self._sessions.move_to_end(session_id)
+        self.stats["started"] += 1
+        self._update(session_id, session)
+        return session
+
+    def record_attempts(self, session_id: str, attempts: int) -> None:
+        session = self._sessions.get(session_id)
+        if session is not None and attempts != session.attempts:
+            session.attempts = attempts
+            self._update(session_id, session)
+
+    def state(self, session_id: str) -> dict:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return {"sessionId": session_id, "active": False}
+        return {
+            "sessionId": session_id,
+            "active": True,
+            "questionStartTime": int(session.started_at * 1000),
+            "elapsed": self.elapsed(session),
+            "attemptCount": session.attempts,
+            "unlockedHints": session.unlocked,
+            "nextUnlockIn": self._next_unlock(session),
+        }
+
+    @staticmethod
+    def elapsed(session: TimedSession) -> int:
+        return int(time.time() - session.started_at)
+
+    def subscribe(self, session_id: str) -> Optional[asyncio.Queue]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        queue: asyncio.Queue = asyncio.Queue(maxsize=16)
+        session.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, session_id: str, queue: asyncio.Queue) -> None:
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.subscribers.discard(queue)
+
+    def _next_unlock(self, session: TimedSession) -> Optional[float]:
+        """Seconds until the next time threshold that unlocks something at the current attempt count"""
+        elapsed = time.time() - session.started_at
+        upcoming = [
+            t for t in UNLOCK_TIMES
+            if t > int(elapsed) and len(unlocked_hints(t, session.attempts)) > len(session.unlocked)
+        ]
+        return round(upcoming[0] - elapsed, 3) if upcoming else None
+
+    def _update(self, session_id: str, session: TimedSession) -> None:
+        """Recompute unlocks, notify subscribers of new ones and arm the next timer"""
+        unlocked = unlocked_hints(self.elapsed(session), session.attempts)
+        newly = [hint for hint in unlocked if hint not in session.unlocked]
+        session.unlocked = unlocked
+        if newly:
+            self.stats["unlockEvents"] += 1
+            event = {**self.state(session_id), "newlyUnlocked": newly}
+            for queue in session.subscribers:
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    self.stats["droppedEvents"] += 1
+
+        if session.timer is not None:
+            self.wheel.cancel(session.timer)
+            session.timer = None
+        delay = self._next_unlock(session)
+        if delay is not None:
+            session.timer = self.wheel.schedule(delay, lambda: self._fire(session_id, session))
+
+    def _fire(self, session_id: str, session: TimedSession) -> None:
+        session.timer = None
+        if self._sessions.get(session_id) is session:
+            self._update(session_id, session)
+
+    def _evict(self) -> None:
+        while len(self._sessions) > self.max_sessions:
+            _, session = self._sessions.popitem(last=False)
+            if session.timer is not None:
+                self.wheel.cancel(session.timer)
+            self.stats["evictions"] += 1
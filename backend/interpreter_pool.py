@@ -0,0 +1,227 @@
+"""
+Warm interpreter workers for /api/execute.
+Each pool keeps a few Python or Node processes already started and parked on
+a small bootstrap that waits for one job on stdin: a length header, the
+source, then the program's own stdin. A worker runs exactly one job and is
+then replaced, so student code never shares an interpreter, but it no longer
+pays interpreter startup on the request path. Each worker runs in its own
+private workspace, removed together with the worker.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from sandbox import NO_LIMITS, ProcessResult, ResourceLimits, SandboxProcess
+from workspace import WorkspaceManager
+
+logger = logging.getLogger(__name__)
+
+PYTHON_BOOTSTRAP = r'''
+import sys
+def _thinkfirst_worker():
+    size = int(sys.stdin.buffer.readline())
+    source = sys.stdin.buffer.read(size).decode("utf-8")
+    import linecache
+    linecache.cache["main.py"] = (len(source), None, source.splitlines(True), "main.py")
+    code = compile(source, "main.py", "exec")
+    namespace = {"__name__": "__main__", "__file__": "main.py", "__builtins__": __builtins__}
+    try:
+        exec(code, namespace)
+    except SystemExit:
+        raise
+    except BaseException:
+        import traceback
+        etype, value, tb = sys.exc_info()
+        traceback.print_exception(etype, value, tb.tb_next)
+        sys.exit(1)
+_thinkfirst_worker()
+'''
+
+NODE_BOOTSTRAP = r'''
+const fs = require("fs");
+const path = require("path");
+const Module = require("module");
+function readExact(size) {
+  const buf = Buffer.alloc(size);
+  let off = 0;
+  while (off < size) {
+    let n;
+    try { n = fs.readSync(0, buf, off, size - off, null); }
+    catch (e) { if (e.code === "EAGAIN") continue; throw e; }
+    if (n === 0) break;
+    off += n;
+  }
+  return buf.subarray(0, off);
+}
+function readHeader() {
+  let header = "";
+  const one = Buffer.alloc(1);
+  while (true) {
+    let n;
+    try { n = fs.readSync(0, one, 0, 1, null); }
+    catch (e) { if (e.code === "EAGAIN") continue; throw e; }
+    if (n === 0 || one[0] === 10) break;
+    header += String.fromCharCode(one[0]);
+  }
+  return parseInt(header, 10);
+}
+const source = readExact(readHeader()).toString("utf8");
+const filename = path.join(process.cwd(), "main.js");
+const mod = new Module(filename, null);
+mod.filename = filename;
+mod.paths = Module._nodeModulePaths(process.cwd());
+process.argv[1] = filename;
+require.main = mod;
+mod._compile(source, filename);
+'''
+
+WORKER_COMMANDS: Dict[str, List[str]] = {
+    "python": ["python3", "-c", PYTHON_BOOTSTRAP],
+    "javascript": ["node", "-e", NODE_BOOTSTRAP],
+}
+
+
+# str and bytes hashes are salted per process, so without a fixed seed the
+# iteration order of a set of strings changes from run to run; with it, equal
+# programs print equal output, which the result cache relies on
+WORKER_ENV: Dict[str, Dict[str, str]] = {
+    "python": {"PYTHONHASHSEED": "0"},
+}
+
+
+def java_options(limits: ResourceLimits) -> List[str]:
+    """JVM flags that carry the memory limit, since RLIMIT_AS can't bound a JVM"""
+    return [f"-Xmx{limits.memory_mb}m", "-XX:+UseSerialGC"] if limits.memory_mb else []
+
+
+def worker_command(language: str, limits: ResourceLimits) -> List[str]:
+    command = list(WORKER_COMMANDS[language])
+    if language == "javascript" and limits.memory_mb:
+        # V8 needs its heap capped directly; RLIMIT_AS alone just crashes it
+        command.insert(1, f"--max-old-space-size={limits.memory_mb}")
+    return command
+
+
+class InterpreterPool:
+    """Pool of pre-started single-use interpreter workers for one language"""
+
+    def __init__(
+        self,
+        language: str,
+        size: int = 2,
+        max_idle: float = 300.0,
+        workspaces: Optional[WorkspaceManager] = None,
+        check_interval: float = 1.0,
+        limits: ResourceLimits = NO_LIMITS,
+    ):
+        self.language = language
+        self.limits = limits.for_language(language)
+        self.command = worker_command(language, self.limits)
+        self.env = WORKER_ENV.get(language)
+        self.size = size
+        self.max_idle = max_idle
+        self.workspaces = workspaces or WorkspaceManager()
+        self.check_interval = check_interval
+        self._ready: List[SandboxProcess] = []
+        self._maintainer: Optional[asyncio.Task] = None
+        self._refill = asyncio.Event()
+        self._stopping = False
+        self.stats = {"warmHits": 0, "coldStarts": 0, "spawned": 0, "recycled": 0, "unhealthy": 0}
+
+    async def start(self) -> None:
+        self._refill = asyncio.Event()
+        self._stopping = False
+        await self._top_up()
+        self._maintainer = asyncio.create_task(self._maintain())
+        logger.info(f"{self.language} interpreter pool started with {len(self._ready)} warm worker(s)")
+
+    async def stop(self) -> None:
+        # The flag ends the maintainer loop even if the cancel below is lost to a wait that just finished
+        self._stopping = True
+        self._refill.set()
+        if self._maintainer:
+            maintainer, self._maintainer = self._maintainer, None
+            maintainer.cancel()
+            try:
+                await maintainer
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    # stop() itself was cancelled, not just the maintainer
+                    raise
+        while self._ready:
+            await self._discard(self._ready.pop())
+
+    async def _spawn(self) -> SandboxProcess:
+        workspace = self.workspaces.create()
+        try:
+            worker = await SandboxProcess.spawn(self.command, cwd=workspace, limits=self.limits, env=self.env)
+        except BaseException:
+            self.workspaces.remove(workspace)
+            raise
+        worker.workspace = workspace
+        self.stats["spawned"] += 1
+        return worker
+
+    async def _discard(self, worker: SandboxProcess) -> None:
+        worker.kill()
+        await worker.wait()
+        worker.close()
+        self.workspaces.remove(worker.workspace)
+
+    async def _top_up(self) -> None:
+        while len(self._ready) < self.size:
+            try:
+                self._ready.append(await self._spawn())
+            except OSError as e:
+                logger.error(f"Could not start {self.language} worker: {e}")
+                return
+
+    async def _maintain(self) -> None:
+        """Replace used, dead and stale workers in the background"""
+        while not self._stopping:
+            refill = asyncio.ensure_future(self._refill.wait())
+            try:
+                await asyncio.wait({refill}, timeout=self.check_interval)
+            finally:
+                refill.cancel()
+            if self._stopping:
+                return
+            self._refill.clear()
+
+            now = time.monotonic()
+            healthy = []
+            for worker in self._ready:
+                if worker.returncode is not None:
+                    self.stats["unhealthy"] += 1
+                    await self._discard(worker)
+                elif now - worker.started_at > self.max_idle:
+                    self.stats["recycled"] += 1
+                    await self._discard(worker)
+                else:
+                    healthy.append(worker)
+            self._ready = healthy
+            await self._top_up()
+
+    async def _acquire(self) -> SandboxProcess:
+        while self._ready:
+            worker = self._ready.pop(0)
+            if worker.returncode is None:
+                self.stats["warmHits"] += 1
+                return worker
+            self.stats["unhealthy"] += 1
+            await self._discard(worker)
+        self.stats["coldStarts"] += 1
+        return await self._spawn()
+
+    async def run(self, code: str, stdin: Optional[str], timeout: float) -> ProcessResult:
+        """Run one job on a warm worker; raises subprocess.TimeoutExpired on timeout"""
+        worker = await self._acquire()
+        source = code.encode("utf-8")
+        payload = f"{len(source)}\n".encode() + source + (stdin or "").encode("utf-8")
+        try:
+            return await worker.communicate(payload, timeout)
+        finally:
+            await self._discard(worker)
+            # Replace the worker only once the job is done so the spawn doesn't compete with it for CPU
+            self._refill.set()
@@ -0,0 +1,207 @@
+"""
+Async LLM client layer shared by every endpoint that talks to the model.
+Keeps a pooled keep-alive HTTP connection set, caps in-flight calls per worker
+and applies a per-call timeout so a slow generation never blocks the event loop.
+Completions come back with the token usage the provider reported; streams
+report it through `on_usage` once the last chunk arrives.
+"""
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+from groq import AsyncGroq
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+
+
+class LLMTimeoutError(Exception):
+    """Raised when a model call exceeds its per-call timeout"""
+
+
+@dataclass
+class Completion:
+    text: str
+    # As reported by the provider; None when it didn't say
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+
+
+UsageCallback = Callable[[int, int], None]
+
+
+def _usage(payload: Any) -> Optional[Any]:
+    """Token usage of a completion or of a stream's last chunk (Groq puts the latter under x_groq)"""
+    usage = getattr(payload, "usage", None)
+    if usage is None:
+        usage = getattr(getattr(payload, "x_groq", None), "usage", None)
+    return usage
+
+
+class LLMClient:
+    """Async Groq client with connection pooling and bounded concurrency"""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        max_concurrency: int = 32,
+        max_connections: int = 64,
+        max_keepalive_connections: int = 32,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 60.0,
+        max_retries: int = 1,
+    ):
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, connect=10.0),
+        )
+        self._client = AsyncGroq(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self._http_client,
+            max_retries=max_retries,
+        )
+        self.in_flight = 0
+
+    @classmethod
+    def from_env(cls, api_key: str, base_url: Optional[str] = None) -> "LLMClient":
+        """Build a client from LLM_* environment variables"""
+        return cls(
+            api_key=api_key,
+            base_url=base_url or os.getenv("GROQ_BASE_URL") or None,
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 32)),
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", 64)),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 32)),
+            timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", 60)),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", 1)),
+        )
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = DEFAULT_MODEL,
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> Completion:
+        """Run one chat completion and return the message content with its token usage"""
+        call_timeout = timeout or self.timeout
+        try:
+            return await asyncio.wait_for(
+                self._complete(messages, model, temperature, max_tokens, call_timeout, **kwargs),
+                timeout=call_timeout,
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"LLM call timed out after {call_timeout}s (model={model})")
+            raise LLMTimeoutError(f"Model call exceeded {call_timeout}s")
+
+    async def _complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        call_timeout: float,
+        **kwargs: Any,
+    ) -> Completion:
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                completion = await self._client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    timeout=call_timeout,
+                    **kwargs,
+                )
+            finally:
+                self.in_flight -= 1
+        usage = _usage(completion)
+        return Completion(
+            completion.choices[0].message.content or "",
+            usage.prompt_tokens if usage else None,
+            usage.completion_tokens if usage else None,
+        )
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = DEFAULT_MODEL,
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+        timeout: Optional[float] = None,
+        on_usage: Optional[UsageCallback] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[str]:
+        """
+        Stream a chat completion, yielding content deltas as they arrive
+        `on_usage(prompt_tokens, completion_tokens)` is called if the provider reports usage
+        """
+        call_timeout = timeout or self.timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + call_timeout
+
+        def remaining() -> float:
+            left = deadline - loop.time()
+            if left <= 0:
+                raise LLMTimeoutError(f"Model stream exceeded {call_timeout}s")
+            return left
+
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=remaining())
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(f"Model stream exceeded {call_timeout}s")
+        self.in_flight += 1
+        try:
+            response = await asyncio.wait_for(
+                self._client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    timeout=call_timeout,
+                    stream=True,
+                    **kwargs,
+                ),
+                timeout=remaining(),
+            )
+            chunks = response.__aiter__()
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining())
+                    except StopAsyncIteration:
+                        break
+                    usage = _usage(chunk)
+                    if usage is not None and on_usage is not None:
+                        on_usage(usage.prompt_tokens, usage.completion_tokens)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await response.close()
+        except asyncio.TimeoutError:
+            logger.error(f"LLM stream timed out after {call_timeout}s (model={model})")
+            raise LLMTimeoutError(f"Model stream exceeded {call_timeout}s")
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {"inFlight": self.in_flight, "maxConcurrency": self.max_concurrency}
+
+    async def aclose(self) -> None:
+        await self._http_client.aclose()
@@ -0,0 +1,484 @@
+"""
+LLM gateway: several backends behind one client, with failover and hedging.
+Backends are LLMClients (Groq, or any endpoint speaking its API) tried in
+priority order. Each has a circuit breaker that opens after consecutive
+5xx/timeout/connection failures and lets a single probe through once it
+cools down, so a struggling provider is skipped instead of waited on. Rate
+limits (429) don't count toward the breaker: the provider is up, and its
+AdaptiveLimiter backs off instead. A call that fails with a retryable error
+fails over to the next healthy backend within the same overall deadline,
+or, with nothing left to fail over to, is retried on the same backend after
+its Retry-After. A call still unanswered after the configured latency
+percentile for its model gets one hedged duplicate (on another backend when
+there is one) and the first answer wins; hedges are limited by a budget
+that refills with traffic, so a slow provider can't double the load on
+itself. Streams fail over and hedge up to the first token.
+Calls to each backend pass through its AdaptiveLimiter, where they queue by
+priority when the backend is at its current concurrency limit; a stream
+holds its slot until it is closed.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from groq import APIConnectionError
+
+from llm import DEFAULT_MODEL, Completion, LLMClient, LLMTimeoutError
+from llm_limiter import AdaptiveLimiter, LimiterQueueFull
+
+logger = logging.getLogger(__name__)
+
+# Most hedges that can be saved up from the per-call budget
+HEDGE_BURST = 10.0
+
+
+class LLMUnavailableError(Exception):
+    """Raised when no backend could answer; retry_after is in seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Rate limits, server errors, timeouts and connection failures; not bad requests"""
+    if isinstance(error, (LLMTimeoutError, asyncio.TimeoutError, APIConnectionError, LimiterQueueFull)):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return status_code == 429 or (isinstance(status_code, int) and status_code >= 500)
+
+
+def trips_breaker(error: BaseException) -> bool:
+    """Failures that say the backend is unhealthy; a 429 only says it is busy"""
+    return is_retryable(error) and getattr(error, "status_code", None) != 429 and not isinstance(error, LimiterQueueFull)
+
+
+def retry_after_seconds(error: Optional[BaseException], default: float) -> float:
+    """The Retry-After a failed call came back with, or `default`"""
+    response = getattr(error, "response", None)
+    try:
+        return max(0.0, float(response.headers["retry-after"]))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return default
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; one probe is let through after `reset_timeout`"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets a probe through"""
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == "open" and self.retry_in() == 0:
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return self.state != "open"
+
+    def success(self) -> None:
+        self.state, self.failures, self._probing = "closed", 0, False
+
+    def failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+            self.state, self.opened_at = "open", time.monotonic()
+
+    def release(self) -> None:
+        """An attempt ended without saying anything about health (cancelled, bad request)"""
+        self._probing = False
+
+
+class Backend:
+    """One LLM endpoint with its breaker, model-name mapping and counters"""
+
+    def __init__(
+        self,
+        name: str,
+        client: LLMClient,
+        breaker: Optional[CircuitBreaker] = None,
+        models: Optional[Dict[str, str]] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ):
+        self.name = name
+        self.client = client
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter or AdaptiveLimiter()
+        # Our model names to this backend's, for providers that name models differently
+        self.models = models or {}
+        self.in_flight = 0
+        self.stats = {"calls": 0, "errors": 0, "cancelled": 0}
+
+    def model(self, model: str) -> str:
+        return self.models.get(model, model)
+
+    def snapshot(self) -> dict:
+        return {"state": self.breaker.state, "consecutiveFailures": self.breaker.failures,
+                "inFlight": self.in_flight, **self.stats, "limiter": self.limiter.snapshot()}
+
+
+Attempt = Callable[[Backend, str, float], Awaitable[Any]]
+
+
+class LLMGateway:
+    """LLMClient-compatible front for several backends with breakers, failover and hedged requests"""
+
+    def __init__(
+        self,
+        backends: List[Backend],
+        timeout: float = 60.0,
+        max_attempts: int = 3,
+        hedge_percentile: float = 0.95,
+        hedge_min_delay: float = 0.25,
+        hedge_initial_delay: float = 3.0,
+        hedge_budget: float = 0.1,
+        window: int = 256,
+        min_samples: int = 20,
+        retry_backoff: float = 0.5,
+    ):
+        if not backends:
+            raise ValueError("LLMGateway needs at least one backend")
+        self.backends = backends
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        # Used until a model has min_samples latencies to take a percentile of
+        self.hedge_initial_delay = hedge_initial_delay
+        # Hedges allowed per call, accumulated up to HEDGE_BURST
+        self.hedge_budget = hedge_budget
+        self._hedge_tokens = HEDGE_BURST
+        self.window = window
+        self.min_samples = min_samples
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._cleanup: set = set()
+        # Wait before retrying a backend that failed without a Retry-After, doubled per retry
+        self.retry_backoff = retry_backoff
+        self.counters = {"calls": 0, "hedges": 0, "hedgeWins": 0, "failovers": 0, "retries": 0, "unavailable": 0}
+
+    @classmethod
+    def from_env(cls, api_key: str) -> "LLMGateway":
+        """
+        Build a gateway from LLM_* environment variables: the Groq backend first,
+        then any extra backends from LLM_BACKENDS, e.g.
+        [{"name": "fallback", "base_url": "https://...", "api_key_env": "FALLBACK_API_KEY",
+          "models": {"llama-3.3-70b-versatile": "llama-3.3-70b"}}]
+        """
+        def breaker() -> CircuitBreaker:
+            return CircuitBreaker(
+                failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", 5)),
+                reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", 30)),
+            )
+
+        backends = [Backend("groq", LLMClient.from_env(api_key), breaker(), limiter=AdaptiveLimiter.from_env())]
+        for spec in json.loads(os.getenv("LLM_BACKENDS") or "[]"):
+            client = LLMClient.from_env(os.getenv(spec.get("api_key_env", ""), ""), base_url=spec.get("base_url"))
+            backends.append(Backend(spec["name"], client, breaker(), spec.get("models"), AdaptiveLimiter.from_env()))
+        return cls(
+            backends,
+            timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", 60)),
+            max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", 3)),
+            hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", 0.95)),
+            hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", 0.25)),
+            hedge_initial_delay=float(os.getenv("LLM_HEDGE_INITIAL_DELAY_SECONDS", 3)),
+            hedge_budget=float(os.getenv("LLM_HEDGE_BUDGET", 0.1)),
+            retry_backoff=float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", 0.5)),
+        )
+
+    def hedge_delay(self, key: str) -> float:
+        """The configured percentile of recent successful latencies for a model (and call kind)"""
+        samples = self._latencies.get(key)
+        if not samples or len(samples) < self.min_samples:
+            return self.hedge_initial_delay
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(self.hedge_percentile * len(ordered)))
+        return max(self.hedge_min_delay, ordered[index])
+
+    def _pick(self, tried: List[Backend], repeat: bool = False) -> Optional[Backend]:
+        """
+        First healthy backend not tried yet; with `repeat`, a tried one if nothing else is
+        left and it has spare concurrency (a duplicate that would only queue is no hedge)
+        """
+        for backend in self.backends:
+            if backend not in tried and backend.breaker.allow():
+                return backend
+        if repeat:
+            for backend in self.backends:
+                if backend.breaker.state == "closed" and not backend.limiter.queue_depth:
+                    return backend
+        return None
+
+    def _retry_after(self, error: Optional[BaseException] = None) -> int:
+        wait = min(backend.breaker.retry_in() for backend in self.backends)
+        return max(1, round(max(wait, retry_after_seconds(error, 0.0))))
+
+    async def _attempt(
+        self, backend: Backend, model: str, key: str, attempt: Attempt, priority: int, deadline: float,
+        hold: bool = False,
+    ) -> Any:
+        loop = asyncio.get_running_loop()
+        backend.stats["calls"] += 1
+        try:
+            await backend.limiter.acquire(priority, deadline - loop.time())
+        except (asyncio.TimeoutError, LimiterQueueFull):
+            # Queueing says nothing about the backend's health; leave the breaker (and any probe) alone
+            backend.breaker.release()
+            raise
+        except asyncio.CancelledError:
+            backend.breaker.release()
+            raise
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            backend.breaker.release()
+            backend.limiter.release("ignore")
+            raise LLMTimeoutError("Model call deadline passed before the attempt started")
+        backend.in_flight += 1
+        started = time.perf_counter()
+        try:
+            result = await attempt(backend, backend.model(model), timeout)
+        except asyncio.CancelledError:
+            self._settle(backend, key, started, cancelled=True)
+            raise
+        except Exception as e:
+            self._settle(backend, key, started, error=e)
+            raise
+        self._latencies.setdefault(key, deque(maxlen=self.window)).append(time.perf_counter() - started)
+        if hold:
+            # The caller keeps the slot (an open stream) and settles it when done
+            return result, partial(self._settle, backend, key, started)
+        self._settle(backend, key, started)
+        return result
+
+    def _settle(
+        self, backend: Backend, key: str, started: float,
+        error: Optional[BaseException] = None, cancelled: bool = False,
+    ) -> None:
+        """Give back an attempt's slot and report how it ended to the breaker and limiter"""
+        backend.in_flight -= 1
+        if cancelled:
+            backend.stats["cancelled"] += 1
+            backend.breaker.release()
+            backend.limiter.release("ignore")
+        elif error is not None:
+            backend.stats["errors"] += 1
+            if trips_breaker(error):
+                backend.breaker.failure()
+                logger.warning(f"LLM backend {backend.name} failed: {error}")
+            else:
+                backend.breaker.release()
+            backend.limiter.release("overload" if getattr(error, "status_code", None) == 429 else "error")
+        else:
+            backend.breaker.success()
+            backend.limiter.release("ok", time.perf_counter() - started, key)
+
+    async def _race(
+        self,
+        model: str,
+        key: str,
+        attempt: Attempt,
+        timeout: Optional[float],
+        priority: int,
+        discard: Optional[Callable[[Any], None]] = None,
+        hold: bool = False,
+    ) -> Any:
+        """
+        Run `attempt` with failover and at most one hedge; the first successful result wins
+        `key` selects the latency history the hedge delay comes from; results that lose go to `discard`
+        With `hold`, results come paired with a callback that releases the backend slot
+        """
+        loop = asyncio.get_running_loop()
+        budget = timeout or self.timeout
+        deadline = loop.time() + budget
+        self.counters["calls"] += 1
+        self._hedge_tokens = min(self._hedge_tokens + self.hedge_budget, HEDGE_BURST)
+
+        tried: List[Backend] = []
+        pending: Dict[asyncio.Task, Tuple[Backend, bool]] = {}
+        last_error: Optional[BaseException] = None
+
+        def launch(backend: Backend, hedge: bool = False) -> None:
+            tried.append(backend)
+            task = asyncio.create_task(self._attempt(backend, model, key, attempt, priority, deadline, hold))
+            # Losing attempts finish unobserved; retrieve their outcome so nothing is logged as lost
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            pending[task] = (backend, hedge)
+
+        first = self._pick(tried)
+        if first is None:
+            self.counters["unavailable"] += 1
+            raise LLMUnavailableError("Every LLM backend's circuit is open", self._retry_after())
+        launch(first)
+        hedge_at: Optional[float] = loop.time() + self.hedge_delay(key)
+
+        try:
+            while pending:
+                wake_at = deadline if hedge_at is None else min(hedge_at, deadline)
+                done, _ = await asyncio.wait(
+                    pending, timeout=max(0.0, wake_at - loop.time()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if loop.time() >= deadline:
+                        raise LLMTimeoutError(f"Model call exceeded {budget}s")
+                    hedge_at = None
+                    backend = self._pick(tried, repeat=True) if self._hedge_tokens >= 1 else None
+                    if backend is not None and len(tried) < self.max_attempts:
+                        self._hedge_tokens -= 1
+                        self.counters["hedges"] += 1
+                        launch(backend, hedge=True)
+                    continue
+
+                winner = None
+                for task in sorted(done, key=lambda t: t.exception() is not None):
+                    backend, hedge = pending.pop(task)
+                    error = task.exception()
+                    if error is None and winner is None:
+                        winner = task
+                        if hedge:
+                            self.counters["hedgeWins"] += 1
+                    elif error is None:
+                        if discard:
+                            discard(task.result())
+                    elif not is_retryable(error):
+                        raise error
+                    else:
+                        last_error = error
+                if winner is not None:
+                    return winner.result()
+
+                if not pending and len(tried) < self.max_attempts:
+                    backend = self._pick(tried)
+                    if backend is not None:
+                        self.counters["failovers"] += 1
+                        logger.info(f"Failing over to LLM backend {backend.name}")
+                        launch(backend)
+                        continue
+                    # Nothing left to fail over to: retry once the backend says it's ready, if the deadline allows
+                    delay = retry_after_seconds(last_error, self.retry_backoff * 2 ** (len(tried) - 1))
+                    if loop.time() + delay >= deadline:
+                        break
+                    await asyncio.sleep(delay)
+                    backend = self._pick([])
+                    if backend is not None:
+                        self.counters["retries"] += 1
+                        launch(backend)
+        finally:
+            for task in pending:
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    # Finished in the same tick as the winner; too late to cancel
+                    if discard:
+                        discard(task.result())
+                else:
+                    task.cancel()
+
+        self.counters["unavailable"] += 1
+        if isinstance(last_error, LLMTimeoutError):
+            raise last_error
+        raise LLMUnavailableError(f"No LLM backend could answer: {last_error}", self._retry_after(last_error)) from last_error
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = DEFAULT_MODEL,
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+        timeout: Optional[float] = None,
+        priority: int = 1,
+        **kwargs: Any,
+    ) -> Completion:
+        """
+        Run one chat completion on the first backend to answer and return its content and usage
+        `priority` orders calls waiting for a concurrency slot, lower first
+        """
+        async def attempt(backend: Backend, backend_model: str, remaining: float) -> Completion:
+            return await backend.client.complete(
+                messages, model=backend_model, temperature=temperature,
+                max_tokens=max_tokens, timeout=remaining, **kwargs,
+            )
+
+        return await self._race(model, model, attempt, timeout, priority)
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = DEFAULT_MODEL,
+        temperature: float = 0.7,
+        max_tokens: int = 2048,
+        timeout: Optional[float] = None,
+        priority: int = 1,
+        **kwargs: Any,
+    ) -> AsyncIterator[str]:
+        """Stream a chat completion from the first backend to produce a token"""
+        async def attempt(backend: Backend, backend_model: str, remaining: float) -> Tuple[AsyncIterator[str], Optional[str]]:
+            chunks = backend.client.stream(
+                messages, model=backend_model, temperature=temperature,
+                max_tokens=max_tokens, timeout=remaining, **kwargs,
+            )
+            try:
+                return chunks, await chunks.__anext__()
+            except StopAsyncIteration:
+                return chunks, None
+            except BaseException:
+                await chunks.aclose()
+                raise
+
+        async def close(chunks: AsyncIterator[str], settle: Callable[..., None], **outcome: Any) -> None:
+            try:
+                await chunks.aclose()
+            finally:
+                settle(**outcome)
+
+        def discard(opened: Tuple[Tuple[AsyncIterator[str], Optional[str]], Callable[..., None]]) -> None:
+            (chunks, _), settle = opened
+            task = asyncio.create_task(close(chunks, settle, cancelled=True))
+            self._cleanup.add(task)
+            task.add_done_callback(self._cleanup.discard)
+
+        # Streams are hedged on time to first token, completions on total time
+        (chunks, first), settle = await self._race(
+            model, f"{model} (stream)", attempt, timeout, priority, discard, hold=True
+        )
+        # A consumer that stops early leaves the outcome as cancelled
+        outcome: Dict[str, Any] = {"cancelled": True}
+        try:
+            if first is not None:
+                yield first
+                async for delta in chunks:
+                    yield delta
+            outcome = {}
+        except Exception as e:
+            outcome = {"error": e}
+            raise
+        finally:
+            await close(chunks, settle, **outcome)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inFlight": sum(backend.in_flight for backend in self.backends),
+            **self.counters,
+            "hedgeDelayMs": {key: round(self.hedge_delay(key) * 1000) for key in self._latencies},
+            "backends": {backend.name: backend.snapshot() for backend in self.backends},
+        }
+
+    async def aclose(self) -> None:
+        for backend in self.backends:
+            await backend.client.aclose()
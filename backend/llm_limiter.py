@@ -0,0 +1,149 @@
+"""
+Adaptive (AIMD) concurrency limit for outbound model calls.
+Each LLM backend gets a limiter whose limit grows by about one slot per
+limit's worth of healthy calls and is cut multiplicatively on a 429 or when
+latency climbs well above its recent norm, at most once per cooldown so one
+burst of rejections counts once. Calls over the limit wait in a priority
+queue (lower number first, FIFO within a priority) until a slot frees or
+their deadline passes; a full queue rejects immediately. Under a classroom
+spike this keeps the request rate near what the provider accepts, so
+requests queue for a moment instead of each one failing on its own.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LimiterQueueFull(Exception):
+    """Raised when a call can't even wait for a slot"""
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit with a deadline-aware priority queue"""
+
+    def __init__(
+        self,
+        initial: float = 8,
+        min_limit: float = 1,
+        max_limit: float = 32,
+        backoff: float = 0.5,
+        latency_backoff: float = 0.9,
+        latency_tolerance: float = 2.0,
+        cooldown: float = 1.0,
+        max_queue: int = 500,
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        # Multipliers applied on a 429 and on a latency rise
+        self.backoff = backoff
+        self.latency_backoff = latency_backoff
+        # Short-term latency above this multiple of the long-term average counts as overload
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._waiting = 0
+        self._seq = itertools.count()
+        self._last_decrease = 0.0
+        # Per model: (short EWMA, long EWMA, samples)
+        self._latency: Dict[str, Tuple[float, float, int]] = {}
+        self.stats = {"throttled": 0, "latencyBackoffs": 0, "queued": 0, "expired": 0, "rejected": 0}
+
+    @classmethod
+    def from_env(cls) -> "AdaptiveLimiter":
+        """Build a limiter from LLM_LIMIT_* environment variables"""
+        return cls(
+            initial=float(os.getenv("LLM_LIMIT_INITIAL", 8)),
+            min_limit=float(os.getenv("LLM_LIMIT_MIN", 1)),
+            max_limit=float(os.getenv("LLM_LIMIT_MAX", os.getenv("LLM_MAX_CONCURRENCY", 32))),
+            latency_tolerance=float(os.getenv("LLM_LIMIT_LATENCY_TOLERANCE", 2)),
+            max_queue=int(os.getenv("LLM_LIMIT_MAX_QUEUE", 500)),
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def snapshot(self) -> dict:
+        return {"limit": round(self.limit, 2), "inFlight": self.in_flight, "queueDepth": self._waiting, **self.stats}
+
+    def _has_slot(self) -> bool:
+        return self.in_flight < max(1, int(self.limit))
+
+    async def acquire(self, priority: int, timeout: float) -> None:
+        """Wait up to `timeout` seconds for a slot; asyncio.TimeoutError when the deadline passes"""
+        if self._has_slot() and not self._waiting:
+            self.in_flight += 1
+            return
+        if self._waiting >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise LimiterQueueFull(f"{self._waiting} model calls already waiting")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._waiting += 1
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=max(0.0, timeout))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done():
+                # Granted just as the wait ended; hand the slot on
+                self.release("ignore")
+            else:
+                future.cancel()
+                self._waiting -= 1
+                if isinstance(e, asyncio.TimeoutError):
+                    self.stats["expired"] += 1
+            raise
+
+    def _wake(self) -> None:
+        while self._waiters and self._has_slot():
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._waiting -= 1
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _decrease(self, factor: float) -> bool:
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return False
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * factor)
+        return True
+
+    def _latency_rose(self, key: str, latency: float) -> bool:
+        short, long, samples = self._latency.get(key, (latency, latency, 0))
+        short += 0.2 * (latency - short)
+        long += 0.02 * (latency - long)
+        self._latency[key] = (short, long, samples + 1)
+        return samples >= 20 and short > self.latency_tolerance * long
+
+    def release(self, outcome: str, latency: Optional[float] = None, key: str = "") -> None:
+        """
+        Give the slot back and adapt the limit: "ok" (with its latency), "overload"
+        (a 429), or "error"/"ignore" for outcomes that say nothing about load
+        """
+        utilized = self.in_flight >= self.limit / 2
+        self.in_flight -= 1
+        if outcome == "overload":
+            if self._decrease(self.backoff):
+                self.stats["throttled"] += 1
+                logger.warning(f"Model rate limited; concurrency limit cut to {self.limit:.1f}")
+        elif outcome == "ok" and latency is not None:
+            if self._latency_rose(key, latency):
+                if self._decrease(self.latency_backoff):
+                    self.stats["latencyBackoffs"] += 1
+            elif utilized:
+                # Additive increase: about one slot per limit's worth of healthy calls
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self._wake()
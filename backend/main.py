@@ -1,11 +1,12 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field, PrivateAttr
+from typing import Optional, List, Dict, Any, Tuple, FrozenSet
+import asyncio
 import firebase_admin
 from firebase_admin import credentials, auth, firestore
-from groq import Groq
 import os
 from dotenv import load_dotenv
 import json
@@ -13,18 +14,61 @@ import re
 from datetime import datetime
 import logging
 import subprocess
-import uuid
 import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from assessment_cache import AssessmentCache
+from auth_cache import VerifiedTokenCache
+from coalescing import IdempotencyConflict, SingleFlight, fingerprint
+from context_window import HistoryAssembler, truncate_to_tokens
+from compile_cache import CompileCache
+import complexity
+from exec_scheduler import ClientDisconnected, ExecutionScheduler, QueueFullError, cancel_on_disconnect
+from executor import CodeExecutor, TestCase, normalize_language
+from hint_ladder import HINT_LEVELS, HintLadderCache
+from hint_timers import HintTimers, TimedSession, unlocked_hints
+from interpreter_pool import InterpreterPool
+from llm import LLMTimeoutError
+from llm_gateway import LLMGateway, LLMUnavailableError
+from memory_prescore import MemoryPrescorer, profile_solution
+from model_router import ModelRouter
+import phrase_matcher
+from persistence import FirestoreWriteQueue
+from result_cache import ExecutionResultCache
+from sandbox import ResourceLimits
+from sessions import SessionOwnershipError, SessionStore, SessionVersionConflict
+from streaming import JsonTextFieldStream, sse_event
+from workspace import WorkspaceManager
 
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    write_queue.start()
+    token_cache.start()
+    hint_timers.start()
+    for pool in interpreter_pools.values():
+        await pool.start()
+    yield
+    await hint_ladder.stop()
+    await hint_timers.stop()
+    for pool in interpreter_pools.values():
+        await pool.stop()
+    await token_cache.stop()
+    await write_queue.stop()
+    await llm_gateway.aclose()
+
+
 app = FastAPI(
     title="ThinkFirst AI Backend",
     version="2.0.0",
-    description="Educational AI with Progressive Learning, Amnesia Mode, Time-Travel Hints & Code Execution"
+    description="Educational AI with Progressive Learning, Amnesia Mode, Time-Travel Hints & Code Execution",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -41,6 +85,7 @@ app.add_middleware(
 )
 
 security = HTTPBearer()
+token_cache = VerifiedTokenCache.from_env()
 
 try:
     if os.getenv("FIREBASE_SERVICE_ACCOUNT_JSON"):
@@ -51,6 +96,8 @@ try:
     
     firebase_admin.initialize_app(cred)
     db = firestore.client()
+    write_queue = FirestoreWriteQueue.from_env(db)
+    session_store = SessionStore.from_env(db)
     logger.info("Firebase Admin SDK initialized successfully")
 except Exception as e:
     logger.error(f" Firebase initialization error: {e}")
@@ -60,7 +107,32 @@ groq_api_key = os.getenv("GROQ_API_KEY")
 if not groq_api_key:
     raise ValueError("GROQ_API_KEY environment variable is required")
 
-groq_client = Groq(api_key=groq_api_key)
+llm_gateway = LLMGateway.from_env(groq_api_key)
+model_router = ModelRouter.from_env(llm_gateway)
+# Double-clicks and client retries share one model call instead of making their own
+chat_flight = SingleFlight.from_env()
+memory_flight = SingleFlight.from_env()
+memory_prescorer = MemoryPrescorer.from_env()
+assessment_cache = AssessmentCache.from_env(db, write_queue)
+
+exec_limits = ResourceLimits.from_env()
+exec_workspaces = WorkspaceManager.from_env()
+interpreter_pools = {
+    language: InterpreterPool(
+        language,
+        size=int(os.getenv("EXEC_POOL_SIZE", 2)),
+        max_idle=float(os.getenv("EXEC_POOL_MAX_IDLE_SECONDS", 300)),
+        limits=exec_limits,
+        workspaces=exec_workspaces
+    )
+    for language in ("python", "javascript")
+}
+compile_cache = CompileCache.from_env(exec_workspaces)
+code_executor = CodeExecutor(interpreter_pools, compile_cache, limits=exec_limits, workspaces=exec_workspaces)
+exec_scheduler = ExecutionScheduler.from_env()
+result_cache = ExecutionResultCache.from_env()
+batch_parallelism = int(os.getenv("EXEC_BATCH_PARALLELISM", 4))
+profile_max_size = int(os.getenv("EXEC_PROFILE_MAX_SIZE", 256000))
 
 
 class ConversationMessage(BaseModel):
@@ -81,10 +153,18 @@ class TimeTravelContext(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
-    conversationHistory: List[ConversationMessage]
-    conversationContext: ConversationContext
+    # Optional once the server holds the session; old clients still send full state
+    conversationHistory: Optional[List[ConversationMessage]] = None
+    conversationContext: Optional[ConversationContext] = None
     sessionId: str
     timeTravelContext: Optional[TimeTravelContext] = None
+    version: Optional[int] = None
+    # Client-generated ID; a retry with the same ID gets the same reply
+    requestId: Optional[str] = Field(default=None, max_length=128)
+    # Session messages before conversationHistory[0]; set when the history comes from the session store
+    _history_offset: int = PrivateAttr(default=0)
+    # Session version the turn was built on; recording it is a compare-and-set against this
+    _base_version: Optional[int] = PrivateAttr(default=None)
 
 class ChatResponse(BaseModel):
     text: str
@@ -93,11 +173,13 @@ class ChatResponse(BaseModel):
     isSolution: bool = False
     conversationContext: ConversationContext
     timeTravelContext: Optional[TimeTravelContext] = None
+    version: Optional[int] = None
 
 class AmnesiaCheckRequest(BaseModel):
     originalSolution: str
     userReconstruction: str
     currentTopic: Optional[str] = None
+    requestId: Optional[str] = Field(default=None, max_length=128)
 
 class AmnesiaCheckResponse(BaseModel):
     logicScore: int
@@ -109,6 +191,7 @@ class ExecuteCodeRequest(BaseModel):
     code: str
     language: str
     input: Optional[str] = None
+    noCache: bool = False
 
 class ExecuteCodeResponse(BaseModel):
     output: str
@@ -116,14 +199,72 @@ class ExecuteCodeResponse(BaseModel):
     executionTime: Optional[float] = None
     language: str
     success: bool
+    cached: bool = False
+
+class BatchTestCase(BaseModel):
+    input: Optional[str] = None
+    expectedOutput: Optional[str] = None
+
+class ExecuteBatchRequest(BaseModel):
+    code: str
+    language: str
+    testCases: List[BatchTestCase] = Field(..., min_length=1, max_length=int(os.getenv("EXEC_BATCH_MAX_CASES", 50)))
+    stopOnFirstFailure: bool = False
+
+class TestCaseResult(BaseModel):
+    index: int
+    output: str
+    error: Optional[str] = None
+    passed: bool
+    skipped: bool = False
+    executionTime: Optional[float] = None
+    peakMemoryKb: Optional[int] = None
+
+class InputGeneratorSpec(BaseModel):
+    kind: str = "array"
+    minValue: int = 0
+    maxValue: int = 1000000
+    includeSize: bool = True
+    seed: int = 42
+
+class ProfileRequest(BaseModel):
+    code: str
+    language: str
+    generator: InputGeneratorSpec = Field(default_factory=InputGeneratorSpec)
+    sizes: Optional[List[int]] = Field(None, min_length=3, max_length=10)
+    repeats: int = Field(1, ge=1, le=3)
+
+class ProfileSample(BaseModel):
+    size: int
+    cpuTime: float
+    wallTime: float
+    peakMemoryKb: int
+
+class ProfileResponse(BaseModel):
+    language: str
+    timeComplexity: Optional[str] = None
+    spaceComplexity: Optional[str] = None
+    samples: List[ProfileSample]
+    error: Optional[str] = None
+    note: Optional[str] = None
+    success: bool
+
+class ExecuteBatchResponse(BaseModel):
+    language: str
+    results: List[TestCaseResult]
+    passedCount: int
+    totalCount: int
+    compileError: Optional[str] = None
+    executionTime: float
+    success: bool
 
 async def verify_firebase_token(
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> dict:
-    """Verify Firebase JWT token and return decoded token"""
+    """Verify Firebase JWT token and return decoded token (cached until the token's exp)"""
     try:
         token = credentials.credentials
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = await token_cache.verify(token)
         return decoded_token
     except auth.InvalidIdTokenError:
         raise HTTPException(
@@ -145,21 +286,19 @@ async def verify_firebase_token(
 def analyze_context(
     message: str,
     conversation_history: List[ConversationMessage],
-    previous_context: Optional[ConversationContext]
+    previous_context: Optional[ConversationContext],
+    hits: Optional[FrozenSet[str]] = None
 ) -> ConversationContext:
     """
     Smart context analyzer - preserves exact logic from Firebase Functions
     Detects: weather/news requests, solution requests, genuine attempts, follow-ups
+    Phrase categories come from one pass of the precompiled matcher (pass `hits` to reuse a classification)
     """
     msg_lower = message.lower().strip()
+    if hits is None:
+        hits = phrase_matcher.matcher.classify(msg_lower)
     
-    weather_patterns = ["weather", "temperature", "how hot", "how cold", "climate", "forecast"]
-    news_patterns = ["news", "today's news", "latest news", "current events", "headlines"]
-    
-    is_weather_request = any(p in msg_lower for p in weather_patterns)
-    is_news_request = any(p in msg_lower for p in news_patterns)
-    
-    if is_weather_request or is_news_request:
+    if phrase_matcher.WEATHER in hits or phrase_matcher.NEWS in hits:
         logger.info(' Real-time data request detected - staying in chat mode')
         return ConversationContext(
             currentTopic=None,
@@ -167,56 +306,19 @@ def analyze_context(
             isLearningMode=False
         )
   
-    solution_request_phrases = [
-        "give me the answer", "give the answer", "just give me",
-        "give me solution", "give the solution", "show me the answer",
-        "show the solution", "what is the solution", "what's the solution",
-        "tell me the solution", "just show me", "just tell me"
-    ]
-    is_asking_for_solution = any(phrase in msg_lower for phrase in solution_request_phrases)
-    
-    attempt_phrases = [
-        "i tried", "i think", "maybe", "is it", "would it be",
-        "should i", "idk", "i don't know", "not sure", "i'm stuck", "can't figure"
-    ]
-    is_genuine_attempt = any(phrase in msg_lower for phrase in attempt_phrases)
-    
-
-    back_to_previous_phrases = ["back to", "return to", "again about", "still don't get"]
-    is_returning_to_previous = any(phrase in msg_lower for phrase in back_to_previous_phrases)
-
-    learning_keywords = [
-        "how do i", "how to", "how about", "what about",
-        "explain", "solve", "algorithm for", "solution for", "implement"
-    ]
-    is_new_learning_question = any(kw in msg_lower for kw in learning_keywords)
-    
-    follow_up_keywords = [
-        "time complexity", "space complexity", "complexity",
-        "why does this", "why is", "can you explain more",
-        "what do you mean", "how does that", "give me a hint",
-        "give hint", "another hint"
-    ]
-    is_follow_up = any(kw in msg_lower for kw in follow_up_keywords)
-
-    chat_keywords = ["hello", "hi", "hey", "thanks", "thank you", "okay", "ok", "got it", "cool"]
-    is_general_chat = any(
-        msg_lower == kw or msg_lower.startswith(f"{kw} ") or msg_lower.startswith(f"{kw}!")
-        for kw in chat_keywords
-    )
-    
-    def extract_topic(msg: str) -> str:
-        words = msg.lower().split()
-        stop_words = ["how", "to", "the", "a", "an", "what", "is", "explain", "can", "you", "i", "do", "about", "for"]
-        meaningful = [w for w in words if w not in stop_words and len(w) > 3]
-        return " ".join(meaningful[:3])
+    is_asking_for_solution = phrase_matcher.SOLUTION_REQUEST in hits
+    is_genuine_attempt = phrase_matcher.ATTEMPT in hits
+    is_returning_to_previous = phrase_matcher.BACK_TO in hits
+    is_new_learning_question = phrase_matcher.LEARNING in hits
+    is_follow_up = phrase_matcher.FOLLOW_UP in hits
+    is_general_chat = phrase_matcher.GENERAL_CHAT in hits
     
     if is_general_chat and not is_new_learning_question:
         logger.info('Detected: General chat')
         return ConversationContext(currentTopic=None, attemptCount=0, isLearningMode=False)
 
     if is_new_learning_question and not is_returning_to_previous:
-        new_topic = extract_topic(message)
+        new_topic = phrase_matcher.extract_topic(message)
         logger.info(f' Detected: New learning question - {new_topic}')
         return ConversationContext(
             currentTopic=new_topic,
@@ -226,7 +328,7 @@ def analyze_context(
     
     if is_returning_to_previous and conversation_history:
         previous_topics = [
-            extract_topic(msg.text)
+            phrase_matcher.extract_topic(msg.text)
             for msg in conversation_history
             if msg.role == 'user'
         ]
@@ -286,11 +388,7 @@ def analyze_context(
 def calculate_unlocked_hints(time_travel_ctx: TimeTravelContext) -> List[int]:
     """
     Calculate which hints should be unlocked based on time and attempts
-    Rules:
-    - Hint 1: 30s OR 1 attempt
-    - Hint 2: 60s AND 1 attempt
-    - Hint 3: 90s AND 2 attempts
-    - Solution: 120s OR 3 attempts
+    Rules are in hint_timers.unlocked_hints, shared with the server-side timers
     """
     elapsed = 0
     if time_travel_ctx.questionStartTime:
@@ -298,28 +396,13 @@ def calculate_unlocked_hints(time_travel_ctx: TimeTravelContext) -> List[int]:
         elapsed = (current_time_ms - time_travel_ctx.questionStartTime) // 1000
     
     attempts = time_travel_ctx.attemptCount or 0
-    unlocked = []
-    
-    if elapsed >= 30 or attempts >= 1:
-        unlocked.append(1)
-    
-    if elapsed >= 60 and attempts >= 1:
-        unlocked.append(2)
-    
-    if elapsed >= 90 and attempts >= 2:
-        unlocked.append(3)
-    
-    if elapsed >= 120 or attempts >= 3:
-        unlocked.append(4)
+    unlocked = unlocked_hints(elapsed, attempts)
     
     logger.info(f"⏰ Time-Travel: {elapsed}s, {attempts} attempts → Unlocked: {unlocked}")
     return unlocked
 
 
-def build_system_prompt(context: ConversationContext, time_travel_ctx: Optional[TimeTravelContext] = None) -> str:
-    """Build progressive system prompt based on context"""
-    
-    base_prompt = """You are ThinkFirst AI, an intelligent educational assistant that adapts to user needs.
+BASE_PROMPT = """You are ThinkFirst AI, an intelligent educational assistant that adapts to user needs.
 
 YOUR CORE RULES:
 1. RESPOND DIRECTLY - Give your answer immediately without explaining your thought process
@@ -340,57 +423,33 @@ FOR LEARNING QUESTIONS:
 - Use progressive hints based on attempt count
 - Be encouraging
 """
-    
-    if context.isLearningMode:
-        attempt_count = context.attemptCount
-        current_topic = context.currentTopic
-        
-        base_prompt += f"\n\nCURRENT MODE: LEARNING MODE\nTopic: \"{current_topic}\"\nAttempt: {attempt_count}\n\nPROGRESSIVE GUIDANCE:\n"
-        
-        if attempt_count == 0:
-            base_prompt += """- This is the FIRST interaction with this topic
+
+LEARNING_GUIDANCE = {
+    0: """- This is the FIRST interaction with this topic
 - Give a conceptual hint that makes them think
 - Ask guiding questions to assess understanding
-- Set isHint: true, isSolution: false, mode: "learning\""""
-        elif attempt_count == 1:
-            base_prompt += """- This is attempt 1 (SECOND attempt)
+- Set isHint: true, isSolution: false, mode: "learning\"""",
+    1: """- This is attempt 1 (SECOND attempt)
 - Provide stronger hints with techniques or approaches
 - Point toward relevant concepts/algorithms
-- Set isHint: true, isSolution: false, mode: "learning\""""
-        elif attempt_count == 2:
-            base_prompt += """- This is attempt 2 (THIRD attempt)
+- Set isHint: true, isSolution: false, mode: "learning\"""",
+    2: """- This is attempt 2 (THIRD attempt)
 - Give pseudocode or step-by-step roadmap
 - Be explicit about the approach
-- Set isHint: true, isSolution: false, mode: "learning\""""
-        else:
-            base_prompt += """- This is attempt 3+ (FOURTH+ attempt or direct solution request)
+- Set isHint: true, isSolution: false, mode: "learning\"""",
+    3: """- This is attempt 3+ (FOURTH+ attempt or direct solution request)
 - Provide COMPLETE solution with detailed explanation
 - Include code examples with proper syntax
 - Explain WHY each step works
-- Set isHint: false, isSolution: true, mode: "learning\""""
-        
-        base_prompt += "\n\nIMPORTANT: If user asks a follow-up about complexity/clarification, answer directly without treating it as a new attempt."
-    
-    if time_travel_ctx and time_travel_ctx.isActive:
-        elapsed = 0
-        if time_travel_ctx.questionStartTime:
-            current_time_ms = int(time.time() * 1000)
-            elapsed = (current_time_ms - time_travel_ctx.questionStartTime) // 1000
-        
-        unlocked = time_travel_ctx.unlockedHints
-        attempts = time_travel_ctx.attemptCount
-        
-        base_prompt += f"""
+- Set isHint: false, isSolution: true, mode: "learning\"""",
+}
+
+TIME_TRAVEL_RULES = """
 
 ⏱️ TIME-TRAVEL MODE ACTIVE
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Elapsed time: {elapsed}s
-Attempts made: {attempts}
-Unlocked hints: {unlocked}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
 CRITICAL TIME-TRAVEL RULES:
- You can ONLY provide hints in the unlocked list: {unlocked}
+ You can ONLY provide hints in the unlocked list (see SESSION STATE below)
  Give the HIGHEST unlocked hint level available
  If a hint level is not unlocked, you CANNOT give it yet
  Do NOT jump ahead to unlocked hint levels that aren't unlocked
@@ -405,42 +464,39 @@ Hint 4 (Solution): Complete working code with full explanation and complexity an
 
 YOUR RESPONSE STRATEGY:
 """
-        
-        if len(unlocked) == 0:
-            base_prompt += """🔒 NO HINTS UNLOCKED YET
+
+HINT_STRATEGIES = {
+    0: """🔒 NO HINTS UNLOCKED YET
 - Encourage: "Keep thinking! Hints unlock as you try and time passes."
 - Provide general encouragement without revealing problem-solving details
 - Suggest they work through what they know so far
-- Set: isHint=false, isSolution=false, mode="learning\""""
-        elif 1 in unlocked and 2 not in unlocked:
-            base_prompt += """🔓 HINT 1 UNLOCKED (Conceptual)
+- Set: isHint=false, isSolution=false, mode="learning\"""",
+    1: """🔓 HINT 1 UNLOCKED (Conceptual)
 - Provide ONLY high-level conceptual guidance
 - What type of data structure might help?
 - What category of algorithm?
 - What property of the problem is key?
-- Set: isHint=true, isSolution=false, mode="learning\""""
-        elif 2 in unlocked and 3 not in unlocked:
-            base_prompt += """🔓 HINT 2 UNLOCKED (Approach)
+- Set: isHint=true, isSolution=false, mode="learning\"""",
+    2: """🔓 HINT 2 UNLOCKED (Approach)
 - Provide detailed approach/algorithm explanation
 - Break down into clear steps
 - Explain the logic: "First do X, then check Y, finally return Z"
 - Mention key operations but not exact code
-- Set: isHint=true, isSolution=false, mode="learning\""""
-        elif 3 in unlocked and 4 not in unlocked:
-            base_prompt += """🔓 HINT 3 UNLOCKED (Pseudocode)
+- Set: isHint=true, isSolution=false, mode="learning\"""",
+    3: """🔓 HINT 3 UNLOCKED (Pseudocode)
 - Provide detailed pseudocode with clear structure
 - Show logic flow with IF/FOR/WHILE
 - Include all major operations
-- Set: isHint=true, isSolution=false, mode="learning\""""
-        elif 4 in unlocked:
-            base_prompt += """🔓 SOLUTION UNLOCKED (Complete Code)
+- Set: isHint=true, isSolution=false, mode="learning\"""",
+    4: """🔓 SOLUTION UNLOCKED (Complete Code)
 - Provide COMPLETE working solution with full code
 - Detailed explanation of each step
 - Time and space complexity analysis
 - Example walkthrough
-- Set: isHint=false, isSolution=true, mode="learning\""""
-    
-    base_prompt += """
+- Set: isHint=false, isSolution=true, mode="learning\"""",
+}
+
+JSON_FORMAT = """
 
 REQUIRED JSON RESPONSE FORMAT:
 {
@@ -449,8 +505,75 @@ REQUIRED JSON RESPONSE FORMAT:
   "isHint": true/false,
   "isSolution": true/false
 }"""
+
+
+def hint_tier(unlocked: List[int]) -> Optional[int]:
+    """Which response strategy applies to an unlocked-hint list (None if no strategy matches)"""
+    if len(unlocked) == 0:
+        return 0
+    if 1 in unlocked and 2 not in unlocked:
+        return 1
+    if 2 in unlocked and 3 not in unlocked:
+        return 2
+    if 3 in unlocked and 4 not in unlocked:
+        return 3
+    if 4 in unlocked:
+        return 4
+    return None
+
+
+@lru_cache(maxsize=64)
+def static_system_prompt(
+    is_learning: bool,
+    attempt_bucket: int,
+    time_travel_tier: Optional[int],
+    time_travel_active: bool
+) -> str:
+    """
+    Stable prompt prefix for one (learning mode, attempt bucket, hint tier) combination
+    Built once and memoized so provider-side prefix caching can hit across requests
+    """
+    parts = [BASE_PROMPT]
+    if is_learning:
+        parts.append("\n\nPROGRESSIVE GUIDANCE:\n")
+        parts.append(LEARNING_GUIDANCE[attempt_bucket])
+        parts.append("\n\nIMPORTANT: If user asks a follow-up about complexity/clarification, answer directly without treating it as a new attempt.")
+    if time_travel_active:
+        parts.append(TIME_TRAVEL_RULES)
+        if time_travel_tier is not None:
+            parts.append(HINT_STRATEGIES[time_travel_tier])
+    parts.append(JSON_FORMAT)
+    return "".join(parts)
+
+
+def build_system_prompt(context: ConversationContext, time_travel_ctx: Optional[TimeTravelContext] = None) -> str:
+    """Build progressive system prompt: memoized static prefix + short per-request session state"""
+    time_travel_active = bool(time_travel_ctx and time_travel_ctx.isActive)
+    prefix = static_system_prompt(
+        context.isLearningMode,
+        # attemptCount comes from the client; anything outside 0..3 must still map to a template
+        max(0, min(context.attemptCount, 3)) if context.isLearningMode else 0,
+        hint_tier(time_travel_ctx.unlockedHints) if time_travel_active else None,
+        time_travel_active
+    )
     
-    return base_prompt
+    state_lines = []
+    if context.isLearningMode:
+        state_lines += [
+            "CURRENT MODE: LEARNING MODE",
+            f"Topic: \"{context.currentTopic}\"",
+            f"Attempt: {context.attemptCount}",
+        ]
+    if time_travel_active:
+        state_lines += [
+            f"Elapsed time: {elapsed_seconds(time_travel_ctx)}s",
+            f"Attempts made: {time_travel_ctx.attemptCount}",
+            f"Unlocked hints: {time_travel_ctx.unlockedHints}",
+        ]
+    if not state_lines:
+        return prefix
+    
+    return prefix + "\n\nSESSION STATE:\n" + "\n".join(state_lines)
 
 
 
@@ -479,209 +602,480 @@ async def health_check():
         "status": "healthy",
         "firebase": "connected",
         "groq": "configured",
+        "llm": llm_gateway.stats(),
+        "modelRoutes": model_router.snapshot(),
+        "coalescing": {"chat": chat_flight.snapshot(), "memory": memory_flight.snapshot()},
+        "authCache": token_cache.snapshot(),
+        "sessions": session_store.stats,
+        "history": history_assembler.stats,
+        "hintLadder": hint_ladder.stats,
+        "hintTimers": hint_timers.snapshot(),
+        "memoryPrescore": memory_prescorer.stats,
+        "assessmentCache": assessment_cache.snapshot(),
+        "interpreterPools": {language: pool.stats for language, pool in interpreter_pools.items()},
+        "compileCache": compile_cache.stats,
+        "workspaces": {"root": exec_workspaces.root, **exec_workspaces.stats},
+        "execScheduler": exec_scheduler.snapshot(),
+        "resultCache": result_cache.snapshot(),
+        "writeQueue": {"depth": write_queue.depth, **write_queue.stats},
         "timestamp": datetime.utcnow().isoformat()
     }
 
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat_endpoint(
+def elapsed_seconds(time_travel_ctx: TimeTravelContext) -> int:
+    """Seconds since the time-travel question started"""
+    if not time_travel_ctx.questionStartTime:
+        return 0
+    current_time_ms = int(time.time() * 1000)
+    return (current_time_ms - time_travel_ctx.questionStartTime) // 1000
+
+
+def resolve_chat_turn(
     request: ChatRequest,
-    user: dict = Depends(verify_firebase_token)
-):
+    uid: Optional[str] = None
+) -> Tuple[ConversationContext, TimeTravelContext, Optional[ChatResponse]]:
     """
-    Main chat endpoint with Progressive Learning & Time-Travel Hints support
-    Preserves ALL features: context analysis, attempt tracking, time-travel, Groq integration
+    Run context analysis and time-travel gating for a chat turn
+    Returns the gating reply as the third element when the turn must not reach the model
     """
+    hits = phrase_matcher.classify(request.message)
+    current_context = analyze_context(
+        request.message,
+        request.conversationHistory,
+        request.conversationContext,
+        hits
+    )
+    
+    logger.info(f"Context Analysis: {current_context.dict()}")
+
+    time_travel_ctx = request.timeTravelContext or TimeTravelContext()
+    if time_travel_ctx.isActive and request.sessionId and uid:
+        # The server's timer decides how long the question has been open, not the client's clock
+        try:
+            timer = start_hint_timer(request.sessionId, uid, time_travel_ctx)
+        except SessionOwnershipError as e:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+        time_travel_ctx.questionStartTime = int(timer.started_at * 1000)
+    elapsed_for_log = elapsed_seconds(time_travel_ctx)
+    
+    logger.info(f" Time-Travel data: active={time_travel_ctx.isActive}, elapsed={elapsed_for_log}s, attempts={time_travel_ctx.attemptCount}")
+
+    if not time_travel_ctx.isActive:
+        return current_context, time_travel_ctx, None
+
+    if request.sessionId and current_context.isLearningMode and current_context.currentTopic:
+        topic = current_context.currentTopic
+        hint_ladder.prefetch(request.sessionId, topic, topic_question(request, topic))
+
+    original_unlocked = time_travel_ctx.unlockedHints.copy()
+    time_travel_ctx.unlockedHints = calculate_unlocked_hints(time_travel_ctx)
+    logger.info(f"🔓 Hints calculation: {original_unlocked} → {time_travel_ctx.unlockedHints}")
+    
+
+    is_asking_for_hint = phrase_matcher.HINT_REQUEST in hits
+    
+    if not is_asking_for_hint:
+        return current_context, time_travel_ctx, None
+
+    max_unlocked = max(time_travel_ctx.unlockedHints) if time_travel_ctx.unlockedHints else 0
+    next_hint = max_unlocked + 1
+    gating_text = None
+
+    if next_hint == 1 and elapsed_for_log < 20:
+        wait_time = 20 - elapsed_for_log
+        gating_text = f"**Keep thinking!** Hint 1 will unlock in **{wait_time} seconds**. Try solving it yourself first - you've got this!"
+
+    elif next_hint == 2 and time_travel_ctx.attemptCount < 2:
+        attempts_needed = 2 - time_travel_ctx.attemptCount
+        gating_text = f" **Keep trying!** Hint 2 will unlock after **{attempts_needed} more attempt(s)**. Give it another shot!"
+    
+    elif next_hint == 3 and time_travel_ctx.attemptCount < 3:
+        attempts_needed = 3 - time_travel_ctx.attemptCount
+        gating_text = f" **Almost there!** Hint 3 will unlock after **{attempts_needed} more attempt(s)**. You're doing great!"
+    
+    elif next_hint == 4 and time_travel_ctx.attemptCount < 4 and elapsed_for_log < 180:
+        attempts_needed = 4 - time_travel_ctx.attemptCount
+        time_remaining = 180 - elapsed_for_log
+        gating_text = f" **Solution unlocks after {attempts_needed} more attempt(s)** or in **{time_remaining//60}:{time_remaining%60:02d} minutes**. Keep pushing!"
+
+    if gating_text is None:
+        return current_context, time_travel_ctx, None
+
+    return current_context, time_travel_ctx, ChatResponse(
+        text=gating_text,
+        mode="learning",
+        isHint=False,
+        isSolution=False,
+        conversationContext=current_context,
+        timeTravelContext=time_travel_ctx
+    )
+
+
+async def summarize_history(previous_summary: str, messages: List[Dict[str, str]]) -> str:
+    """Fold turns that fell out of the history window into the session's rolling summary"""
+    transcript = "\n".join(
+        f"{m['role'].upper()}: {truncate_to_tokens(m['text'], 400)}" for m in messages
+    )
+    prompt = f"""Current summary:
+{previous_summary or "(none yet)"}
+
+New conversation turns:
+{transcript}
+
+Rewrite the summary so it also covers the new turns. Keep the topic, what the student has tried, which hints were already given and any code decisions. Plain text, at most 150 words."""
+    
+    return await model_router.complete("summary", [
+        {"role": "system", "content": "You maintain concise running summaries of tutoring conversations."},
+        {"role": "user", "content": prompt}
+    ])
+
+
+history_assembler = HistoryAssembler.from_env(summarize_history)
+
+
+def topic_question(request: ChatRequest, topic: str) -> str:
+    """The user message that started `topic`: the latest one in history with that topic, else this one"""
+    for msg in reversed(request.conversationHistory or []):
+        if msg.role == "user" and phrase_matcher.extract_topic(msg.text) == topic:
+            return msg.text
+    return request.message
+
+
+async def generate_hint_ladder(topic: str, question: str) -> Optional[Dict[int, str]]:
+    """All four Time-Travel hint levels for one problem in a single call; None if the reply can't be parsed"""
+    prompt = f"""A student is working on this problem (topic: "{topic}"):
+{truncate_to_tokens(question, 1200)}
+
+Write the four Time-Travel hints for it, each building on the previous one:
+- conceptual: High-level approach, what data structure/algorithm to consider. No steps, no code.
+- approach: Detailed algorithm explanation with clear steps ("First do X, then check Y, finally return Z"). No code.
+- pseudocode: Step-by-step pseudocode with IF/FOR/WHILE covering all major operations.
+- solution: Complete working code with a full explanation, time and space complexity, and an example walkthrough.
+
+Speak directly to the student like a friendly tutor. Respond ONLY with a valid JSON object (no markdown, no extra text):
+{{"conceptual": "...", "approach": "...", "pseudocode": "...", "solution": "..."}}"""
+
+    response_text = await model_router.complete("hint_ladder", [
+        {"role": "system", "content": "You are ThinkFirst AI, an expert programming tutor. Respond ONLY with valid JSON."},
+        {"role": "user", "content": prompt}
+    ])
     try:
-        uid = user["uid"]
-        logger.info(f" Chat request from user: {uid}")
-      
-        current_context = analyze_context(
-            request.message,
-            request.conversationHistory,
-            request.conversationContext
-        )
-        
-        logger.info(f"Context Analysis: {current_context.dict()}")
-   
-        time_travel_ctx = request.timeTravelContext or TimeTravelContext()
-
-        elapsed_for_log = 0
-        if time_travel_ctx.questionStartTime:
-            current_time_ms = int(time.time() * 1000)
-            elapsed_for_log = (current_time_ms - time_travel_ctx.questionStartTime) // 1000
-        
-        logger.info(f" Time-Travel data: active={time_travel_ctx.isActive}, elapsed={elapsed_for_log}s, attempts={time_travel_ctx.attemptCount}")
-  
-        if time_travel_ctx.isActive:
-            original_unlocked = time_travel_ctx.unlockedHints.copy()
-            time_travel_ctx.unlockedHints = calculate_unlocked_hints(time_travel_ctx)
-            logger.info(f"🔓 Hints calculation: {original_unlocked} → {time_travel_ctx.unlockedHints}")
-            
-        
-            msg_lower = request.message.lower()
-            is_asking_for_hint = any(phrase in msg_lower for phrase in [
-                "give hint", "hint please", "need a hint", "can i get a hint", 
-                "show hint", "give me hint", "hint", "can you give me a hint",
-                "give me a hint", "i need a hint"
-            ])
-            
+        json_start = response_text.find("{")
+        json_end = response_text.rfind("}") + 1
+        data = json.loads(response_text[json_start:json_end])
+        return {level: str(data[name.lower()]) for level, name in HINT_LEVELS.items()}
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        logger.error(f"Hint ladder parse error: {e}")
+        return None
+
+
+hint_ladder = HintLadderCache.from_env(generate_hint_ladder)
+hint_timers = HintTimers.from_env()
+HINT_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("HINT_EVENTS_KEEPALIVE_SECONDS", 15))
+HINT_EVENTS_START_TIMEOUT_SECONDS = float(os.getenv("HINT_EVENTS_START_TIMEOUT_SECONDS", 600))
+HINT_EVENTS_START_POLL_SECONDS = 1.0
+
+
+def start_hint_timer(session_id: str, uid: str, time_travel_ctx: TimeTravelContext) -> TimedSession:
+    """The session's hint timer, resumed from the start saved with the session when the client echoes it"""
+    session = session_store.peek(session_id)
+    saved_start = (session.time_travel or {}).get("questionStartTime") if session else None
+    timer = hint_timers.begin(session_id, uid, time_travel_ctx.questionStartTime, saved_start)
+    hint_timers.record_attempts(session_id, time_travel_ctx.attemptCount)
+    return timer
+
+
+async def cached_hint_response(
+    request: ChatRequest,
+    current_context: ConversationContext,
+    time_travel_ctx: TimeTravelContext
+) -> Optional[ChatResponse]:
+    """Answer an ungated hint request from the topic's hint ladder (None to fall back to the model)"""
+    if not (time_travel_ctx.isActive and request.sessionId and current_context.currentTopic):
+        return None
+    if phrase_matcher.HINT_REQUEST not in phrase_matcher.classify(request.message):
+        return None
+    level = hint_tier(time_travel_ctx.unlockedHints)
+    if not level:
+        return None
+    topic = current_context.currentTopic
+    text = await hint_ladder.get(request.sessionId, topic, topic_question(request, topic), level)
+    if text is None:
+        return None
+    return ChatResponse(
+        text=text,
+        mode="learning",
+        isHint=level < 4,
+        isSolution=level == 4,
+        conversationContext=current_context,
+        timeTravelContext=time_travel_ctx
+    )
+
+
+def chat_route(
+    request: ChatRequest,
+    current_context: ConversationContext,
+    time_travel_ctx: TimeTravelContext
+) -> str:
+    """
+    Routing-table entry for a chat turn, following analyze_context's classes:
+    real-time request, general chat, follow-up, learning turn or Time-Travel hint tier
+    """
+    hits = phrase_matcher.classify(request.message)
+    if phrase_matcher.WEATHER in hits or phrase_matcher.NEWS in hits:
+        return "realtime"
+    if time_travel_ctx.isActive and phrase_matcher.HINT_REQUEST in hits:
+        tier = hint_tier(time_travel_ctx.unlockedHints)
+        if tier:
+            return f"hint_{tier}"
+    if not current_context.isLearningMode:
+        return "chat"
+    if (phrase_matcher.FOLLOW_UP in hits and phrase_matcher.LEARNING not in hits
+            and phrase_matcher.BACK_TO not in hits):
+        return "follow_up"
+    return "learning"
+
+
+def build_chat_messages(
+    request: ChatRequest,
+    current_context: ConversationContext,
+    time_travel_ctx: TimeTravelContext
+) -> List[Dict[str, str]]:
+    """Assemble the Groq message list for a chat turn, fitting history into the token budget"""
+    system_prompt = build_system_prompt(current_context, time_travel_ctx if time_travel_ctx.isActive else None)
     
-            if is_asking_for_hint:
-                max_unlocked = max(time_travel_ctx.unlockedHints) if time_travel_ctx.unlockedHints else 0
-                next_hint = max_unlocked + 1
-                
-        
-                if next_hint == 1 and elapsed_for_log < 20:
-                    wait_time = 20 - elapsed_for_log
-                    return ChatResponse(
-                        text=f"**Keep thinking!** Hint 1 will unlock in **{wait_time} seconds**. Try solving it yourself first - you've got this!",
-                        mode="learning",
-                        isHint=False,
-                        isSolution=False,
-                        conversationContext=current_context,
-                        timeTravelContext=time_travel_ctx
-                    )
-                
+
+    groq_messages = [{"role": "system", "content": system_prompt}]
     
-                elif next_hint == 2 and time_travel_ctx.attemptCount < 2:
-                    attempts_needed = 2 - time_travel_ctx.attemptCount
-                    return ChatResponse(
-                        text=f" **Keep trying!** Hint 2 will unlock after **{attempts_needed} more attempt(s)**. Give it another shot!",
-                        mode="learning",
-                        isHint=False,
-                        isSolution=False,
-                        conversationContext=current_context,
-                        timeTravelContext=time_travel_ctx
-                    )
-                
-                elif next_hint == 3 and time_travel_ctx.attemptCount < 3:
-                    attempts_needed = 3 - time_travel_ctx.attemptCount
-                    return ChatResponse(
-                        text=f" **Almost there!** Hint 3 will unlock after **{attempts_needed} more attempt(s)**. You're doing great!",
-                        mode="learning",
-                        isHint=False,
-                        isSolution=False,
-                        conversationContext=current_context,
-                        timeTravelContext=time_travel_ctx
-                    )
-                
-            
-                elif next_hint == 4 and time_travel_ctx.attemptCount < 4 and elapsed_for_log < 180:
-                    attempts_needed = 4 - time_travel_ctx.attemptCount
-                    time_remaining = 180 - elapsed_for_log
-                    return ChatResponse(
-                        text=f" **Solution unlocks after {attempts_needed} more attempt(s)** or in **{time_remaining//60}:{time_remaining%60:02d} minutes**. Keep pushing!",
-                        mode="learning",
-                        isHint=False,
-                        isSolution=False,
-                        conversationContext=current_context,
-                        timeTravelContext=time_travel_ctx
-                    )
-        
-  
-        system_prompt = build_system_prompt(current_context, time_travel_ctx if time_travel_ctx.isActive else None)
-        
+    summary, window = history_assembler.assemble(
+        request.sessionId,
+        [{"role": msg.role, "text": msg.text} for msg in request.conversationHistory],
+        offset=request._history_offset
+    )
+    if summary:
+        groq_messages.append({
+            "role": "system",
+            "content": f"Summary of the earlier conversation:\n{summary}"
+        })
+    
+    for msg in window:
+        groq_messages.append({
+            "role": "user" if msg["role"] == "user" else "assistant",
+            "content": msg["text"]
+        })
+    
+    groq_messages.append({
+        "role": "user",
+        "content": f"{request.message}\n\n[Please respond in JSON format with fields: text, mode, isHint, isSolution]"
+    })
+    return groq_messages
 
-        groq_messages = [{"role": "system", "content": system_prompt}]
-        
-        for msg in request.conversationHistory[-10:]:
-            groq_messages.append({
-                "role": "user" if msg.role == "user" else "assistant",
-                "content": msg.text
+
+def parse_chat_completion(response_text: str, current_context: ConversationContext) -> Dict[str, Any]:
+    """Extract the JSON reply from a chat completion, falling back to plain text"""
+    try:
+        if "```json" in response_text:
+            json_start = response_text.find("```json") + 7
+            json_end = response_text.find("```", json_start)
+            json_str = response_text[json_start:json_end].strip()
+        elif "{" in response_text and "}" in response_text:
+            json_start = response_text.find("{")
+            json_end = response_text.rfind("}") + 1
+            json_str = response_text[json_start:json_end]
+        else:
+            json_str = json.dumps({
+                "text": response_text,
+                "mode": "learning" if current_context.isLearningMode else "chat",
+                "isHint": False,
+                "isSolution": False
             })
         
-        groq_messages.append({
+        return json.loads(json_str)
+    
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON parse error: {e}")
+        return {
+            "text": response_text,
+            "mode": "learning" if current_context.isLearningMode else "chat",
+            "isHint": False,
+            "isSolution": False
+        }
+
+
+async def hydrate_chat_request(request: ChatRequest, uid: str) -> None:
+    """
+    Fill in whatever history/context the client left out from the server-side session
+    Clients that still send the full conversationHistory and conversationContext are used as-is
+    """
+    if not request.sessionId:
+        request.conversationHistory = request.conversationHistory or []
+        request.conversationContext = request.conversationContext or ConversationContext()
+        return
+
+    # Loaded even when the client sends full state: a cold session's owner is only known from Firestore
+    session = await session_store.get(request.sessionId)
+    if session.uid and session.uid != uid:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Session belongs to another user")
+    request._base_version = session.version
+
+    if request.conversationHistory is not None and request.conversationContext is not None:
+        return
+
+    if request.version is not None and request.version != session.version:
+        raise session_version_conflict(SessionVersionConflict(session.version))
+
+    if request.conversationHistory is None:
+        request.conversationHistory = [ConversationMessage(**m) for m in session.history]
+        request._history_offset = session.offset
+    if request.conversationContext is None:
+        request.conversationContext = ConversationContext(**session.context) if session.context else ConversationContext()
+    if request.timeTravelContext is None and session.time_travel:
+        request.timeTravelContext = TimeTravelContext(**session.time_travel)
+
+
+def session_version_conflict(error: SessionVersionConflict) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(error))
+
+
+def remember_chat_turn(request: ChatRequest, uid: str, response: ChatResponse) -> None:
+    """Record the exchange in the session store and stamp the response with the new version"""
+    if not request.sessionId:
+        return
+    try:
+        response.version = session_store.record_turn(
+            request.sessionId,
+            uid,
+            [msg.dict() for msg in request.conversationHistory],
+            request.message,
+            response.text,
+            response.conversationContext.dict(),
+            response.timeTravelContext.dict() if response.timeTravelContext else None,
+            offset=request._history_offset,
+            expected_version=request._base_version
+        )
+    except SessionOwnershipError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+    except SessionVersionConflict as e:
+        # A concurrent turn on the same version was recorded first
+        raise session_version_conflict(e)
+
+
+async def save_chat_turn(request: ChatRequest, uid: str, response: ChatResponse) -> None:
+    """Queue the user message, assistant reply and session summary for write-behind persistence"""
+    if not request.sessionId:
+        return
+    try:
+        session_ref = db.collection("sessions").document(request.sessionId)
+        messages_ref = session_ref.collection("messages")
+        current_context = response.conversationContext
+        
+        await write_queue.add(messages_ref, {
             "role": "user",
-            "content": f"{request.message}\n\n[Please respond in JSON format with fields: text, mode, isHint, isSolution]"
+            "text": request.message,
+            "timestamp": firestore.SERVER_TIMESTAMP,
+            "userId": uid,
+            "turn": response.version
         })
         
-        logger.info(f"Calling Groq API with {len(groq_messages)} messages")
+        await write_queue.add(messages_ref, {
+            "role": "assistant",
+            "text": response.text,
+            "timestamp": firestore.SERVER_TIMESTAMP,
+            "isHint": response.isHint,
+            "isSolution": response.isSolution,
+            "attemptCount": current_context.attemptCount,
+            "mode": response.mode,
+            "turn": response.version
+        })
         
-        completion = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=groq_messages,
-            temperature=0.7,
-            max_tokens=2048,
-            top_p=0.9
-        )
+        await write_queue.set(session_ref, {
+            "mode": response.mode,
+            "userId": uid,
+            "lastUpdated": firestore.SERVER_TIMESTAMP,
+            "currentTopic": current_context.currentTopic,
+            "isLearningMode": current_context.isLearningMode,
+            "attemptCount": current_context.attemptCount,
+            "timeTravelContext": response.timeTravelContext.dict() if response.timeTravelContext else None,
+            "version": response.version
+        }, merge=True)
         
-        response_text = completion.choices[0].message.content
-        logger.info(f"Groq response: {response_text[:100]}...")
+    except Exception as firestore_error:
+        logger.error(f"Firestore error: {firestore_error}")
+
+
+def build_chat_response(
+    response_data: Dict[str, Any],
+    response_text: str,
+    current_context: ConversationContext,
+    time_travel_ctx: TimeTravelContext
+) -> ChatResponse:
+    return ChatResponse(
+        text=response_data.get("text", response_text),
+        mode=response_data.get("mode", "chat"),
+        isHint=response_data.get("isHint", False),
+        isSolution=response_data.get("isSolution", False),
+        conversationContext=current_context,
+        timeTravelContext=time_travel_ctx
+    )
+
+
+def llm_unavailable(error: Exception) -> HTTPException:
+    """503 with Retry-After for a model call that no backend could answer in time"""
+    logger.warning(f"LLM unavailable: {error}")
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="The AI tutor is temporarily unavailable. Please retry shortly.",
+        headers={"Retry-After": str(getattr(error, "retry_after", 5))}
+    )
+
+
+def flight_keys(endpoint: str, uid: str, request: BaseModel) -> Tuple[str, Optional[str]]:
+    """Fingerprint of the request as sent (before hydration) and the idempotency key of its requestId"""
+    key = fingerprint(endpoint, uid, request.dict(exclude={"requestId"}))
+    return key, f"{endpoint}:{uid}:{request.requestId}" if request.requestId else None
+
+
+def idempotency_conflict(error: IdempotencyConflict) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(error))
+
+
+async def answer_chat_turn(request: ChatRequest, uid: str) -> ChatResponse:
+    """Hydrate, gate, answer and persist one chat turn"""
+    try:
+        await hydrate_chat_request(request, uid)
+        current_context, time_travel_ctx, gating_response = resolve_chat_turn(request, uid)
+        if gating_response:
+            remember_chat_turn(request, uid, gating_response)
+            # Persisted like any turn, or Firestore's version would fall behind the session's
+            await save_chat_turn(request, uid, gating_response)
+            return gating_response
+
+        hint_response = await cached_hint_response(request, current_context, time_travel_ctx)
+        if hint_response:
+            remember_chat_turn(request, uid, hint_response)
+            await save_chat_turn(request, uid, hint_response)
+            return hint_response
         
-        try:
-            if "```json" in response_text:
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                json_str = response_text[json_start:json_end].strip()
-            elif "{" in response_text and "}" in response_text:
-                json_start = response_text.find("{")
-                json_end = response_text.rfind("}") + 1
-                json_str = response_text[json_start:json_end]
-            else:
-                json_str = json.dumps({
-                    "text": response_text,
-                    "mode": "learning" if current_context.isLearningMode else "chat",
-                    "isHint": False,
-                    "isSolution": False
-                })
-            
-            response_data = json.loads(json_str)
+        groq_messages = build_chat_messages(request, current_context, time_travel_ctx)
+        route = chat_route(request, current_context, time_travel_ctx)
         
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parse error: {e}")
-            response_data = {
-                "text": response_text,
-                "mode": "learning" if current_context.isLearningMode else "chat",
-                "isHint": False,
-                "isSolution": False
-            }
+        logger.info(f"Calling Groq API with {len(groq_messages)} messages (route={route})")
         
-
-        if request.sessionId:
-            try:
-                session_ref = db.collection("sessions").document(request.sessionId)
-                messages_ref = session_ref.collection("messages")
-                
-                messages_ref.add({
-                    "role": "user",
-                    "text": request.message,
-                    "timestamp": firestore.SERVER_TIMESTAMP,
-                    "userId": uid
-                })
-                
-                messages_ref.add({
-                    "role": "assistant",
-                    "text": response_data.get("text", response_text),
-                    "timestamp": firestore.SERVER_TIMESTAMP,
-                    "isHint": response_data.get("isHint", False),
-                    "isSolution": response_data.get("isSolution", False),
-                    "attemptCount": current_context.attemptCount,
-                    "mode": response_data.get("mode", "chat")
-                })
-                
-                session_ref.set({
-                    "mode": response_data.get("mode", "chat"),
-                    "userId": uid,
-                    "lastUpdated": firestore.SERVER_TIMESTAMP,
-                    "currentTopic": current_context.currentTopic,
-                    "isLearningMode": current_context.isLearningMode,
-                    "attemptCount": current_context.attemptCount
-                }, merge=True)
-                
-            except Exception as firestore_error:
-                logger.error(f"Firestore error: {firestore_error}")
+        response_text = await model_router.complete(route, groq_messages, top_p=0.9)
+        logger.info(f"Groq response: {response_text[:100]}...")
+        
+        response_data = parse_chat_completion(response_text, current_context)
+        response = build_chat_response(response_data, response_text, current_context, time_travel_ctx)
+        remember_chat_turn(request, uid, response)
+        await save_chat_turn(request, uid, response)
         
         logger.info(f" Returning to frontend: unlocked={time_travel_ctx.unlockedHints}, active={time_travel_ctx.isActive}")
         
-        return ChatResponse(
-            text=response_data.get("text", response_text),
-            mode=response_data.get("mode", "chat"),
-            isHint=response_data.get("isHint", False),
-            isSolution=response_data.get("isSolution", False),
-            conversationContext=current_context,
-            timeTravelContext=time_travel_ctx
-        )
+        return response
     
+    except HTTPException:
+        raise
+    except (LLMUnavailableError, LLMTimeoutError) as e:
+        raise llm_unavailable(e)
     except Exception as e:
         logger.error(f"Chat endpoint error: {str(e)}")
         raise HTTPException(
@@ -689,20 +1083,184 @@ async def chat_endpoint(
             detail=f"Failed to process chat request: {str(e)}"
         )
 
-@app.post("/api/checkMemory", response_model=AmnesiaCheckResponse)
-async def check_memory_endpoint(
-    request: AmnesiaCheckRequest,
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat_endpoint(
+    request: ChatRequest,
     user: dict = Depends(verify_firebase_token)
 ):
     """
-    Amnesia Mode: Compare user reconstruction with original solution
-    Exact logic from Firebase Functions with improved error handling
+    Main chat endpoint with Progressive Learning & Time-Travel Hints support
+    Preserves ALL features: context analysis, attempt tracking, time-travel, Groq integration
     """
+    uid = user["uid"]
+    logger.info(f" Chat request from user: {uid}")
+    key, request_key = flight_keys("chat", uid, request)
     try:
-        uid = user["uid"]
-        logger.info(f" Memory check request from user: {uid}")
-        
-        comparison_prompt = f"""You are a learning assessment AI. Compare these two solutions and check if the LOGIC and APPROACH are similar.
+        return await chat_flight.run(key, lambda: answer_chat_turn(request, uid), request_key)
+    except IdempotencyConflict as e:
+        raise idempotency_conflict(e)
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(
+    request: ChatRequest,
+    user: dict = Depends(verify_firebase_token)
+):
+    """
+    Streaming variant of /api/chat over server-sent events
+    Emits `token` events with reply text as it is generated, then one `done`
+    event carrying the full ChatResponse (contexts, isHint/isSolution flags)
+    """
+    uid = user["uid"]
+    logger.info(f" Streaming chat request from user: {uid}")
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+    key, request_key = flight_keys("chat/stream", uid, request)
+    try:
+        joined = chat_flight.joinable(key, request_key)
+    except IdempotencyConflict as e:
+        raise idempotency_conflict(e)
+    if joined is not None:
+        return StreamingResponse(joined, media_type="text/event-stream", headers=headers)
+
+    try:
+        await hydrate_chat_request(request, uid)
+        current_context, time_travel_ctx, gating_response = resolve_chat_turn(request, uid)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Chat stream setup error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to process chat request: {str(e)}"
+        )
+
+    async def event_stream():
+        try:
+            async for event in turn_events():
+                yield event
+        except HTTPException as e:
+            # Raised while recording the turn (e.g. a version conflict), after the tokens went out
+            yield sse_event("error", {"detail": e.detail, "status": e.status_code})
+
+    async def turn_events():
+        if gating_response:
+            remember_chat_turn(request, uid, gating_response)
+            await save_chat_turn(request, uid, gating_response)
+            yield sse_event("token", {"text": gating_response.text})
+            yield sse_event("done", gating_response.dict())
+            return
+
+        hint_response = await cached_hint_response(request, current_context, time_travel_ctx)
+        if hint_response:
+            remember_chat_turn(request, uid, hint_response)
+            await save_chat_turn(request, uid, hint_response)
+            yield sse_event("token", {"text": hint_response.text})
+            yield sse_event("done", hint_response.dict())
+            return
+
+        groq_messages = build_chat_messages(request, current_context, time_travel_ctx)
+        route = chat_route(request, current_context, time_travel_ctx)
+        extractor = JsonTextFieldStream()
+        chunks = []
+        try:
+            async for delta in model_router.stream(route, groq_messages, top_p=0.9):
+                chunks.append(delta)
+                text = extractor.feed(delta)
+                if text:
+                    yield sse_event("token", {"text": text})
+        except (LLMUnavailableError, LLMTimeoutError) as e:
+            error = llm_unavailable(e)
+            yield sse_event("error", {"detail": error.detail, "retryAfter": int(error.headers["Retry-After"])})
+            return
+        except Exception as e:
+            logger.error(f"Chat stream error: {str(e)}")
+            yield sse_event("error", {"detail": f"Failed to process chat request: {str(e)}"})
+            return
+
+        response_text = "".join(chunks)
+        logger.info(f"Groq streamed response: {response_text[:100]}...")
+        response_data = parse_chat_completion(response_text, current_context)
+        response = build_chat_response(response_data, response_text, current_context, time_travel_ctx)
+        remember_chat_turn(request, uid, response)
+        await save_chat_turn(request, uid, response)
+        yield sse_event("done", response.dict())
+
+    try:
+        # An identical request may have started while this one was hydrating
+        events = chat_flight.stream(
+            key, event_stream, request_key,
+            succeeded=lambda events: bool(events) and events[-1].startswith("event: done")
+        )
+    except IdempotencyConflict as e:
+        raise idempotency_conflict(e)
+    return StreamingResponse(events, media_type="text/event-stream", headers=headers)
+
+@app.get("/api/timeTravel/events")
+async def time_travel_events(
+    sessionId: str,
+    user: dict = Depends(verify_firebase_token)
+):
+    """
+    Server-sent hint unlocks for a Time-Travel session
+    Emits one `state` event (unlocked hints, seconds to the next unlock), then an
+    `unlock` event whenever a hint tier unlocks; a stream opened before the
+    session's first Time-Travel turn waits for its timer to start, checking less
+    and less often, and ends after HINT_EVENTS_START_TIMEOUT_SECONDS
+    """
+    uid = user["uid"]
+    session = await session_store.get(sessionId)
+    if session.uid and session.uid != uid:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Session belongs to another user")
+    owner = hint_timers.owner(sessionId)
+    if owner is not None and owner != uid:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Session belongs to another user")
+    if owner is None and session.time_travel and session.time_travel.get("isActive"):
+        # A timer started before a restart or on another worker, resumed from the saved start
+        start_hint_timer(sessionId, uid, TimeTravelContext(**session.time_travel))
+
+    async def event_stream():
+        queue = None
+        try:
+            yield sse_event("state", hint_timers.state(sessionId))
+            delay, waited = HINT_EVENTS_START_POLL_SECONDS, 0.0
+            while queue is None:
+                owner = hint_timers.owner(sessionId)
+                if owner is not None and owner != uid:
+                    yield sse_event("error", {"detail": "Session belongs to another user"})
+                    return
+                if owner:
+                    queue = hint_timers.subscribe(sessionId)
+                    if queue is not None:
+                        yield sse_event("state", hint_timers.state(sessionId))
+                        break
+                if waited >= HINT_EVENTS_START_TIMEOUT_SECONDS:
+                    return
+                await asyncio.sleep(delay)
+                waited += delay
+                delay = min(delay * 2, HINT_EVENTS_KEEPALIVE_SECONDS)
+                yield ": keepalive\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=HINT_EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse_event("unlock", event)
+        finally:
+            if queue is not None:
+                hint_timers.unsubscribe(sessionId, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def assess_reconstruction_with_llm(original_solution: str, user_reconstruction: str) -> Optional[dict]:
+    """Ask the LLM to compare a reconstruction with the original; None if its reply can't be parsed"""
+    comparison_prompt = f"""You are a learning assessment AI. Compare these two solutions and check if the LOGIC and APPROACH are similar.
 
 IGNORE THESE (Do NOT penalize for):
 - Variable names (e.g., "nums" vs "array")
@@ -720,10 +1278,10 @@ ONLY CHECK THESE (Focus on):
 - Correctness of the approach
 
 **Original Solution:**
-{request.originalSolution}
+{original_solution}
 
 **Student's Reconstruction:**
-{request.userReconstruction}
+{user_reconstruction}
 
 Respond ONLY with a valid JSON object (no markdown, no extra text):
 {{
@@ -734,63 +1292,93 @@ Respond ONLY with a valid JSON object (no markdown, no extra text):
 }}
 
 Be encouraging but honest. Score 90-100 = excellent, 70-89 = good, 50-69 = partial, <50 = needs review."""
+    
+    response_text = await model_router.complete("memory_check", [
+        {
+            "role": "system",
+            "content": "You are an expert programming educator. Respond ONLY with valid JSON. No markdown code blocks, no explanations, just pure JSON."
+        },
+        {
+            "role": "user",
+            "content": comparison_prompt
+        }
+    ])
+    
+    response_text = response_text.strip()
+    logger.info(f"Raw Groq response: {response_text[:200]}")
+    
+    try:
+        if "```json" in response_text:
+            json_start = response_text.find("```json") + 7
+            json_end = response_text.find("```", json_start)
+            json_str = response_text[json_start:json_end].strip()
+        elif "```" in response_text:
+            json_start = response_text.find("```") + 3
+            json_end = response_text.find("```", json_start)
+            json_str = response_text[json_start:json_end].strip()
+        elif "{" in response_text and "}" in response_text:
+
+            json_start = response_text.find("{")
+            json_end = response_text.rfind("}") + 1
+            json_str = response_text[json_start:json_end]
+        else:
+            raise ValueError("No JSON object found in response")
         
-        completion = groq_client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert programming educator. Respond ONLY with valid JSON. No markdown code blocks, no explanations, just pure JSON."
-                },
-                {
-                    "role": "user",
-                    "content": comparison_prompt
-                }
-            ],
-            model="llama-3.3-70b-versatile",
-            temperature=0.3,
-            max_tokens=1500
-        )
-        
-        response_text = completion.choices[0].message.content.strip()
-        logger.info(f"Raw Groq response: {response_text[:200]}")
+        result = json.loads(json_str)
         
-        try:
-            if "```json" in response_text:
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                json_str = response_text[json_start:json_end].strip()
-            elif "```" in response_text:
-                json_start = response_text.find("```") + 3
-                json_end = response_text.find("```", json_start)
-                json_str = response_text[json_start:json_end].strip()
-            elif "{" in response_text and "}" in response_text:
     
-                json_start = response_text.find("{")
-                json_end = response_text.rfind("}") + 1
-                json_str = response_text[json_start:json_end]
-            else:
-                raise ValueError("No JSON object found in response")
-            
-            result = json.loads(json_str)
-            
+        if not all(key in result for key in ["logicScore", "keyConcepts", "missedConcepts", "feedback"]):
+            raise ValueError("Missing required fields in JSON response")
         
-            if not all(key in result for key in ["logicScore", "keyConcepts", "missedConcepts", "feedback"]):
-                raise ValueError("Missing required fields in JSON response")
-            
-        except (json.JSONDecodeError, ValueError) as parse_error:
-            logger.error(f"JSON parsing failed: {parse_error}")
-            logger.error(f"Full response text: {response_text}")
-            
+    except (json.JSONDecodeError, ValueError) as parse_error:
+        logger.error(f"JSON parsing failed: {parse_error}")
+        logger.error(f"Full response text: {response_text}")
+        return None
+    return result
+
+
+@app.post("/api/checkMemory", response_model=AmnesiaCheckResponse)
+async def check_memory_endpoint(
+    request: AmnesiaCheckRequest,
+    user: dict = Depends(verify_firebase_token)
+):
+    """
+    Amnesia Mode: Compare user reconstruction with original solution
+    Exact logic from Firebase Functions with improved error handling
+    """
+    uid = user["uid"]
+    logger.info(f" Memory check request from user: {uid}")
+    key, request_key = flight_keys("checkMemory", uid, request)
+    try:
+        return await memory_flight.run(key, lambda: assess_memory_check(request, uid), request_key)
+    except IdempotencyConflict as e:
+        raise idempotency_conflict(e)
 
-            result = {
-                "logicScore": 50,
-                "keyConcepts": ["Response parsing error"],
-                "missedConcepts": [],
-                "feedback": "Unable to analyze your solution due to a technical error. Please try again or contact support."
-            }
+
+async def assess_memory_check(request: AmnesiaCheckRequest, uid: str) -> AmnesiaCheckResponse:
+    """Score one reconstruction and record the attempt"""
+    try:
+        # Empty and near-verbatim reconstructions don't need the LLM, and neither do repeats
+        original = memory_prescorer.original(request.originalSolution)
+        reconstruction = profile_solution(request.userReconstruction)
+        result = memory_prescorer.score(original, reconstruction)
+        if result is None:
+            cache_key = assessment_cache.key(original, reconstruction)
+            result = await assessment_cache.get(cache_key)
+        if result is None:
+            result = await assess_reconstruction_with_llm(request.originalSolution, request.userReconstruction)
+            if result is not None:
+                await assessment_cache.put(cache_key, result)
+            else:
+                result = {
+                    "logicScore": 50,
+                    "keyConcepts": ["Response parsing error"],
+                    "missedConcepts": [],
+                    "feedback": "Unable to analyze your solution due to a technical error. Please try again or contact support."
+                }
 
         try:
-            db.collection("amnesiaAttempts").add({
+            await write_queue.add(db.collection("amnesiaAttempts"), {
                 "userId": uid,
                 "originalSolution": request.originalSolution,
                 "userReconstruction": request.userReconstruction,
@@ -803,7 +1391,7 @@ Be encouraging but honest. Score 90-100 = excellent, 70-89 = good, 50-69 = parti
             })
             
             stats_ref = db.collection("users").document(uid).collection("amnesiaStats").document("stats")
-            stats_ref.set({
+            await write_queue.set(stats_ref, {
                 "totalAttempts": firestore.Increment(1),
                 "lastScore": result["logicScore"],
                 "lastAttempt": firestore.SERVER_TIMESTAMP
@@ -819,6 +1407,9 @@ Be encouraging but honest. Score 90-100 = excellent, 70-89 = good, 50-69 = parti
             feedback=result["feedback"]
         )
     
+    except (LLMUnavailableError, LLMTimeoutError) as e:
+        # A made-up score of 0 would read as a failed recall; let the client retry instead
+        raise llm_unavailable(e)
     except Exception as e:
         logger.error(f"Memory check error: {str(e)}")
       
@@ -832,6 +1423,7 @@ Be encouraging but honest. Score 90-100 = excellent, 70-89 = good, 50-69 = parti
 @app.post("/api/execute", response_model=ExecuteCodeResponse)
 async def execute_code(
     request: ExecuteCodeRequest,
+    http_request: Request,
     user: dict = Depends(verify_firebase_token)
 ):
     """
@@ -841,162 +1433,39 @@ async def execute_code(
     try:
         uid = user["uid"]
         start_time = time.time()
-        temp_id = str(uuid.uuid4())[:8]
-        os.makedirs("exec_tmp", exist_ok=True)
         
-        output = ""
-        error_msg = None
-        success = False
-      
-        if request.language.lower() in ["python", "py"]:
-            filepath = f"exec_tmp/{temp_id}.py"
-            
-            code_to_run = request.code
-            if request.input:
-                code_to_run = f"import sys\nsys.stdin = open('exec_tmp/{temp_id}_input.txt', 'r')\n{request.code}"
-                with open(f"exec_tmp/{temp_id}_input.txt", 'w') as f:
-                    f.write(request.input)
-            
-            with open(filepath, 'w') as f:
-                f.write(code_to_run)
-            
-            result = subprocess.run(
-                ['python3', filepath],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            output = result.stdout
-            error_msg = result.stderr if result.returncode != 0 else None
-            success = result.returncode == 0
-        
-
-        elif request.language.lower() in ["javascript", "js", "node"]:
-            filepath = f"exec_tmp/{temp_id}.js"
-            
-            code_to_run = request.code
-            if request.input:
-                code_to_run = f"const input = `{request.input}`;\n{request.code}"
-            
-            with open(filepath, 'w') as f:
-                f.write(code_to_run)
-            
-            result = subprocess.run(
-                ['node', filepath],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            output = result.stdout
-            error_msg = result.stderr if result.returncode != 0 else None
-            success = result.returncode == 0
-        
-        elif request.language.lower() == "java":
-            filepath = f"exec_tmp/{temp_id}.java"
-            
-            with open(filepath, 'w') as f:
-                f.write(request.code)
-            
-            compile_result = subprocess.run(
-                ['javac', filepath],
-                capture_output=True,
-                text=True,
-                timeout=10,
-                cwd="exec_tmp"
-            )
-            
-            if compile_result.returncode == 0:
-                class_name = os.path.splitext(os.path.basename(filepath))[0]
-                result = subprocess.run(
-                    ['java', class_name],
-                    capture_output=True,
-                    text=True,
-                    timeout=10,
-                    cwd="exec_tmp",
-                    input=request.input
-                )
-                output = result.stdout
-                error_msg = result.stderr if result.returncode != 0 else None
-                success = result.returncode == 0
-            else:
-                error_msg = f"Compilation Error:\n{compile_result.stderr}"
-        
-  
-        elif request.language.lower() in ["cpp", "c++"]:
-            filepath = f"exec_tmp/{temp_id}.cpp"
-            out_path = f"exec_tmp/{temp_id}_out"
-            
-            with open(filepath, 'w') as f:
-                f.write(request.code)
-            
-            compile_result = subprocess.run(
-                ['g++', '-std=c++17', '-o', out_path, filepath],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            if compile_result.returncode == 0:
-                result = subprocess.run(
-                    [out_path],
-                    capture_output=True,
-                    text=True,
-                    timeout=10,
-                    input=request.input
-                )
-                output = result.stdout
-                error_msg = result.stderr if result.returncode != 0 else None
-                success = result.returncode == 0
-            else:
-                error_msg = f"Compilation Error:\n{compile_result.stderr}"
-   
-        elif request.language.lower() == "c":
-            filepath = f"exec_tmp/{temp_id}.c"
-            out_path = f"exec_tmp/{temp_id}_out"
-            
-            with open(filepath, 'w') as f:
-                f.write(request.code)
-            
-            compile_result = subprocess.run(
-                ['gcc', '-o', out_path, filepath],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            if compile_result.returncode == 0:
-                result = subprocess.run(
-                    [out_path],
-                    capture_output=True,
-                    text=True,
-                    timeout=10,
-                    input=request.input
-                )
-                output = result.stdout
-                error_msg = result.stderr if result.returncode != 0 else None
-                success = result.returncode == 0
-            else:
-                error_msg = f"Compilation Error:\n{compile_result.stderr}"
+        language = normalize_language(request.language)
+        cache_key = None
+        cached = None
+        if language and not request.noCache:
+            cache_key, cached = result_cache.lookup(language, request.code, request.input)
+        elif language:
+            result_cache.bypass()
         
+        if cached:
+            outcome = cached.outcome
+            execution_time = cached.execution_time
         else:
-            error_msg = f"Unsupported language: {request.language}"
-      
-        for ext in ['.py', '.js', '.java', '.cpp', '.c', '_out', '.class', '_input.txt']:
-            try:
-                os.remove(f"exec_tmp/{temp_id}{ext}")
-            except:
-                pass
-        
-        execution_time = round(time.time() - start_time, 3)
+            outcome = await cancel_on_disconnect(
+                http_request,
+                exec_scheduler.run(uid, lambda: code_executor.execute(request.language, request.code, request.input))
+            )
+            execution_time = round(time.time() - start_time, 3)
+            if cache_key and not outcome.limit_exceeded:
+                result_cache.put(cache_key, outcome, execution_time)
         
+        output = outcome.output
+        error_msg = outcome.error
+        success = outcome.success
 
         try:
-            db.collection("codeExecutions").add({
+            await write_queue.add(db.collection("codeExecutions"), {
                 "userId": uid,
                 "language": request.language,
                 "code": request.code[:500],
                 "success": success,
                 "executionTime": execution_time,
+                "cached": cached is not None,
                 "timestamp": firestore.SERVER_TIMESTAMP
             })
         except Exception as firestore_error:
@@ -1007,9 +1476,22 @@ async def execute_code(
             error=error_msg,
             executionTime=execution_time,
             language=request.language,
-            success=success
+            success=success,
+            cached=cached is not None
+        )
+    
+    except QueueFullError as e:
+        logger.warning(f"Execution queue full for user: {uid}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many code executions queued. Please retry shortly.",
+            headers={"Retry-After": str(e.retry_after)}
         )
     
+    except ClientDisconnected:
+        logger.info(f"Code execution cancelled, client disconnected: {uid}")
+        raise HTTPException(status_code=499, detail="Client disconnected")
+    
     except subprocess.TimeoutExpired:
         logger.error(f"Code execution timeout for user: {uid}")
         return ExecuteCodeResponse(
@@ -1027,6 +1509,171 @@ async def execute_code(
             detail=f"Code execution failed: {str(e)}"
         )
 
+@app.post("/api/execute/batch", response_model=ExecuteBatchResponse)
+async def execute_batch(
+    request: ExecuteBatchRequest,
+    http_request: Request,
+    user: dict = Depends(verify_firebase_token)
+):
+    """
+    Run one submission against many test cases
+    Compiles once, then runs the cases in parallel and reports each one
+    """
+    uid = user["uid"]
+    start_time = time.time()
+    cases = [TestCase(case.input, case.expectedOutput) for case in request.testCases]
+    parallelism = min(batch_parallelism, len(cases), exec_scheduler.max_concurrency)
+    
+    async def run_batch():
+        program = await code_executor.prepare(request.language, request.code)
+        if program.error:
+            return program.error, []
+        return None, await code_executor.run_batch(
+            program, cases, parallelism=parallelism, stop_on_failure=request.stopOnFirstFailure
+        )
+    
+    try:
+        compile_error, outcomes = await cancel_on_disconnect(
+            http_request,
+            exec_scheduler.run(uid, run_batch, slots=parallelism)
+        )
+    except QueueFullError as e:
+        logger.warning(f"Execution queue full for user: {uid}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many code executions queued. Please retry shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except ClientDisconnected:
+        logger.info(f"Batch execution cancelled, client disconnected: {uid}")
+        raise HTTPException(status_code=499, detail="Client disconnected")
+    except Exception as e:
+        logger.error(f"Batch execution error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Code execution failed: {str(e)}"
+        )
+    
+    results = []
+    for index, case in enumerate(outcomes):
+        if case.skipped:
+            results.append(TestCaseResult(index=index, output="", passed=False, skipped=True))
+            continue
+        results.append(TestCaseResult(
+            index=index,
+            output=case.outcome.output,
+            error=case.outcome.error,
+            passed=case.passed,
+            executionTime=round(case.outcome.wall_time, 3),
+            peakMemoryKb=case.outcome.peak_memory_kb
+        ))
+    
+    passed_count = sum(result.passed for result in results)
+    execution_time = round(time.time() - start_time, 3)
+    success = compile_error is None and passed_count == len(cases)
+    
+    try:
+        await write_queue.add(db.collection("codeExecutions"), {
+            "userId": uid,
+            "language": request.language,
+            "code": request.code[:500],
+            "success": success,
+            "testCases": len(cases),
+            "passedCases": passed_count,
+            "executionTime": execution_time,
+            "timestamp": firestore.SERVER_TIMESTAMP
+        })
+    except Exception as firestore_error:
+        logger.error(f"Firestore logging error: {firestore_error}")
+    
+    return ExecuteBatchResponse(
+        language=request.language,
+        results=results,
+        passedCount=passed_count,
+        totalCount=len(cases),
+        compileError=compile_error,
+        executionTime=execution_time,
+        success=success
+    )
+
+@app.post("/api/execute/profile", response_model=ProfileResponse)
+async def profile_code(
+    request: ProfileRequest,
+    http_request: Request,
+    user: dict = Depends(verify_firebase_token)
+):
+    """
+    Measure how a solution's CPU time and memory grow with input size
+    Runs under the same scheduler, timeouts and limits as /api/execute. The
+    compile and every measured run each take their own slot, so a sweep queues
+    behind other users' jobs instead of holding a slot for all of it
+    """
+    uid = user["uid"]
+    spec = request.generator
+    if spec.kind not in complexity.INPUT_KINDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown generator kind: {spec.kind}. Use one of {', '.join(complexity.INPUT_KINDS)}"
+        )
+    if spec.minValue > spec.maxValue:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="minValue must not exceed maxValue")
+    
+    sizes = request.sizes or [1000 * 2 ** i for i in range(9)]
+    if min(sizes) < 1 or max(sizes) > profile_max_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Input sizes must be between 1 and {profile_max_size}"
+        )
+    
+    def generator(n: int) -> str:
+        return complexity.generate_input(spec.kind, n, spec.minValue, spec.maxValue, spec.includeSize, spec.seed)
+    
+    def run_once(program, stdin):
+        return exec_scheduler.run(uid, lambda: code_executor.run(program, stdin))
+    
+    async def run_profile():
+        program = await exec_scheduler.run(uid, lambda: code_executor.prepare(request.language, request.code))
+        return await complexity.profile_program(
+            code_executor, program, generator, sizes, repeats=request.repeats, run=run_once
+        )
+    
+    try:
+        result = await cancel_on_disconnect(http_request, run_profile())
+    except QueueFullError as e:
+        logger.warning(f"Execution queue full for user: {uid}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many code executions queued. Please retry shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except ClientDisconnected:
+        logger.info(f"Profiling cancelled, client disconnected: {uid}")
+        raise HTTPException(status_code=499, detail="Client disconnected")
+    except Exception as e:
+        logger.error(f"Profiling error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Code profiling failed: {str(e)}"
+        )
+    
+    return ProfileResponse(
+        language=request.language,
+        timeComplexity=result.time_complexity,
+        spaceComplexity=result.space_complexity,
+        samples=[
+            ProfileSample(
+                size=sample.size,
+                cpuTime=round(sample.cpu_time, 4),
+                wallTime=round(sample.wall_time, 4),
+                peakMemoryKb=sample.peak_memory_kb
+            )
+            for sample in result.samples
+        ],
+        error=result.error,
+        note=result.note,
+        success=result.error is None and result.time_complexity is not None
+    )
+
 
 if __name__ == "__main__":
     import uvicorn
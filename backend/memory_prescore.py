@@ -0,0 +1,268 @@
+"""
+Local pre-scoring for Amnesia Mode memory checks.
+Before a reconstruction goes to the LLM it is compared with the original on
+normalized tokens: comments and formatting are dropped, user-chosen names
+become ID and literals become NUM/STR, while keywords and common library
+calls are kept. Key structures (hash maps, two pointers, binary search, ...)
+are detected on both sides. Clear-cut cases, an empty reconstruction or a
+near-verbatim one that keeps every structure, are scored here in
+milliseconds; everything else is left to the LLM.
+
+Near-verbatim is only judged when both sides are code (enough operators
+and a keyword; prose turns into a run of IDs that would match any other
+prose) and is checked on the real names: the two may differ only by a
+consistent renaming, so a changed operator or swapped operands always go
+to the LLM.
+
+The same original is checked against many reconstructions, so its analysis
+is kept in a small LRU keyed by its normalized fingerprint: copies that
+differ only in comments or formatting share one entry.
+"""
+import hashlib
+import logging
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+KEYWORDS = frozenset("""
+    and as break case catch class const continue def default do elif else false final for foreach from function
+    if import in is lambda let new nonlocal not null or pass private public return self static switch this throw
+    true try var void while yield none int long double float char bool boolean string str list
+""".split())
+
+# Library names that carry meaning regardless of what the variables are called
+LIBRARY_NAMES = frozenset("""
+    append add get put pop push popleft appendleft poll offer peek shift unshift insert remove contains containskey
+    has set dict defaultdict counter map hashmap hashset unordered_map unordered_set deque queue stack heapq heappush
+    heappop priorityqueue priority_queue sort sorted reverse reversed range len length size min max sum abs enumerate
+    zip keys values items substring slice split join math floor ceil bisect bisect_left bisect_right
+""".split())
+
+# Operators that rarely appear in prose; commas, periods, dashes and parentheses don't count
+CODE_OPERATORS = frozenset("""
+    == != <= >= += -= ++ -- && || // ** >> << = [ ] { } < > * / % ^ ~ & |
+""".split())
+
+_IDENTIFIER = re.compile(r"[A-Za-z_]\w*\Z")
+
+_C_LIKE = re.compile(r"[;{]\s*$", re.M)
+_PYTHON_COMMENTS = re.compile(r"#[^\n]*|\"\"\".*?\"\"\"|'''.*?'''", re.S)
+_C_COMMENTS = re.compile(r"/\*.*?\*/|//[^\n]*|^\s*#[^\n]*", re.S | re.M)
+_TOKEN = re.compile(r"""
+    (?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`)
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<word>[A-Za-z_]\w*)
+  | (?P<op>==|!=|<=|>=|\+=|-=|\+\+|--|&&|\|\||//|\*\*|>>|<<|[-+*/%<>=!&|^~?:.,;()\[\]{}])
+""", re.X)
+
+
+def strip_comments(code: str) -> str:
+    pattern = _C_COMMENTS if _C_LIKE.search(code) else _PYTHON_COMMENTS
+    return pattern.sub(" ", code)
+
+
+def normalize_tokens(code: str, keep_names: bool = False) -> List[str]:
+    """Token stream with comments and formatting, and unless keep_names identifiers and literals, abstracted away"""
+    tokens = []
+    for match in _TOKEN.finditer(strip_comments(code)):
+        kind = match.lastgroup
+        if keep_names and kind != "op":
+            tokens.append(match.group())
+        elif kind == "string":
+            tokens.append("STR")
+        elif kind == "number":
+            tokens.append("NUM")
+        elif kind == "word":
+            word = match.group().lower()
+            tokens.append(word if word in KEYWORDS or word in LIBRARY_NAMES else "ID")
+        elif match.group() not in ";{}":
+            # Block delimiters are formatting in Python and punctuation elsewhere
+            tokens.append(match.group())
+    return tokens
+
+
+def _has_two_pointers(code: str) -> bool:
+    for match in re.finditer(r"\bwhile\s*\(?\s*(\w+)\s*<=?\s*(\w+)\b", code):
+        left, right = map(re.escape, match.groups())
+        moves_left = re.search(rf"\b{left}\s*(?:\+=\s*1|\+\+)|\+\+\s*{left}\b|\b{left}\s*=\s*{left}\s*\+\s*1", code)
+        moves_right = re.search(rf"\b{right}\s*(?:-=\s*1|--)|--\s*{right}\b|\b{right}\s*=\s*{right}\s*-\s*1", code)
+        if moves_left and moves_right:
+            return True
+    return False
+
+
+def _has_recursion(code: str) -> bool:
+    names = re.findall(r"\bdef\s+(\w+)|\bfunction\s+(\w+)|\b(\w+)\s*\([^()]*\)\s*(?:throws\s+[\w, ]+)?\{", code)
+    for groups in names:
+        name = next(filter(None, groups))
+        if name in KEYWORDS or name in ("if", "for", "while", "switch", "catch", "main"):
+            continue
+        if len(re.findall(rf"\b{re.escape(name)}\s*\(", code)) > 1:
+            return True
+    return False
+
+
+def _matches(pattern: str) -> Callable[[str], bool]:
+    compiled = re.compile(pattern)
+    return lambda code: compiled.search(code) is not None
+
+
+CONCEPTS: Dict[str, Callable[[str], bool]] = {
+    "hash map lookup": _matches(
+        r"(?<!\.)\b(?:dict|defaultdict|Counter|HashMap|unordered_map|Map)\s*[<(]|\bnew\s+Map\b|\bmap\s*<|=\s*\{\s*\}"
+    ),
+    "hash set": _matches(r"(?<!\.)\b(?:set|HashSet|unordered_set|Set)\s*[<(]|\bnew\s+Set\b"),
+    "two pointers": _has_two_pointers,
+    "binary search": _matches(r"\bmid\s*=.*(?://\s*2|/\s*2|>>\s*1)|\bbisect\w*\s*\(|\bbinarySearch\s*\("),
+    "sorting": _matches(r"\bsorted\s*\(|\.sort\s*\(|\bsort\s*\(|\bArrays\.sort\b|\bCollections\.sort\b"),
+    "stack": _matches(r"\bstack\b|\bStack\s*<|\.push\s*\("),
+    "queue / BFS": _matches(r"\bdeque\b|\bQueue\s*<|\bqueue\b|\.popleft\s*\(|\.poll\s*\(|\.shift\s*\("),
+    "heap / priority queue": _matches(r"\bheapq\b|\bheappush\b|\bPriorityQueue\b|\bpriority_queue\b"),
+    "dynamic programming": _matches(r"\b(?:dp|memo)\b|@(?:functools\.)?(?:lru_)?cache\b"),
+    "recursion": _has_recursion,
+    "iteration": _matches(r"\bfor\b|\bwhile\b|\.forEach\s*\("),
+}
+
+
+def detect_concepts(code: str) -> List[str]:
+    """Names of the key structures that appear in the code, in CONCEPTS order"""
+    stripped = strip_comments(code)
+    return [name for name, found in CONCEPTS.items() if found(stripped)]
+
+
+@dataclass
+class SolutionProfile:
+    # Hash of the text with comments and formatting dropped but names kept, so
+    # prose explanations that differ only in wording never share a fingerprint
+    fingerprint: str
+    tokens: List[str]
+    concepts: List[str]
+    # Tokens with the real names and literals kept, for the near-verbatim check
+    names: List[str]
+
+
+def _fingerprint(names: List[str]) -> str:
+    return hashlib.sha256("\x1f".join(names).encode("utf-8")).hexdigest()
+
+
+def profile_solution(code: str, names: Optional[List[str]] = None) -> SolutionProfile:
+    names = names if names is not None else normalize_tokens(code, keep_names=True)
+    return SolutionProfile(_fingerprint(names), normalize_tokens(code), detect_concepts(code), names)
+
+
+def looks_like_code(tokens: List[str], min_operators: int = 3, min_operator_share: float = 0.08) -> bool:
+    """Whether normalized tokens read as code: enough code operators and at least one keyword"""
+    operators = sum(token in CODE_OPERATORS for token in tokens)
+    keywords = sum(token in KEYWORDS for token in tokens)
+    return keywords > 0 and operators >= max(min_operators, min_operator_share * len(tokens))
+
+
+def _is_identifier(token: str) -> bool:
+    word = token.lower()
+    return _IDENTIFIER.match(token) is not None and word not in KEYWORDS and word not in LIBRARY_NAMES
+
+
+def renamed_only(original: List[str], reconstruction: List[str]) -> bool:
+    """Whether two token streams are equal up to a consistent one-to-one renaming of identifiers"""
+    if len(original) != len(reconstruction):
+        return False
+    forward: Dict[str, str] = {}
+    backward: Dict[str, str] = {}
+    for a, b in zip(original, reconstruction):
+        if _is_identifier(a) and _is_identifier(b):
+            if forward.setdefault(a, b) != b or backward.setdefault(b, a) != a:
+                return False
+        elif a != b:
+            return False
+    return True
+
+
+class MemoryPrescorer:
+    """Scores clear-cut memory checks locally and leaves the rest to the LLM"""
+
+    def __init__(
+        self,
+        min_similarity: float = 0.9,
+        min_tokens: int = 4,
+        max_tokens: int = 1500,
+        max_originals: int = 1024,
+    ):
+        self.min_similarity = min_similarity
+        self.min_tokens = min_tokens
+        # SequenceMatcher is quadratic; longer submissions go straight to the LLM
+        self.max_tokens = max_tokens
+        self.max_originals = max_originals
+        self._originals: "OrderedDict[str, SolutionProfile]" = OrderedDict()
+        self.stats = {
+            "empty": 0, "nearVerbatim": 0, "notCode": 0, "ambiguous": 0, "originalHits": 0, "originalMisses": 0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "MemoryPrescorer":
+        """Build a prescorer from MEMORY_PRESCORE_* environment variables"""
+        return cls(
+            min_similarity=float(os.getenv("MEMORY_PRESCORE_MIN_SIMILARITY", 0.9)),
+            min_tokens=int(os.getenv("MEMORY_PRESCORE_MIN_TOKENS", 4)),
+            max_originals=int(os.getenv("MEMORY_PRESCORE_MAX_ORIGINALS", 1024)),
+        )
+
+    def original(self, code: str) -> SolutionProfile:
+        """Profile of an original solution, computed once per distinct normalized text"""
+        names = normalize_tokens(code, keep_names=True)
+        key = _fingerprint(names)
+        profile = self._originals.get(key)
+        if profile is not None:
+            self._originals.move_to_end(key)
+            self.stats["originalHits"] += 1
+            return profile
+        self.stats["originalMisses"] += 1
+        profile = self._originals[key] = profile_solution(code, names)
+        if len(self._originals) > self.max_originals:
+            self._originals.popitem(last=False)
+        return profile
+
+    def score(self, original: SolutionProfile, reconstruction: SolutionProfile) -> Optional[dict]:
+        """An assessment in the LLM's JSON shape, or None when the case needs the LLM"""
+        original_tokens = original.tokens
+        reconstruction_tokens = reconstruction.tokens
+        original_concepts = original.concepts
+
+        if len(reconstruction_tokens) < self.min_tokens <= len(original_tokens):
+            self.stats["empty"] += 1
+            return {
+                "logicScore": 0,
+                "keyConcepts": [],
+                "missedConcepts": original_concepts or ["core logic"],
+                "feedback": "There isn't enough here to compare yet. Try writing out the approach "
+                            "step by step from memory; even partial logic counts.",
+            }
+
+        if not (looks_like_code(original_tokens) and looks_like_code(reconstruction_tokens)):
+            # Prose explanations are compared for meaning, which only the LLM can do
+            self.stats["notCode"] += 1
+            return None
+
+        if max(len(original_tokens), len(reconstruction_tokens)) <= self.max_tokens:
+            similarity = SequenceMatcher(None, original.names, reconstruction.names, autojunk=False).ratio()
+            if (
+                similarity >= self.min_similarity
+                and renamed_only(original.names, reconstruction.names)
+                and set(original_concepts) <= set(reconstruction.concepts)
+            ):
+                self.stats["nearVerbatim"] += 1
+                kept = f", including the {' and '.join(original_concepts[:3])}" if original_concepts else ""
+                return {
+                    "logicScore": max(90, round(similarity * 100)),
+                    "keyConcepts": original_concepts or ["core logic"],
+                    "missedConcepts": [],
+                    "feedback": f"Excellent recall! Your reconstruction follows the original logic "
+                                f"step for step{kept}. Next time, try explaining why each step is needed.",
+                }
+
+        self.stats["ambiguous"] += 1
+        return None
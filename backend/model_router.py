@@ -0,0 +1,184 @@
+"""
+Tiered model routing for LLM calls.
+Each call names a route (general chat, real-time request, follow-up, learning
+turn, a Time-Travel hint tier, or one of the background jobs) and the routing
+table picks the model, max_tokens and temperature for it, so small talk goes
+to a small low-latency model and only learning turns pay for the 70B one.
+The table can be overridden per route with MODEL_ROUTES (JSON). Every route
+keeps call counts, latency percentiles (time to first token for streams) and
+the token counts the provider reports, so the table can be tuned from
+/health. Calls whose provider reports no usage fall back to the
+tokenizer-free estimate the history window uses and are counted apart.
+"""
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from context_window import estimate_tokens
+from llm import DEFAULT_MODEL, Completion
+from llm_gateway import LLMGateway
+
+logger = logging.getLogger(__name__)
+
+SMALL_MODEL = "llama-3.1-8b-instant"
+
+
+@dataclass(frozen=True)
+class Route:
+    model: str
+    max_tokens: int
+    temperature: float
+    # Order among calls queued for a concurrency slot, lower first
+    priority: int = 1
+
+
+DEFAULT_ROUTES: Dict[str, Route] = {
+    "chat": Route(SMALL_MODEL, 512, 0.7),
+    "realtime": Route(SMALL_MODEL, 512, 0.5),
+    "follow_up": Route(SMALL_MODEL, 1024, 0.7),
+    "learning": Route(DEFAULT_MODEL, 2048, 0.7),
+    "hint_1": Route(DEFAULT_MODEL, 1024, 0.7, priority=0),
+    "hint_2": Route(DEFAULT_MODEL, 1024, 0.7, priority=0),
+    "hint_3": Route(DEFAULT_MODEL, 1536, 0.7, priority=0),
+    "hint_4": Route(DEFAULT_MODEL, 2048, 0.7, priority=0),
+    # Unlocked hints are served from the ladder, so building it is as urgent as a hint
+    "hint_ladder": Route(DEFAULT_MODEL, 3000, 0.5, priority=0),
+    "memory_check": Route(DEFAULT_MODEL, 1500, 0.3, priority=2),
+    "summary": Route(SMALL_MODEL, 300, 0.2, priority=3),
+}
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 1)
+
+
+class RouteStats:
+    """Counters and a window of recent latencies for one route"""
+
+    def __init__(self, window: int):
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # Calls whose token counts had to be estimated
+        self.estimated = 0
+        self.latencies_ms: Deque[float] = deque(maxlen=window)
+        self.first_token_ms: Deque[float] = deque(maxlen=window)
+
+    def snapshot(self, route: Route) -> dict:
+        latencies = list(self.latencies_ms)
+        first_tokens = list(self.first_token_ms)
+        return {
+            "model": route.model,
+            "maxTokens": route.max_tokens,
+            "priority": route.priority,
+            "calls": self.calls,
+            "errors": self.errors,
+            "promptTokens": self.prompt_tokens,
+            "completionTokens": self.completion_tokens,
+            "estimatedUsageCalls": self.estimated,
+            "latencyP50Ms": _percentile(latencies, 0.5),
+            "latencyP95Ms": _percentile(latencies, 0.95),
+            "firstTokenP50Ms": _percentile(first_tokens, 0.5),
+        }
+
+
+class ModelRouter:
+    """Picks model, max_tokens and temperature per route and accounts for every call"""
+
+    def __init__(self, client: LLMGateway, routes: Optional[Dict[str, Route]] = None, window: int = 512):
+        self.client = client
+        self.routes = dict(routes or DEFAULT_ROUTES)
+        self._stats = {name: RouteStats(window) for name in self.routes}
+
+    @classmethod
+    def from_env(cls, client: LLMGateway) -> "ModelRouter":
+        """
+        Build a router from DEFAULT_ROUTES with MODEL_ROUTES overrides, e.g.
+        {"chat": {"model": "llama-3.1-8b-instant", "max_tokens": 256}}
+        """
+        routes = dict(DEFAULT_ROUTES)
+        if os.getenv("HISTORY_SUMMARY_MODEL"):
+            routes["summary"] = replace(routes["summary"], model=os.environ["HISTORY_SUMMARY_MODEL"])
+        for name, override in json.loads(os.getenv("MODEL_ROUTES") or "{}").items():
+            base = routes.get(name, routes["learning"])
+            routes[name] = Route(
+                model=override.get("model", base.model),
+                max_tokens=int(override.get("max_tokens", base.max_tokens)),
+                temperature=float(override.get("temperature", base.temperature)),
+                priority=int(override.get("priority", base.priority)),
+            )
+        return cls(client, routes, window=int(os.getenv("MODEL_ROUTE_LATENCY_WINDOW", 512)))
+
+    def route(self, name: str) -> Route:
+        return self.routes[name]
+
+    def snapshot(self) -> dict:
+        return {name: self._stats[name].snapshot(route) for name, route in self.routes.items()}
+
+    def _account(self, stats: RouteStats, messages: List[Dict[str, str]], reply: Completion, started: float) -> None:
+        stats.latencies_ms.append((time.perf_counter() - started) * 1000)
+        if reply.prompt_tokens is None or reply.completion_tokens is None:
+            stats.estimated += 1
+            stats.prompt_tokens += sum(estimate_tokens(message["content"]) for message in messages)
+            stats.completion_tokens += estimate_tokens(reply.text)
+        else:
+            stats.prompt_tokens += reply.prompt_tokens
+            stats.completion_tokens += reply.completion_tokens
+
+    async def complete(self, name: str, messages: List[Dict[str, str]], **kwargs: Any) -> str:
+        """One completion on the route's model; kwargs (top_p, timeout, ...) pass through"""
+        route, stats = self.routes[name], self._stats[name]
+        stats.calls += 1
+        started = time.perf_counter()
+        try:
+            completion = await self.client.complete(
+                messages=messages,
+                model=route.model,
+                temperature=route.temperature,
+                max_tokens=route.max_tokens,
+                priority=route.priority,
+                **kwargs,
+            )
+        except Exception:
+            stats.errors += 1
+            raise
+        self._account(stats, messages, completion, started)
+        return completion.text
+
+    async def stream(self, name: str, messages: List[Dict[str, str]], **kwargs: Any) -> AsyncIterator[str]:
+        """Stream on the route's model, recording time to first token and total latency"""
+        route, stats = self.routes[name], self._stats[name]
+        stats.calls += 1
+        started = time.perf_counter()
+        chunks = []
+        usage: Dict[str, int] = {}
+
+        def on_usage(prompt_tokens: int, completion_tokens: int) -> None:
+            usage.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+        try:
+            async for delta in self.client.stream(
+                messages=messages,
+                model=route.model,
+                temperature=route.temperature,
+                max_tokens=route.max_tokens,
+                priority=route.priority,
+                on_usage=on_usage,
+                **kwargs,
+            ):
+                if not chunks:
+                    stats.first_token_ms.append((time.perf_counter() - started) * 1000)
+                chunks.append(delta)
+                yield delta
+        except Exception:
+            stats.errors += 1
+            raise
+        self._account(stats, messages, Completion("".join(chunks), **usage), started)
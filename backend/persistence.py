@@ -0,0 +1,197 @@
+"""
+Write-behind persistence for Firestore.
+Endpoints enqueue writes and return immediately; a background task coalesces
+them into batched commits, flushing when a batch fills up or the flush
+interval elapses. The queue is bounded, commits retry with exponential
+backoff, and stop() drains whatever is still pending on shutdown.
+"""
+import asyncio
+import logging
+import os
+import random
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Firestore rejects batches with more than 500 writes
+FIRESTORE_BATCH_LIMIT = 500
+
+
+@dataclass
+class WriteOp:
+    ref: Any
+    data: Dict[str, Any]
+    merge: bool = False
+
+
+def _merge_fields(current: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    """Fold a later merge-set into an earlier one, summing Increment transforms"""
+    merged = dict(current)
+    for key, value in update.items():
+        previous = merged.get(key)
+        if type(value).__name__ == "Increment" and type(previous) is type(value):
+            merged[key] = type(value)(previous.value + value.value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class FirestoreWriteQueue:
+    """Bounded write-behind queue that flushes Firestore writes in batches"""
+
+    def __init__(
+        self,
+        db: Any,
+        max_batch_size: int = 400,
+        flush_interval: float = 0.5,
+        max_pending: int = 10000,
+        enqueue_timeout: float = 2.0,
+        max_retries: int = 5,
+        base_backoff: float = 0.2,
+        max_backoff: float = 10.0,
+    ):
+        self.db = db
+        self.max_batch_size = min(max_batch_size, FIRESTORE_BATCH_LIMIT)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.enqueue_timeout = enqueue_timeout
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._pending: Deque[WriteOp] = deque()
+        self._not_full: Optional[asyncio.Condition] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.stats = {"enqueued": 0, "written": 0, "batches": 0, "retries": 0, "dropped": 0}
+
+    @classmethod
+    def from_env(cls, db: Any) -> "FirestoreWriteQueue":
+        """Build a queue from PERSIST_* environment variables"""
+        return cls(
+            db,
+            max_batch_size=int(os.getenv("PERSIST_MAX_BATCH_SIZE", 400)),
+            flush_interval=float(os.getenv("PERSIST_FLUSH_INTERVAL_SECONDS", 0.5)),
+            max_pending=int(os.getenv("PERSIST_MAX_PENDING", 10000)),
+            max_retries=int(os.getenv("PERSIST_MAX_RETRIES", 5)),
+        )
+
+    def start(self) -> None:
+        if self._task:
+            return
+        self._not_full = asyncio.Condition()
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+        logger.info("Firestore write-behind queue started")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Stop accepting writes and drain everything still pending"""
+        if not self._task:
+            return
+        self._closing = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            self.stats["dropped"] += len(self._pending)
+            logger.error(f"Write-behind drain timed out, dropped {len(self._pending)} pending writes")
+        self._task = None
+        logger.info(f"Firestore write-behind queue stopped: {self.stats}")
+
+    async def add(self, collection_ref: Any, data: Dict[str, Any]) -> None:
+        """Queue a new document with a client-generated id"""
+        await self._put(WriteOp(collection_ref.document(), data))
+
+    async def set(self, doc_ref: Any, data: Dict[str, Any], merge: bool = False) -> None:
+        """Queue a document set"""
+        await self._put(WriteOp(doc_ref, data, merge))
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    async def _put(self, op: WriteOp) -> None:
+        if not self._task or self._closing:
+            # Not running (e.g. during shutdown): write through
+            await self._commit([op])
+            return
+
+        async with self._not_full:
+            try:
+                await asyncio.wait_for(
+                    self._not_full.wait_for(lambda: len(self._pending) < self.max_pending),
+                    timeout=self.enqueue_timeout,
+                )
+            except asyncio.TimeoutError:
+                self.stats["dropped"] += 1
+                logger.error(f"Write-behind queue full ({self.max_pending}), dropping write to {op.ref.path}")
+                return
+            self._pending.append(op)
+            self.stats["enqueued"] += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            while self._pending:
+                ops = [self._pending.popleft() for _ in range(min(self.max_batch_size, len(self._pending)))]
+                async with self._not_full:
+                    self._not_full.notify_all()
+                await self._commit(ops)
+
+            if self._closing and not self._pending:
+                return
+
+    def _coalesce(self, ops: List[WriteOp]) -> List[WriteOp]:
+        """Collapse repeated merge-sets to the same document into one write"""
+        coalesced: List[WriteOp] = []
+        merge_index: Dict[str, int] = {}
+        for op in ops:
+            path = op.ref.path
+            if op.merge and path in merge_index:
+                target = coalesced[merge_index[path]]
+                target.data = _merge_fields(target.data, op.data)
+                continue
+            if op.merge:
+                merge_index[path] = len(coalesced)
+            else:
+                merge_index.pop(path, None)
+            coalesced.append(WriteOp(op.ref, dict(op.data), op.merge))
+        return coalesced
+
+    async def _commit(self, ops: List[WriteOp]) -> None:
+        ops = self._coalesce(ops)
+        for attempt in range(self.max_retries + 1):
+            try:
+                batch = self.db.batch()
+                for op in ops:
+                    if op.merge:
+                        batch.set(op.ref, op.data, merge=True)
+                    else:
+                        batch.set(op.ref, op.data)
+                await asyncio.to_thread(batch.commit)
+                self.stats["written"] += len(ops)
+                self.stats["batches"] += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.stats["dropped"] += len(ops)
+                    logger.error(f"Firestore batch of {len(ops)} writes failed after {attempt + 1} attempts: {e}")
+                    return
+                self.stats["retries"] += 1
+                delay = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+                delay *= random.uniform(0.5, 1.0)
+                logger.warning(f"Firestore batch commit failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
@@ -0,0 +1,105 @@
+"""
+Precompiled phrase matcher used by analyze_context.
+All substring categories are folded into one alternation regex that is scanned
+once per message; every category hit comes back together. Semantics match the
+original `any(p in msg_lower for p in ...)` checks exactly.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List
+
+WEATHER = "weather"
+NEWS = "news"
+SOLUTION_REQUEST = "solution_request"
+ATTEMPT = "attempt"
+BACK_TO = "back_to"
+LEARNING = "learning"
+FOLLOW_UP = "follow_up"
+HINT_REQUEST = "hint_request"
+GENERAL_CHAT = "general_chat"
+
+CATEGORY_PHRASES: Dict[str, List[str]] = {
+    WEATHER: ["weather", "temperature", "how hot", "how cold", "climate", "forecast"],
+    NEWS: ["news", "today's news", "latest news", "current events", "headlines"],
+    SOLUTION_REQUEST: [
+        "give me the answer", "give the answer", "just give me",
+        "give me solution", "give the solution", "show me the answer",
+        "show the solution", "what is the solution", "what's the solution",
+        "tell me the solution", "just show me", "just tell me"
+    ],
+    ATTEMPT: [
+        "i tried", "i think", "maybe", "is it", "would it be",
+        "should i", "idk", "i don't know", "not sure", "i'm stuck", "can't figure"
+    ],
+    BACK_TO: ["back to", "return to", "again about", "still don't get"],
+    LEARNING: [
+        "how do i", "how to", "how about", "what about",
+        "explain", "solve", "algorithm for", "solution for", "implement"
+    ],
+    FOLLOW_UP: [
+        "time complexity", "space complexity", "complexity",
+        "why does this", "why is", "can you explain more",
+        "what do you mean", "how does that", "give me a hint",
+        "give hint", "another hint"
+    ],
+    HINT_REQUEST: [
+        "give hint", "hint please", "need a hint", "can i get a hint",
+        "show hint", "give me hint", "hint", "can you give me a hint",
+        "give me a hint", "i need a hint"
+    ],
+}
+
+# Matched only as the whole message or as its first word (followed by a space or "!")
+CHAT_KEYWORDS = ["hello", "hi", "hey", "thanks", "thank you", "okay", "ok", "got it", "cool"]
+
+STOP_WORDS = frozenset(["how", "to", "the", "a", "an", "what", "is", "explain", "can", "you", "i", "do", "about", "for"])
+
+
+class PhraseMatcher:
+    """Classify a lowercased message against every phrase category in one scan"""
+
+    def __init__(self, categories: Dict[str, Iterable[str]], chat_keywords: Iterable[str]):
+        phrase_categories: Dict[str, set] = {}
+        for category, phrases in categories.items():
+            for phrase in phrases:
+                phrase_categories.setdefault(phrase, set()).add(category)
+
+        # At any start position the regex reports only the longest phrase; every other
+        # phrase matching there is a prefix of it, so fold prefix categories in up front
+        self._hits: Dict[str, FrozenSet[str]] = {}
+        for phrase in phrase_categories:
+            hits = set()
+            for other, other_categories in phrase_categories.items():
+                if phrase.startswith(other):
+                    hits |= other_categories
+            self._hits[phrase] = frozenset(hits)
+
+        alternation = "|".join(re.escape(p) for p in sorted(phrase_categories, key=len, reverse=True))
+        self._pattern = re.compile(f"(?=({alternation}))")
+        chat_alternation = "|".join(re.escape(k) for k in chat_keywords)
+        self._chat_pattern = re.compile(f"(?:{chat_alternation})(?:\\Z|[ !])")
+
+    def classify(self, msg_lower: str) -> FrozenSet[str]:
+        """Return the set of categories whose phrases occur in the message"""
+        hits: set = set()
+        for match in self._pattern.finditer(msg_lower):
+            hits |= self._hits[match.group(1)]
+        if self._chat_pattern.match(msg_lower):
+            hits.add(GENERAL_CHAT)
+        return frozenset(hits)
+
+
+matcher = PhraseMatcher(CATEGORY_PHRASES, CHAT_KEYWORDS)
+
+
+def classify(message: str) -> FrozenSet[str]:
+    """Lowercase, strip and classify a raw message"""
+    return matcher.classify(message.lower().strip())
+
+
+@lru_cache(maxsize=4096)
+def extract_topic(msg: str) -> str:
+    """First three meaningful words of a message, memoized across turns"""
+    words = msg.lower().split()
+    meaningful = [w for w in words if w not in STOP_WORDS and len(w) > 3]
+    return " ".join(meaningful[:3])
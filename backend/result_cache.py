@@ -0,0 +1,137 @@
+"""
+Cache of /api/execute results for deterministic programs.
+Keyed by language plus hashes of the source and stdin, bounded by entry
+count, total output size and a TTL, and evicted LRU. Entries are shared by
+every user who submits the same program, so only deterministic runs may be
+stored: programs that look like they read the clock, a random source, the
+environment or the network are never cached, and neither are runs that
+printed a memory address or timed out or were killed by a limit. Python
+workers run with a fixed hash seed (see interpreter_pool.WORKER_ENV), so set
+and dict ordering doesn't vary between runs either.
+"""
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Pattern, Tuple
+
+from executor import ExecutionOutcome
+
+logger = logging.getLogger(__name__)
+
+NONDETERMINISTIC_SOURCES: Dict[str, Pattern[str]] = {
+    "python": re.compile(
+        r"\b(?:random|secrets|uuid|time|datetime|urandom|perf_counter|monotonic|getpid|threading|multiprocessing"
+        r"|environ|getenv|socket|urllib|http|requests|subprocess|id)\b"
+    ),
+    "javascript": re.compile(
+        r"\b(?:Math\.random|Date|performance|crypto|process\.hrtime|setTimeout|setInterval|process\.pid"
+        r"|process\.env|fetch|net|http|https|dgram|child_process)\b"
+    ),
+    "c": re.compile(r"\b(?:s?rand|random|time|clock|clock_gettime|gettimeofday|getpid|pthread_create|getenv|environ|socket)\b|/dev/u?random"),
+    "cpp": re.compile(r"\b(?:s?rand|random_device|mt19937(?:_64)?|chrono|time|clock|getpid|thread|async|getenv|environ|socket)\b|/dev/u?random"),
+    "java": re.compile(
+        r"\b(?:Random|ThreadLocalRandom|SecureRandom|Math\.random|currentTimeMillis|nanoTime|Instant|LocalDate(?:Time)?|UUID|Thread"
+        r"|getenv|getProperty|Socket|URL|HttpClient|identityHashCode)\b"
+    ),
+}
+
+# Object addresses (Python/JS reprs, C %p) and Java identity hashes differ between runs
+MEMORY_ADDRESS = re.compile(r"0x[0-9a-fA-F]{6,}|\b[A-Za-z_$][\w$.]*@[0-9a-f]{4,8}\b")
+
+
+def is_deterministic(language: str, code: str) -> bool:
+    """False for code that appears to read time, randomness or scheduling"""
+    pattern = NONDETERMINISTIC_SOURCES.get(language)
+    return pattern is not None and not pattern.search(code)
+
+
+@dataclass
+class CachedResult:
+    outcome: ExecutionOutcome
+    execution_time: float
+    expires_at: float
+    size: int
+
+
+class ExecutionResultCache:
+    """TTL + LRU cache of execution outcomes"""
+
+    def __init__(self, max_entries: int = 2000, max_bytes: int = 32 * 1024 * 1024, ttl: float = 600.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "unstable": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    @classmethod
+    def from_env(cls) -> "ExecutionResultCache":
+        """Build a cache from EXEC_RESULT_CACHE_* environment variables"""
+        return cls(
+            max_entries=int(os.getenv("EXEC_RESULT_CACHE_MAX_ENTRIES", 2000)),
+            max_bytes=int(os.getenv("EXEC_RESULT_CACHE_MAX_MB", 32)) * 1024 * 1024,
+            ttl=float(os.getenv("EXEC_RESULT_CACHE_TTL_SECONDS", 600)),
+        )
+
+    @staticmethod
+    def key(language: str, code: str, stdin: Optional[str]) -> str:
+        source = hashlib.sha256(code.encode("utf-8")).hexdigest()
+        # None and "" differ for JavaScript, where only a given input defines `input`
+        given = "-" if stdin is None else hashlib.sha256(stdin.encode("utf-8")).hexdigest()
+        return f"{language}:{source}:{given}"
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hitRate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            **self.stats,
+        }
+
+    def bypass(self) -> None:
+        self.stats["bypassed"] += 1
+
+    def lookup(self, language: str, code: str, stdin: Optional[str]) -> Tuple[Optional[str], Optional[CachedResult]]:
+        """Cache key and cached result for a run; no key for programs that mustn't be cached"""
+        if not is_deterministic(language, code):
+            self.bypass()
+            return None, None
+        key = self.key(language, code, stdin)
+        return key, self.get(key)
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.stats["expired"] += 1
+            entry = None
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry
+
+    def put(self, key: str, outcome: ExecutionOutcome, execution_time: float) -> None:
+        size = len(outcome.output) + len(outcome.error or "")
+        if size > self.max_bytes // 16:
+            return
+        if MEMORY_ADDRESS.search(outcome.output) or MEMORY_ADDRESS.search(outcome.error or ""):
+            self.stats["unstable"] += 1
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CachedResult(outcome, execution_time, time.monotonic() + self.ttl, size)
+        self._bytes += size
+        self.stats["stores"] += 1
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def _remove(self, key: str) -> None:
+        self._bytes -= self._entries.pop(key).size
@@ -0,0 +1,271 @@
+"""
+Child processes for executed code.
+Programs are started through a tiny launcher that forks them, waits with
+wait4() and reports their CPU time and peak RSS on a side pipe. Reaping the
+program directly from the API process wouldn't work: Linux carries the
+forking process's RSS high-water mark into ru_maxrss, so every run would
+"peak" at the size of the server. The launcher's own, much smaller, footprint
+still sets a floor, which is reported so callers know when a peak is only an
+upper bound. Each launcher runs in its own session so a kill takes down the
+program and anything it forked.
+
+The launcher also applies per-job rlimits (CPU seconds, address space,
+process count, file size) in the child before exec, and output is read
+incrementally and capped so a print loop can't grow the API process.
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+
+LAUNCHER = r'''
+import os, resource, signal, sys
+report = int(sys.argv[1])
+cpu, address_space, processes, file_size = map(int, sys.argv[2].split(","))
+argv = sys.argv[3:]
+# Our own resident size: the child starts out counting a copy of it. Not
+# ru_maxrss, which still remembers the API process we were forked from
+try:
+    floor = os.sysconf("SC_PAGE_SIZE") // 1024 * int(open("/proc/self/statm").read().split()[1])
+except (OSError, ValueError):
+    floor = 0
+pid = os.fork()
+if pid == 0:
+    os.close(report)
+    try:
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        if cpu:
+            # SIGXCPU at the soft limit, SIGKILL a second later if it's ignored
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+        if address_space:
+            resource.setrlimit(resource.RLIMIT_AS, (address_space, address_space))
+        if processes:
+            resource.setrlimit(resource.RLIMIT_NPROC, (processes, processes))
+        if file_size:
+            resource.setrlimit(resource.RLIMIT_FSIZE, (file_size, file_size))
+        os.execvp(argv[0], argv)
+    except (OSError, ValueError) as e:
+        os.write(2, f"{argv[0]}: {e}\n".encode())
+        os._exit(127)
+signal.signal(signal.SIGINT, signal.SIG_IGN)
+while True:
+    try:
+        _, status, usage = os.wait4(pid, 0)
+        break
+    except InterruptedError:
+        pass
+os.write(report, f"{usage.ru_utime + usage.ru_stime} {usage.ru_maxrss} {floor}\n".encode())
+code = os.waitstatus_to_exitcode(status)
+if code < 0:
+    signal.signal(-code, signal.SIG_DFL)
+    os.kill(os.getpid(), -code)
+os._exit(code)
+'''
+
+# -I -S keeps the launcher's own footprint (and so the floor of ru_maxrss) small
+LAUNCHER_ARGV: List[str] = [sys.executable, "-I", "-S", "-c", LAUNCHER]
+
+# V8 reserves about a gigabyte of address space before running any code, and
+# the JVM reserves heap, metaspace and code cache up front. For those runtimes
+# the heap flag carries the real memory limit and RLIMIT_AS is only a backstop
+ADDRESS_SPACE_HEADROOM_MB = {"javascript": 1024}
+UNBOUNDED_ADDRESS_SPACE = {"java"}
+
+
+@dataclass(frozen=True)
+class ResourceLimits:
+    cpu_seconds: int = 10
+    memory_mb: int = 256
+    address_space_mb: Optional[int] = 256
+    # RLIMIT_NPROC counts every process and thread of the uid running the API,
+    # so it has to leave room for the server itself; root ignores it entirely
+    processes: int = 256
+    file_size_mb: int = 16
+    output_kb: int = 256
+
+    @classmethod
+    def from_env(cls) -> "ResourceLimits":
+        """Build limits from EXEC_LIMIT_* environment variables (0 disables a limit)"""
+        memory_mb = int(os.getenv("EXEC_LIMIT_MEMORY_MB", 256))
+        return cls(
+            cpu_seconds=int(os.getenv("EXEC_LIMIT_CPU_SECONDS", 10)),
+            memory_mb=memory_mb,
+            address_space_mb=memory_mb,
+            processes=int(os.getenv("EXEC_LIMIT_PROCESSES", 256)),
+            file_size_mb=int(os.getenv("EXEC_LIMIT_FILE_SIZE_MB", 16)),
+            output_kb=int(os.getenv("EXEC_LIMIT_OUTPUT_KB", 256)),
+        )
+
+    def for_language(self, language: str) -> "ResourceLimits":
+        if not self.memory_mb or language in UNBOUNDED_ADDRESS_SPACE:
+            return replace(self, address_space_mb=None)
+        return replace(self, address_space_mb=self.memory_mb + ADDRESS_SPACE_HEADROOM_MB.get(language, 0))
+
+    def launcher_arg(self) -> str:
+        mb = 1024 * 1024
+        return ",".join(str(value) for value in (
+            self.cpu_seconds,
+            (self.address_space_mb or 0) * mb,
+            self.processes,
+            self.file_size_mb * mb,
+        ))
+
+
+NO_LIMITS = ResourceLimits(cpu_seconds=0, memory_mb=0, address_space_mb=None, processes=0, file_size_mb=0, output_kb=0)
+
+
+@dataclass
+class ProcessResult:
+    returncode: int
+    stdout: str
+    stderr: str
+    wall_time: float
+    cpu_time: float
+    peak_memory_kb: int
+    # Peaks at or below this are the launcher's footprint, not the program's
+    memory_floor_kb: int = 0
+    output_truncated: bool = False
+
+
+class SandboxProcess:
+    """A program started under the launcher, with its resource usage"""
+
+    def __init__(self, process: asyncio.subprocess.Process, report_fd: int, argv: List[str], limits: ResourceLimits):
+        self.process = process
+        self.argv = argv
+        self.limits = limits
+        self.started_at = time.monotonic()
+        # Scratch directory the program runs in, owned by whoever spawned it
+        self.workspace: Optional[str] = None
+        self._report_fd: Optional[int] = report_fd
+
+    @classmethod
+    async def spawn(
+        cls,
+        argv: List[str],
+        cwd: Optional[str] = None,
+        limits: ResourceLimits = NO_LIMITS,
+        env: Optional[Dict[str, str]] = None,
+    ) -> "SandboxProcess":
+        read_fd, write_fd = os.pipe()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *LAUNCHER_ARGV, str(write_fd), limits.launcher_arg(), *argv,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=cwd,
+                env={**os.environ, **env} if env else None,
+                pass_fds=(write_fd,),
+                start_new_session=True,
+            )
+        except BaseException:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        return cls(process, read_fd, argv, limits)
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.process.returncode
+
+    def kill(self) -> None:
+        if self.process.returncode is not None:
+            return
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    async def wait(self) -> int:
+        return await self.process.wait()
+
+    def close(self) -> None:
+        if self._report_fd is not None:
+            os.close(self._report_fd)
+            self._report_fd = None
+
+    def _usage(self) -> Tuple[float, int, int]:
+        """CPU seconds, peak RSS and RSS floor in KB; zeros if the launcher was killed before reporting"""
+        try:
+            # The launcher has exited, so this never blocks: data or EOF
+            cpu, rss, floor = os.read(self._report_fd, 256).split()
+            return float(cpu), int(rss), int(floor)
+        except (OSError, ValueError):
+            return 0.0, 0, 0
+
+    async def _feed(self, data: bytes) -> None:
+        stdin = self.process.stdin
+        try:
+            if data:
+                stdin.write(data)
+                await stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # The program exited without reading all of its input
+            pass
+        finally:
+            stdin.close()
+
+    async def _collect(self, stream: asyncio.StreamReader, limit: int) -> Tuple[bytes, bool]:
+        """Read a pipe to EOF, keeping at most `limit` bytes and killing the program past it"""
+        chunks = []
+        size = 0
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                return b"".join(chunks), False
+            if limit and size + len(chunk) > limit:
+                chunks.append(chunk[:limit - size])
+                self.kill()
+                return b"".join(chunks), True
+            chunks.append(chunk)
+            size += len(chunk)
+
+    async def communicate(self, data: bytes, timeout: float) -> ProcessResult:
+        """Feed stdin, collect output and wait; raises subprocess.TimeoutExpired on timeout"""
+        started = time.monotonic()
+        limit = self.limits.output_kb * 1024
+        io = asyncio.gather(
+            self._feed(data),
+            self._collect(self.process.stdout, limit),
+            self._collect(self.process.stderr, limit),
+            self.process.wait(),
+        )
+        try:
+            _, (stdout, stdout_cut), (stderr, stderr_cut), _ = await asyncio.wait_for(io, timeout=timeout)
+            cpu_time, peak_memory_kb, memory_floor_kb = self._usage()
+        except asyncio.TimeoutError:
+            raise subprocess.TimeoutExpired(self.argv[0], timeout)
+        finally:
+            if self.process.returncode is None:
+                self.kill()
+                await self.process.wait()
+            self.close()
+
+        return ProcessResult(
+            returncode=self.process.returncode,
+            stdout=stdout.decode("utf-8", errors="replace"),
+            stderr=stderr.decode("utf-8", errors="replace"),
+            wall_time=time.monotonic() - started,
+            cpu_time=cpu_time,
+            peak_memory_kb=peak_memory_kb,
+            memory_floor_kb=memory_floor_kb,
+            output_truncated=stdout_cut or stderr_cut,
+        )
+
+
+async def run_process(
+    argv: List[str],
+    stdin: Optional[str],
+    timeout: float,
+    cwd: Optional[str] = None,
+    limits: ResourceLimits = NO_LIMITS,
+) -> ProcessResult:
+    """Run a program to completion; raises subprocess.TimeoutExpired on timeout"""
+    process = await SandboxProcess.spawn(argv, cwd=cwd, limits=limits)
+    return await process.communicate((stdin or "").encode("utf-8"), timeout)
@@ -0,0 +1,155 @@
+"""
+Server-side chat session state.
+Keeps recent history, conversation context and time-travel context per
+sessionId in an in-memory LRU so clients only send the new message plus the
+version they last saw. Evicted or cold sessions are rebuilt from the
+`sessions/{id}` document and its `messages` subcollection.
+"""
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SessionOwnershipError(PermissionError):
+    """Raised when a user records a turn in a session another user owns"""
+
+
+class SessionVersionConflict(Exception):
+    """Raised when a turn is recorded on top of a version the session has already moved past"""
+
+    def __init__(self, version: int):
+        super().__init__(f"Session version mismatch (server has {version}); resend conversationHistory")
+        self.version = version
+
+
+@dataclass
+class SessionState:
+    uid: Optional[str]
+    version: int = 0
+    history: List[Dict[str, str]] = field(default_factory=list)
+    context: Optional[Dict[str, Any]] = None
+    time_travel: Optional[Dict[str, Any]] = None
+    # Messages trimmed off the front of `history` (so history[0] is message number `offset`)
+    offset: int = 0
+
+
+class SessionStore:
+    """LRU of live sessions backed by Firestore"""
+
+    def __init__(self, db: Any, max_sessions: int = 5000, max_history: int = 100):
+        self.db = db
+        self.max_sessions = max_sessions
+        self.max_history = max_history
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        self.stats = {"hits": 0, "loads": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls, db: Any) -> "SessionStore":
+        """Build a store from SESSION_* environment variables"""
+        return cls(
+            db,
+            max_sessions=int(os.getenv("SESSION_STORE_MAX_SESSIONS", 5000)),
+            max_history=int(os.getenv("SESSION_MAX_HISTORY", 100)),
+        )
+
+    async def get(self, session_id: str) -> SessionState:
+        """Return the session, loading it from Firestore on a cache miss"""
+        state = self._sessions.get(session_id)
+        if state is not None:
+            self._sessions.move_to_end(session_id)
+            self.stats["hits"] += 1
+            return state
+
+        state = await asyncio.to_thread(self._load, session_id)
+        self.stats["loads"] += 1
+        # Another request may have populated the session while we were loading
+        state = self._sessions.setdefault(session_id, state)
+        self._sessions.move_to_end(session_id)
+        self._evict()
+        return state
+
+    def peek(self, session_id: str) -> Optional[SessionState]:
+        return self._sessions.get(session_id)
+
+    def record_turn(
+        self,
+        session_id: str,
+        uid: str,
+        history: List[Dict[str, str]],
+        user_text: str,
+        assistant_text: str,
+        context: Dict[str, Any],
+        time_travel: Optional[Dict[str, Any]],
+        offset: int = 0,
+        expected_version: Optional[int] = None,
+    ) -> int:
+        """
+        Append one exchange on top of `history` (starting at message `offset`) and return the new version
+        With `expected_version` this is a compare-and-set: a turn built on a snapshot another
+        turn has since replaced raises SessionVersionConflict instead of overwriting it
+        """
+        state = self._sessions.get(session_id)
+        if state is None:
+            # Evicted since the turn read it; carry on from the version the turn saw
+            state = SessionState(uid=uid, version=expected_version or 0)
+        if state.uid and state.uid != uid:
+            raise SessionOwnershipError("Session belongs to another user")
+        if expected_version is not None and state.version != expected_version:
+            raise SessionVersionConflict(state.version)
+        state.uid = uid
+        combined = history + [
+            {"role": "user", "text": user_text},
+            {"role": "assistant", "text": assistant_text},
+        ]
+        state.history = combined[-self.max_history:]
+        state.offset = offset + len(combined) - len(state.history)
+        state.context = context
+        state.time_travel = time_travel
+        state.version += 1
+        self._sessions[session_id] = state
+        self._sessions.move_to_end(session_id)
+        self._evict()
+        return state.version
+
+    def _evict(self) -> None:
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _load(self, session_id: str) -> SessionState:
+        session_ref = self.db.collection("sessions").document(session_id)
+        snapshot = session_ref.get()
+        if not snapshot.exists:
+            return SessionState(uid=None)
+
+        data = snapshot.to_dict() or {}
+        docs = (
+            session_ref.collection("messages")
+            .order_by("timestamp")
+            .limit_to_last(self.max_history)
+            .get()
+        )
+        messages = [doc.to_dict() for doc in docs]
+        # Messages flushed in the same batch share a server timestamp; the turn
+        # number and role break the tie so each exchange stays in order
+        messages.sort(key=lambda m: (m.get("timestamp"), m.get("turn", 0), m.get("role") == "assistant"))
+        logger.info(f"Loaded session {session_id} from Firestore ({len(messages)} messages)")
+
+        return SessionState(
+            uid=data.get("userId"),
+            version=data.get("version", 0),
+            history=[{"role": m.get("role", "user"), "text": m.get("text", "")} for m in messages],
+            context={
+                "currentTopic": data.get("currentTopic"),
+                "attemptCount": data.get("attemptCount", 0),
+                "isLearningMode": data.get("isLearningMode", False),
+            },
+            time_travel=data.get("timeTravelContext"),
+            # Every turn persists two messages; only the last max_history were loaded
+            offset=max(0, 2 * data.get("version", 0) - len(messages)),
+        )
@@ -0,0 +1,82 @@
+"""
+Server-sent event helpers for streaming chat replies.
+The model is prompted to answer in JSON, so the token stream is raw JSON; the
+extractor below pulls the "text" field out incrementally so students see prose,
+not braces.
+"""
+import json
+import re
+from typing import Any, Dict
+
+_TEXT_FIELD = re.compile(r'"text"\s*:\s*"')
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class JsonTextFieldStream:
+    """Incrementally decode the "text" string of a streamed JSON reply"""
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._mode = "search"
+
+    def feed(self, chunk: str) -> str:
+        """Add raw model output and return any newly decoded reply text"""
+        self._buffer += chunk
+
+        if self._mode == "search":
+            head = self._buffer.lstrip()
+            if head and not head.startswith(("{", "`")):
+                # Model ignored the JSON instruction: pass the text straight through
+                self._mode = "raw"
+                self._pos = len(self._buffer)
+                return self._buffer
+            match = _TEXT_FIELD.search(self._buffer)
+            if not match:
+                return ""
+            self._mode = "string"
+            self._pos = match.end()
+
+        if self._mode == "raw":
+            self._pos = len(self._buffer)
+            return chunk
+
+        if self._mode == "string":
+            return self._decode()
+        return ""
+
+    def _decode(self) -> str:
+        out = []
+        buf = self._buffer
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self._mode = "done"
+                i += 1
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            if i + 1 >= len(buf):
+                break
+            esc = buf[i + 1]
+            if esc == "u":
+                if i + 6 > len(buf):
+                    break
+                try:
+                    out.append(chr(int(buf[i + 2:i + 6], 16)))
+                except ValueError:
+                    pass
+                i += 6
+            else:
+                out.append(_ESCAPES.get(esc, esc))
+                i += 2
+        self._pos = i
+        return "".join(out)
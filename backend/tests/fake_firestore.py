@@ -0,0 +1,72 @@
+"""In-process stand-in for the Firestore client: collections, documents, batches and Increment"""
+import random
+import time
+import uuid
+
+
+class Increment:
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeDocument:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+
+    def collection(self, name):
+        return FakeCollection(self.db, f"{self.path}/{name}")
+
+    def set(self, data, merge=False):
+        batch = self.db.batch()
+        batch.set(self, data, merge=merge)
+        batch.commit()
+
+
+class FakeCollection:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+
+    def document(self, doc_id=None):
+        return FakeDocument(self.db, f"{self.path}/{doc_id or uuid.uuid4().hex}")
+
+    def add(self, data):
+        self.document().set(data)
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append((ref.path, data, merge))
+
+    def commit(self):
+        time.sleep(self.db.latency)
+        self.db.commits += 1
+        if random.random() < self.db.failure_rate:
+            raise RuntimeError("UNAVAILABLE: injected failure")
+        for path, data, merge in self.writes:
+            doc = self.db.docs.setdefault(path, {}) if merge else {}
+            for key, value in data.items():
+                if isinstance(value, Increment):
+                    doc[key] = doc.get(key, 0) + value.value
+                else:
+                    doc[key] = value
+            self.db.docs[path] = doc
+
+
+class FakeFirestore:
+    def __init__(self, latency, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.docs = {}
+        self.commits = 0
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
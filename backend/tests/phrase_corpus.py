@@ -0,0 +1,88 @@
+"""
+Oracle for the phrase matcher: the per-category `any(p in msg_lower for p in ...)`
+scans and phrase lists exactly as main.py had them before PhraseMatcher, plus a
+hand-written corpus of edge cases and a fuzzer that splices phrases together.
+Kept independent of phrase_matcher so an edit there can't move the oracle too.
+"""
+import random
+
+LEGACY_PHRASES = {
+    "weather": ["weather", "temperature", "how hot", "how cold", "climate", "forecast"],
+    "news": ["news", "today's news", "latest news", "current events", "headlines"],
+    "solution_request": [
+        "give me the answer", "give the answer", "just give me",
+        "give me solution", "give the solution", "show me the answer",
+        "show the solution", "what is the solution", "what's the solution",
+        "tell me the solution", "just show me", "just tell me"
+    ],
+    "attempt": [
+        "i tried", "i think", "maybe", "is it", "would it be",
+        "should i", "idk", "i don't know", "not sure", "i'm stuck", "can't figure"
+    ],
+    "back_to": ["back to", "return to", "again about", "still don't get"],
+    "learning": [
+        "how do i", "how to", "how about", "what about",
+        "explain", "solve", "algorithm for", "solution for", "implement"
+    ],
+    "follow_up": [
+        "time complexity", "space complexity", "complexity",
+        "why does this", "why is", "can you explain more",
+        "what do you mean", "how does that", "give me a hint",
+        "give hint", "another hint"
+    ],
+    "hint_request": [
+        "give hint", "hint please", "need a hint", "can i get a hint",
+        "show hint", "give me hint", "hint", "can you give me a hint",
+        "give me a hint", "i need a hint"
+    ],
+}
+
+LEGACY_CHAT_KEYWORDS = ["hello", "hi", "hey", "thanks", "thank you", "okay", "ok", "got it", "cool"]
+
+CORPUS = [
+    "", "hi", "hi!", "hi there", "hint", "hint please", "hiking is fun",
+    "ok", "okay", "ok!", "okay thanks", "oks", "okay!", "cool", "coolest trick",
+    "thanks", "thank you", "thank you!", "thanks!", "thankyou", "got it", "got it!",
+    "hello, how to reverse a linked list", "hey how do i solve two sum",
+    "what's the weather like", "latest news please", "today's news", "headlines",
+    "give me the answer", "just give me the solution", "what's the solution",
+    "i think we use a hash map", "maybe a stack?", "is it o(n)?", "idk",
+    "i don't know", "i'm stuck on the loop", "can't figure it out",
+    "back to binary search", "return to the graph problem", "still don't get recursion",
+    "explain dynamic programming", "implement quicksort", "algorithm for dijkstra",
+    "what is the time complexity", "space complexity?", "why is this o(n log n)",
+    "can you explain more", "what do you mean", "how does that work",
+    "give me a hint", "give hint", "another hint", "give me hint", "can i get a hint",
+    "can you give me a hint please", "i need a hint", "need a hint",
+    "complexity of the solution for two sum",
+    "how about we try sliding window", "what about a heap",
+    "show me the answer for climate data parsing",
+    "  hi  ", "HI", "Give Me The Answer", "the forecast of news",
+    "solution for n-queens", "is iterative better than recursive",
+]
+
+FRAGMENTS = [
+    "the", "a", "and", "so", "hash map", "two pointers", "?", "!", " ", "o(n)",
+] + [p for phrases in LEGACY_PHRASES.values() for p in phrases] + LEGACY_CHAT_KEYWORDS
+
+
+def legacy_classify(msg_lower):
+    hits = {
+        category
+        for category, phrases in LEGACY_PHRASES.items()
+        if any(p in msg_lower for p in phrases)
+    }
+    if any(
+        msg_lower == kw or msg_lower.startswith(f"{kw} ") or msg_lower.startswith(f"{kw}!")
+        for kw in LEGACY_CHAT_KEYWORDS
+    ):
+        hits.add("general_chat")
+    return frozenset(hits)
+
+
+def fuzz_messages(n, seed=0):
+    rng = random.Random(seed)
+    for _ in range(n):
+        parts = rng.choices(FRAGMENTS, k=rng.randint(1, 6))
+        joiner = rng.choice([" ", "", "  ", "!"])
+        yield joiner.join(parts)
@@ -0,0 +1,102 @@
+"""VerifiedTokenCache: caching, and the certificate prefetch's fallback when the SDK transport is missing"""
+import asyncio
+import logging
+import time
+
+import pytest
+
+import auth_cache
+from auth_cache import CertPrefetchUnsupported, VerifiedTokenCache
+
+
+class Response:
+    status = 200
+
+
+def missing_transport():
+    raise CertPrefetchUnsupported("firebase_admin's token verifier has no certificate transport")
+
+
+def test_repeat_tokens_are_served_from_the_cache():
+    calls = []
+
+    def verify(token):
+        calls.append(token)
+        return {"uid": "u", "exp": time.time() + 3600}
+
+    cache = VerifiedTokenCache(verify=verify)
+
+    async def main():
+        return [await cache.verify("t") for _ in range(3)]
+
+    assert [d["uid"] for d in asyncio.run(main())] == ["u"] * 3
+    assert calls == ["t"]
+    assert cache.snapshot()["hits"] == 2
+
+
+def test_tokens_past_exp_are_not_cached():
+    cache = VerifiedTokenCache(verify=lambda token: {"uid": "u", "exp": time.time() - 1})
+    cache.put("t", {"uid": "u", "exp": time.time() - 1})
+    assert cache.get("t") is None
+
+
+def test_missing_transport_disables_prefetch_with_a_startup_warning(caplog):
+    cache = VerifiedTokenCache(verify=lambda token: {"uid": "u"}, cert_transport=missing_transport)
+
+    async def main():
+        cache.start()
+        started = cache._refresh_task
+        decoded = await cache.verify("t")
+        await cache.stop()
+        return started, decoded
+
+    with caplog.at_level(logging.WARNING, logger="auth_cache"):
+        started, decoded = asyncio.run(main())
+
+    assert started is None
+    assert decoded == {"uid": "u"}
+    assert cache.snapshot()["certPrefetch"] is False
+    assert "prefetch disabled" in caplog.text
+
+
+def test_available_transport_prefetches_certificates():
+    requests = []
+
+    def request(url, **kwargs):
+        requests.append((url, kwargs["headers"]))
+        return Response()
+
+    cache = VerifiedTokenCache(cert_transport=lambda: request, cert_refresh_interval=3600)
+
+    async def main():
+        cache.start()
+        for _ in range(100):
+            if cache.stats["certRefreshes"]:
+                break
+            await asyncio.sleep(0.01)
+        await cache.stop()
+
+    asyncio.run(main())
+    assert cache.snapshot()["certPrefetch"] is True
+    assert requests == [(auth_cache.ID_TOKEN_CERT_URI, {"Cache-Control": "no-cache"})]
+
+
+def test_sdk_cert_transport_reports_a_moved_transport(monkeypatch):
+    monkeypatch.setattr(auth_cache.auth, "_get_client", lambda app: object())
+    with pytest.raises(CertPrefetchUnsupported):
+        auth_cache.sdk_cert_transport()
+
+
+def test_sdk_cert_transport_reports_a_missing_client_lookup(monkeypatch):
+    monkeypatch.delattr(auth_cache.auth, "_get_client")
+    with pytest.raises(CertPrefetchUnsupported):
+        auth_cache.sdk_cert_transport()
+
+
+def test_sdk_cert_transport_reports_an_uninitialized_app(monkeypatch):
+    def no_app(app):
+        raise ValueError("The default Firebase app does not exist")
+
+    monkeypatch.setattr(auth_cache.auth, "_get_client", no_app)
+    with pytest.raises(CertPrefetchUnsupported, match="default Firebase app"):
+        auth_cache.sdk_cert_transport()
@@ -0,0 +1,201 @@
+"""SingleFlight: sharing in-flight calls and replaying completed ones by request ID"""
+import asyncio
+
+import pytest
+
+from coalescing import IdempotencyConflict, SingleFlight, fingerprint
+
+
+class Counter:
+    """A model call stand-in that counts invocations and can be held open or made to fail"""
+
+    def __init__(self, result="answer", fail=False):
+        self.result = result
+        self.fail = fail
+        self.calls = 0
+        self.gate = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.gate.wait()
+        if self.fail:
+            raise RuntimeError("model call failed")
+        return self.result
+
+
+def test_fingerprint_ignores_key_order():
+    assert fingerprint("u", {"a": 1, "b": 2}) == fingerprint("u", {"b": 2, "a": 1})
+    assert fingerprint("u", {"a": 1}) != fingerprint("v", {"a": 1})
+
+
+def test_identical_requests_share_one_call():
+    flight = SingleFlight()
+
+    async def main():
+        call = Counter()
+        runs = [asyncio.create_task(flight.run("k", call)) for _ in range(3)]
+        await asyncio.sleep(0)
+        call.gate.set()
+        return call, await asyncio.gather(*runs)
+
+    call, results = asyncio.run(main())
+    assert call.calls == 1
+    assert results == ["answer"] * 3
+    assert flight.stats["coalesced"] == 2
+    assert flight.snapshot()["inFlight"] == 0
+
+
+def test_a_cancelled_caller_does_not_cancel_the_shared_call():
+    flight = SingleFlight()
+
+    async def main():
+        call = Counter()
+        first = asyncio.create_task(flight.run("k", call))
+        second = asyncio.create_task(flight.run("k", call))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        call.gate.set()
+        return first, await second
+
+    first, result = asyncio.run(main())
+    assert first.cancelled()
+    assert result == "answer"
+
+
+def test_completed_request_is_replayed_by_request_id():
+    flight = SingleFlight(window=60)
+
+    async def main():
+        call = Counter()
+        call.gate.set()
+        first = await flight.run("k", call, request_key="r1")
+        again = await flight.run("k", call, request_key="r1")
+        return call, first, again
+
+    call, first, again = asyncio.run(main())
+    assert call.calls == 1
+    assert first == again == "answer"
+    assert flight.stats["replayed"] == 1
+
+
+def test_reusing_a_request_id_for_another_request_is_rejected():
+    flight = SingleFlight()
+
+    async def main():
+        call = Counter()
+        call.gate.set()
+        await flight.run("k", call, request_key="r1")
+        with pytest.raises(IdempotencyConflict):
+            await flight.run("other", call, request_key="r1")
+
+    asyncio.run(main())
+    assert flight.stats["conflicts"] == 1
+
+
+def test_failures_are_not_replayed():
+    flight = SingleFlight()
+
+    async def main():
+        failing = Counter(fail=True)
+        failing.gate.set()
+        with pytest.raises(RuntimeError):
+            await flight.run("k", failing, request_key="r1")
+        retry = Counter()
+        retry.gate.set()
+        return retry, await flight.run("k", retry, request_key="r1")
+
+    retry, result = asyncio.run(main())
+    assert retry.calls == 1
+    assert result == "answer"
+
+
+def test_replay_expires_after_the_window():
+    flight = SingleFlight(window=0)
+
+    async def main():
+        call = Counter()
+        call.gate.set()
+        await flight.run("k", call, request_key="r1")
+        await flight.run("k", call, request_key="r1")
+        return call
+
+    assert asyncio.run(main()).calls == 2
+
+
+def test_landing_flight_only_settles_its_own_request_ids():
+    # With room for one remembered ID, "r1" is evicted while its first flight
+    # is still running and then taken over by a second flight
+    flight = SingleFlight(max_entries=1)
+
+    async def main():
+        failing = Counter(fail=True)
+        first = asyncio.create_task(flight.run("a", failing, request_key="r1"))
+        await asyncio.sleep(0)
+        other = Counter()
+        other.gate.set()
+        await flight.run("x", other, request_key="r2")
+        succeeding = Counter("second")
+        second = asyncio.create_task(flight.run("b", succeeding, request_key="r1"))
+        await asyncio.sleep(0)
+
+        succeeding.gate.set()
+        assert await second == "second"
+        failing.gate.set()
+        with pytest.raises(RuntimeError):
+            await first
+
+        # The first flight's failure must not drop the second flight's entry
+        replay = Counter("not replayed")
+        replay.gate.set()
+        return replay, await flight.run("b", replay, request_key="r1")
+
+    replay, result = asyncio.run(main())
+    assert result == "second"
+    assert replay.calls == 0
+
+
+def test_streams_are_produced_once_and_replayed_to_followers():
+    flight = SingleFlight()
+    produced = []
+
+    async def source():
+        for event in ["a", "b", "c"]:
+            produced.append(event)
+            await asyncio.sleep(0)
+            yield event
+
+    async def collect(stream):
+        return [event async for event in stream]
+
+    async def main():
+        leader = flight.stream("k", source, request_key="r1")
+        follower = flight.stream("k", source)
+        streamed = await asyncio.gather(collect(leader), collect(follower))
+        replayed = await collect(flight.stream("k", source, request_key="r1"))
+        return streamed, replayed
+
+    streamed, replayed = asyncio.run(main())
+    assert streamed == [["a", "b", "c"]] * 2
+    assert replayed == ["a", "b", "c"]
+    assert produced == ["a", "b", "c"]
+
+
+def test_unsuccessful_streams_are_not_replayed():
+    flight = SingleFlight()
+    runs = []
+
+    async def source():
+        runs.append(1)
+        yield "error"
+
+    async def collect(stream):
+        return [event async for event in stream]
+
+    async def main():
+        await collect(flight.stream("k", source, request_key="r1", succeeded=lambda events: "error" not in events))
+        await asyncio.sleep(0)
+        await collect(flight.stream("k", source, request_key="r1", succeeded=lambda events: "error" not in events))
+
+    asyncio.run(main())
+    assert len(runs) == 2
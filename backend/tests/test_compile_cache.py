@@ -0,0 +1,132 @@
+"""CompileCache: which builds are cached, and how Java sources are named and launched"""
+import asyncio
+import os
+import shutil
+
+import pytest
+
+from compile_cache import CompileCache, cacheable, java_main_class, java_source_name
+from sandbox import ResourceLimits
+from workspace import WorkspaceManager
+
+
+class ScriptedCompileCache(CompileCache):
+    """Returns queued build results instead of running a compiler"""
+
+    def __init__(self, root, results):
+        super().__init__(root=str(root), workspaces=WorkspaceManager(str(root / "jobs")))
+        self.results = list(results)
+        self.builds = 0
+
+    async def compiler_version(self, language):
+        return "test"
+
+    async def build(self, language, source, dest, timeout=10):
+        self.builds += 1
+        os.makedirs(dest)
+        return self.results.pop(0)
+
+
+def compile_twice(cache):
+    async def main():
+        return [await cache.get_or_compile("c", "int main() {}") for _ in range(2)]
+    return asyncio.run(main())
+
+
+def test_compile_errors_are_cached(tmp_path):
+    cache = ScriptedCompileCache(tmp_path, [{"ok": False, "stderr": "error: expected ';'", "returncode": 1}])
+
+    first, second = compile_twice(cache)
+
+    assert cache.builds == 1
+    assert (first.cached, second.cached) == (False, True)
+    assert second.stderr == "error: expected ';'"
+
+
+@pytest.mark.parametrize("meta", [
+    {"ok": False, "stderr": "\nCompiler stopped: resource limit exceeded", "returncode": -9},
+    {"ok": False, "stderr": "g++: fatal error: Killed signal terminated program cc1plus", "returncode": 1},
+    {"ok": False, "stderr": "cc1plus: out of memory allocating 65536 bytes", "returncode": 1},
+    {"ok": False, "stderr": "g++: internal compiler error: Segmentation fault signal terminated program cc1plus", "returncode": 4},
+    {"ok": False, "stderr": "virtual memory exhausted: Cannot allocate memory", "returncode": 1},
+    {"ok": False, "stderr": "java.lang.OutOfMemoryError: Java heap space", "returncode": 1},
+])
+def test_killed_compilers_are_not_cached(tmp_path, meta):
+    cache = ScriptedCompileCache(tmp_path, [meta, dict(meta)])
+
+    first, second = compile_twice(cache)
+
+    assert cache.builds == 2
+    assert not first.ok and not second.ok
+    assert not second.cached
+    assert cache.stats["compilerKilled"] == 2
+    assert not cacheable(meta)
+
+
+def test_successful_builds_are_cached(tmp_path):
+    cache = ScriptedCompileCache(tmp_path, [{"ok": True, "stderr": "", "returncode": 0}])
+
+    first, second = compile_twice(cache)
+
+    assert cache.builds == 1
+    assert second.ok and second.cached
+
+
+@pytest.mark.skipif(shutil.which("gcc") is None, reason="needs gcc")
+def test_real_compile_error_is_cached(tmp_path):
+    cache = CompileCache(root=str(tmp_path / "cache"), workspaces=WorkspaceManager(str(tmp_path / "jobs")))
+
+    async def main():
+        return [await cache.get_or_compile("c", "int main() { return x; }") for _ in range(2)]
+
+    first, second = asyncio.run(main())
+    assert not first.ok and "x" in first.stderr
+    assert second.cached and cache.stats["misses"] == 1
+
+
+@pytest.mark.skipif(shutil.which("g++") is None, reason="needs g++")
+def test_real_compiler_out_of_memory_is_not_cached(tmp_path):
+    starved = ResourceLimits(cpu_seconds=30, memory_mb=20, address_space_mb=20, processes=256, file_size_mb=64, output_kb=256)
+    cache = CompileCache(root=str(tmp_path / "cache"), limits=starved, workspaces=WorkspaceManager(str(tmp_path / "jobs")))
+
+    async def main():
+        return [await cache.get_or_compile("cpp", "#include <iostream>\nint main() { std::cout << 1; }") for _ in range(2)]
+
+    first, second = asyncio.run(main())
+    assert not first.ok and not second.cached
+    assert cache.stats["compilerKilled"] == 2
+
+
+HELPER_FIRST = """
+class Helper {
+    public static void main(String[] args) { System.out.println("helper"); }
+}
+public class Solution {
+    public static void main(String[] args) { System.out.println("solution"); }
+}
+"""
+
+NON_PUBLIC_MAIN = """
+public class Solution {
+    static int twice(int x) { return 2 * x; }
+}
+class Runner {
+    public static void main(String[] args) { System.out.println(Solution.twice(2)); }
+}
+"""
+
+
+def test_java_public_class_with_main_wins():
+    assert java_main_class(HELPER_FIRST) == "Solution"
+    assert java_source_name(HELPER_FIRST) == "Solution.java"
+
+
+def test_java_file_is_named_after_the_public_class_even_when_main_is_elsewhere():
+    assert java_main_class(NON_PUBLIC_MAIN) == "Runner"
+    assert java_source_name(NON_PUBLIC_MAIN) == "Solution.java"
+
+
+def test_java_defaults():
+    assert java_main_class("class A { public static void main(String[] a) {} }") == "A"
+    assert java_main_class("") == "Main"
+    assert java_source_name("class A {}") == "Main.java"
@@ -0,0 +1,62 @@
+"""profile_program under the execution scheduler: one slot per measured run"""
+import asyncio
+
+import complexity
+from exec_scheduler import ExecutionScheduler
+from executor import ExecutionOutcome, PreparedProgram
+
+
+class LinearExecutor:
+    """Reports CPU time proportional to the input length"""
+
+    timeout = 10.0
+
+    def __init__(self):
+        self.runs = 0
+
+    async def run(self, program, stdin):
+        self.runs += 1
+        await asyncio.sleep(0.01)
+        n = len(stdin)
+        return ExecutionOutcome("", None, True, wall_time=0.01, cpu_time=n * 1e-5, peak_memory_kb=n, memory_floor_kb=0)
+
+
+def test_profile_fits_the_measured_growth():
+    executor = LinearExecutor()
+    program = PreparedProgram("python", "")
+
+    profile = asyncio.run(complexity.profile_program(executor, program, lambda n: "x" * n, [1000, 2000, 4000, 8000]))
+
+    assert executor.runs == 4
+    assert profile.time_complexity == "O(n)"
+
+
+def test_other_users_run_between_measurements():
+    scheduler = ExecutionScheduler(max_concurrency=1)
+    executor = LinearExecutor()
+    program = PreparedProgram("python", "")
+    order = []
+
+    def run_once(program, stdin):
+        async def job():
+            order.append("profile")
+            return await executor.run(program, stdin)
+        return scheduler.run("profiler", job)
+
+    async def other_user():
+        await asyncio.sleep(0.005)
+
+        async def job():
+            order.append("other")
+        await scheduler.run("other", job)
+
+    async def main():
+        await asyncio.gather(
+            complexity.profile_program(executor, program, lambda n: "x" * n, [1000, 2000, 4000, 8000], run=run_once),
+            other_user(),
+        )
+
+    asyncio.run(main())
+    assert order.index("other") < len(order) - 1
+    assert order.count("profile") == 4
+    assert scheduler.stats["started"] == 5
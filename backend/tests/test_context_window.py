@@ -0,0 +1,147 @@
+"""HistoryAssembler: token-budgeted window and rolling summary indices"""
+import asyncio
+
+from context_window import HistoryAssembler, estimate_tokens, truncate_to_tokens
+
+
+def messages(count, start=0):
+    # 40 one-token words: 41 tokens, 45 with the per-message overhead
+    return [{"role": "user" if i % 2 == 0 else "assistant", "text": f"m{i} " + "word " * 39} for i in range(start, start + count)]
+
+
+class RecordingSummarizer:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    async def __call__(self, previous, pending):
+        self.calls.append((previous, [m["text"].split()[0] for m in pending]))
+        if self.fail:
+            raise RuntimeError("summarizer down")
+        return f"{previous} summary of {len(pending)}".strip()
+
+
+def labels(window):
+    return [m["text"].split()[0] for m in window]
+
+
+async def settle(assembler):
+    while assembler._updating:
+        await asyncio.gather(*assembler._updating.values())
+
+
+def test_estimate_and_truncate():
+    assert estimate_tokens("word " * 39 + "m1") == 41
+    long = "x" * 10000
+    truncated = truncate_to_tokens(long, 100)
+    assert "[truncated]" in truncated
+    assert len(truncated) < 500
+    assert truncate_to_tokens("short", 100) == "short"
+
+
+def test_short_history_is_sent_whole():
+    assembler = HistoryAssembler(budget_tokens=1000)
+    summary, window = assembler.assemble("s", messages(4))
+    assert summary is None
+    assert labels(window) == ["m0", "m1", "m2", "m3"]
+
+
+def test_without_a_summarizer_the_oldest_turns_are_dropped():
+    assembler = HistoryAssembler(budget_tokens=100)
+    summary, window = assembler.assemble("s", messages(5))
+    assert summary is None
+    assert labels(window) == ["m3", "m4"]
+    assert assembler.stats["droppedMessages"] == 3
+
+
+def test_evicted_turns_are_summarized_once_by_index():
+    summarizer = RecordingSummarizer()
+    assembler = HistoryAssembler(summarizer, budget_tokens=100, overflow_tokens=1000)
+
+    async def main():
+        history = messages(5)
+        # Nothing summarized yet: everything stays, past the budget, while the summary catches up
+        first = assembler.assemble("s", history)
+        await settle(assembler)
+        covered = assembler._summaries["s"].covered
+        second = assembler.assemble("s", history)
+        history += messages(2, start=5)
+        third = assembler.assemble("s", history)
+        await settle(assembler)
+        return first, covered, second, third
+
+    first, covered, second, third = asyncio.run(main())
+    # The budget holds two turns; the three before them are summarized
+    assert first == (None, messages(5))
+    assert summarizer.calls[0] == ("", ["m0", "m1", "m2"])
+    assert covered == 3
+
+    summary, window = second
+    assert summary == "summary of 3"
+    assert labels(window) == ["m3", "m4"]
+
+    # Only turns after the covered index go to the summarizer next time
+    summary, window = third
+    assert labels(window) == ["m3", "m4", "m5", "m6"]
+    assert summarizer.calls[1] == ("summary of 3", ["m3", "m4"])
+    assert assembler._summaries["s"].covered == 5
+
+
+def test_offset_counts_messages_trimmed_off_the_front():
+    summarizer = RecordingSummarizer()
+    assembler = HistoryAssembler(summarizer, budget_tokens=100, overflow_tokens=1000)
+
+    async def main():
+        assembler.assemble("s", messages(5))
+        await settle(assembler)
+        # The client trimmed the first two messages and says so; m2 is still summarized
+        return assembler.assemble("s", messages(4, start=2), offset=2)
+
+    summary, window = asyncio.run(main())
+    assert summary == "summary of 3"
+    assert labels(window) == ["m3", "m4", "m5"]
+
+
+def test_summary_for_a_longer_history_is_discarded():
+    summarizer = RecordingSummarizer()
+    assembler = HistoryAssembler(summarizer, budget_tokens=100, overflow_tokens=1000)
+
+    async def main():
+        assembler.assemble("s", messages(5))
+        await settle(assembler)
+        # A shorter history (e.g. the conversation was reset) can't use a summary covering 3 messages
+        return assembler.assemble("s", messages(2))
+
+    summary, window = asyncio.run(main())
+    assert summary is None
+    assert labels(window) == ["m0", "m1"]
+
+
+def test_failed_summary_keeps_turns_in_the_window():
+    summarizer = RecordingSummarizer(fail=True)
+    assembler = HistoryAssembler(summarizer, budget_tokens=100, overflow_tokens=1000)
+
+    async def main():
+        assembler.assemble("s", messages(5))
+        await settle(assembler)
+        return assembler.assemble("s", messages(5))
+
+    summary, window = asyncio.run(main())
+    assert summary is None
+    assert labels(window) == ["m0", "m1", "m2", "m3", "m4"]
+    assert assembler.stats["summaryFailures"] >= 1
+
+
+def test_overflow_is_bounded():
+    summarizer = RecordingSummarizer(fail=True)
+    assembler = HistoryAssembler(summarizer, budget_tokens=100, overflow_tokens=100)
+
+    async def main():
+        result = assembler.assemble("s", messages(8))
+        await settle(assembler)
+        return result
+
+    summary, window = asyncio.run(main())
+    assert labels(window) == ["m4", "m5", "m6", "m7"]
+    # The dropped turns were handed to the summarizer along with the rest of the overflow
+    assert summarizer.calls[0][1] == ["m0", "m1", "m2", "m3", "m4", "m5"]
@@ -0,0 +1,189 @@
+"""Time-Travel hint timers: unlock rules, the timing wheel, and resuming saved starts"""
+import asyncio
+
+import pytest
+
+import hint_timers
+from hint_timers import HintTimers, TimerWheel, unlocked_hints
+from sessions import SessionOwnershipError
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(hint_timers.time, "time", clock)
+    return clock
+
+
+def advance(wheel, seconds):
+    for _ in range(round(seconds / wheel.tick)):
+        wheel._advance()
+
+
+@pytest.mark.parametrize("elapsed, attempts, expected", [
+    (0, 0, []),
+    (30, 0, [1]),
+    (0, 1, [1]),
+    (60, 0, [1]),
+    (60, 1, [1, 2]),
+    (90, 1, [1, 2]),
+    (90, 2, [1, 2, 3]),
+    (120, 0, [1, 4]),
+    (0, 3, [1, 4]),
+])
+def test_unlock_rules(elapsed, attempts, expected):
+    assert unlocked_hints(elapsed, attempts) == expected
+
+
+def test_wheel_fires_on_the_first_tick_past_the_delay():
+    wheel = TimerWheel(tick=1, slots=8)
+    fired = []
+    wheel.schedule(2.5, lambda: fired.append("a"))
+
+    advance(wheel, 2)
+    assert fired == []
+    advance(wheel, 1)
+    assert fired == ["a"]
+    assert len(wheel) == 0
+
+
+def test_wheel_counts_full_turns_for_long_delays():
+    wheel = TimerWheel(tick=1, slots=4)
+    fired = []
+    wheel.schedule(10, lambda: fired.append("late"))
+
+    advance(wheel, 9)
+    assert fired == []
+    advance(wheel, 1)
+    assert fired == ["late"]
+
+
+def test_cancelled_timers_never_fire():
+    wheel = TimerWheel(tick=1, slots=8)
+    fired = []
+    handle = wheel.schedule(1, lambda: fired.append("x"))
+    wheel.cancel(handle)
+    wheel.cancel(handle)
+
+    advance(wheel, 2)
+    assert fired == []
+    assert len(wheel) == 0
+
+
+def test_a_failing_callback_does_not_stop_the_others():
+    wheel = TimerWheel(tick=1, slots=8)
+    fired = []
+    wheel.schedule(1, lambda: 1 / 0)
+    wheel.schedule(1, lambda: fired.append("ok"))
+
+    advance(wheel, 1)
+    assert fired == ["ok"]
+
+
+def test_wheel_task_advances_in_real_time():
+    wheel = TimerWheel(tick=0.01, slots=8)
+
+    async def main():
+        done = asyncio.Event()
+        wheel.start()
+        wheel.schedule(0.02, done.set)
+        await asyncio.wait_for(done.wait(), timeout=1)
+        await wheel.stop()
+
+    asyncio.run(main())
+
+
+def test_unlocks_are_pushed_when_the_timer_fires(clock):
+    timers = HintTimers(wheel=TimerWheel(tick=1, slots=8))
+    timers.begin("s", "u")
+    queue = timers.subscribe("s")
+    assert timers.state("s")["nextUnlockIn"] == 30
+
+    clock.now += 30
+    advance(timers.wheel, 30)
+
+    event = queue.get_nowait()
+    assert event["newlyUnlocked"] == [1]
+    assert timers.state("s")["unlockedHints"] == [1]
+    # Nothing more unlocks on time alone until the solution at 120s
+    assert timers.state("s")["nextUnlockIn"] == 90
+
+
+def test_attempts_unlock_immediately(clock):
+    timers = HintTimers(wheel=TimerWheel(tick=1, slots=8))
+    timers.begin("s", "u")
+    queue = timers.subscribe("s")
+
+    timers.record_attempts("s", 3)
+
+    assert queue.get_nowait()["newlyUnlocked"] == [1, 4]
+
+
+def test_client_start_is_clamped_to_the_backdate_limit(clock):
+    timers = HintTimers(max_backdate=5)
+    session = timers.begin("s", "u", client_start_ms=int((clock.now - 600) * 1000))
+    assert session.started_at == clock.now - 5
+
+
+def test_repeated_start_keeps_the_timer_and_a_new_one_restarts_it(clock):
+    timers = HintTimers()
+    first = timers.begin("s", "u", client_start_ms=int(clock.now * 1000))
+    timers.record_attempts("s", 1)
+    clock.now += 40
+
+    issued = timers.state("s")["questionStartTime"]
+    assert timers.begin("s", "u", client_start_ms=issued) is first
+    assert timers.begin("s", "u") is first
+    assert first.attempts == 1
+
+    restarted = timers.begin("s", "u", client_start_ms=int(clock.now * 1000))
+    assert restarted.attempts == 0
+    assert timers.elapsed(restarted) == 0
+
+
+def test_saved_start_resumes_after_a_restart(clock):
+    before = HintTimers()
+    before.begin("s", "u")
+    saved_start_ms = before.state("s")["questionStartTime"]
+    clock.now += 75
+
+    # A fresh process (or another worker) only has the start saved with the session
+    after = HintTimers()
+    resumed = after.begin("s", "u", client_start_ms=saved_start_ms, saved_start_ms=saved_start_ms)
+
+    assert after.elapsed(resumed) == 75
+    assert after.state("s")["unlockedHints"] == [1]
+    assert after.stats["resumed"] == 1
+
+
+def test_unsaved_old_start_is_not_trusted(clock):
+    timers = HintTimers(max_backdate=5)
+    old_ms = int((clock.now - 600) * 1000)
+    session = timers.begin("s", "u", client_start_ms=old_ms, saved_start_ms=old_ms + 1)
+    assert timers.elapsed(session) == 5
+
+
+def test_timers_belong_to_their_user(clock):
+    timers = HintTimers()
+    timers.begin("s", "u")
+    with pytest.raises(SessionOwnershipError):
+        timers.begin("s", "intruder")
+    assert timers.owner("s") == "u"
+
+
+def test_evicted_sessions_release_their_timers(clock):
+    timers = HintTimers(max_sessions=2, wheel=TimerWheel(tick=1, slots=8))
+    for session_id in ("a", "b", "c"):
+        timers.begin(session_id, "u")
+
+    assert timers.state("a") == {"sessionId": "a", "active": False}
+    assert len(timers.wheel) == 2
+    assert timers.stats["evictions"] == 1
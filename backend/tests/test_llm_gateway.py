@@ -0,0 +1,190 @@
+"""LLMGateway failover, circuit breaking, rate-limit retries and hedging, with stub backends"""
+import asyncio
+import time
+
+import groq
+import httpx
+import pytest
+
+from llm import Completion, LLMTimeoutError
+from llm_gateway import Backend, CircuitBreaker, LLMGateway, LLMUnavailableError
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def api_error(status_code, retry_after=None):
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    response = httpx.Response(status_code, headers=headers, request=httpx.Request("POST", "http://llm.test"))
+    error_class = {400: groq.BadRequestError, 429: groq.RateLimitError}.get(status_code, groq.InternalServerError)
+    return error_class("stub error", response=response, body=None)
+
+
+class StubClient:
+    """Answers with `reply` after `latency`, raising the queued `failures` first"""
+
+    def __init__(self, reply="ok", latency=0.0, failures=()):
+        self.reply = reply
+        self.latency = latency
+        self.failures = list(failures)
+        self.calls = 0
+
+    async def _next(self):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.failures:
+            raise self.failures.pop(0)
+
+    async def complete(self, messages, model, **kwargs):
+        await self._next()
+        return Completion(self.reply, prompt_tokens=1, completion_tokens=1)
+
+    async def stream(self, messages, model, **kwargs):
+        await self._next()
+        for word in self.reply.split():
+            yield word
+
+
+def gateway(*clients, threshold=2, reset_timeout=30.0, **options):
+    backends = [
+        Backend(f"b{i}", client, CircuitBreaker(threshold, reset_timeout))
+        for i, client in enumerate(clients)
+    ]
+    options.setdefault("hedge_initial_delay", 5.0)
+    return LLMGateway(backends, **options)
+
+
+def complete(gw, timeout=5.0):
+    return asyncio.run(gw.complete(MESSAGES, model="m", timeout=timeout))
+
+
+def test_fails_over_to_the_next_backend_on_a_server_error():
+    primary, secondary = StubClient("primary", failures=[api_error(503)]), StubClient("secondary")
+    gw = gateway(primary, secondary)
+
+    assert complete(gw).text == "secondary"
+    assert gw.counters["failovers"] == 1
+    assert gw.backends[0].stats["errors"] == 1
+
+
+def test_bad_request_is_not_failed_over():
+    primary, secondary = StubClient(failures=[api_error(400)]), StubClient()
+    gw = gateway(primary, secondary)
+
+    with pytest.raises(groq.BadRequestError):
+        complete(gw)
+    assert secondary.calls == 0
+    assert gw.backends[0].breaker.state == "closed"
+
+
+def test_breaker_opens_and_traffic_skips_the_backend():
+    primary, secondary = StubClient("primary", failures=[api_error(500)] * 2), StubClient("secondary")
+    gw = gateway(primary, secondary, threshold=2)
+
+    for _ in range(2):
+        assert complete(gw).text == "secondary"
+    assert gw.backends[0].breaker.state == "open"
+
+    assert complete(gw).text == "secondary"
+    assert primary.calls == 2
+
+
+def test_every_breaker_open_raises_unavailable_with_retry_after():
+    client = StubClient(failures=[api_error(500)] * 2)
+    gw = gateway(client, threshold=1, reset_timeout=30.0, retry_backoff=0.01)
+
+    with pytest.raises(LLMUnavailableError):
+        complete(gw)
+    with pytest.raises(LLMUnavailableError) as raised:
+        complete(gw)
+    assert 1 <= raised.value.retry_after <= 30
+    assert client.calls == 1
+
+
+def test_half_open_probe_closes_the_breaker_on_success():
+    client = StubClient(failures=[api_error(500)])
+    gw = gateway(client, threshold=1, reset_timeout=0.05, retry_backoff=1.0)
+
+    with pytest.raises(LLMUnavailableError):
+        complete(gw, timeout=0.5)
+    assert gw.backends[0].breaker.state == "open"
+
+    asyncio.run(asyncio.sleep(0.06))
+    assert complete(gw).text == "ok"
+    assert gw.backends[0].breaker.state == "closed"
+
+
+def test_rate_limits_dont_trip_the_breaker():
+    client = StubClient(failures=[api_error(429)] * 4)
+    gw = gateway(client, threshold=2, max_attempts=3, retry_backoff=0.01)
+
+    # Three attempts, all rate limited: the call fails but the backend stays up
+    with pytest.raises(LLMUnavailableError):
+        complete(gw)
+    assert gw.backends[0].breaker.state == "closed"
+
+    assert complete(gw).text == "ok"
+    assert gw.backends[0].breaker.state == "closed"
+    assert client.calls == 5
+
+
+def test_single_backend_retries_after_retry_after():
+    client = StubClient(failures=[api_error(429, retry_after=0.1)])
+    gw = gateway(client)
+
+    started = time.monotonic()
+    assert complete(gw).text == "ok"
+    assert time.monotonic() - started >= 0.1
+    assert client.calls == 2
+    assert gw.counters["retries"] == 1
+
+
+def test_retry_after_past_the_deadline_fails_fast():
+    client = StubClient(failures=[api_error(429, retry_after=10)])
+    gw = gateway(client)
+
+    with pytest.raises(LLMUnavailableError) as raised:
+        complete(gw, timeout=1.0)
+    assert raised.value.retry_after == 10
+    assert client.calls == 1
+
+
+def test_slow_backend_is_hedged_and_the_loser_cancelled():
+    slow, fast = StubClient("slow", latency=2.0), StubClient("fast")
+    gw = gateway(slow, fast, hedge_initial_delay=0.05)
+
+    assert complete(gw).text == "fast"
+    assert gw.counters["hedges"] == 1
+    assert gw.counters["hedgeWins"] == 1
+    assert gw.backends[0].stats["cancelled"] == 1
+    assert gw.backends[0].breaker.state == "closed"
+
+
+def test_hedges_are_limited_by_the_budget():
+    slow, fast = StubClient("slow", latency=0.1), StubClient("fast", latency=0.1)
+    gw = gateway(slow, fast, hedge_initial_delay=0.01, hedge_budget=0.0)
+    gw._hedge_tokens = 1.0
+
+    async def run():
+        return [await gw.complete(MESSAGES, model="m", timeout=5) for _ in range(3)]
+
+    asyncio.run(run())
+    assert gw.counters["hedges"] == 1
+
+
+def test_deadline_raises_timeout():
+    gw = gateway(StubClient(latency=1.0))
+
+    with pytest.raises(LLMTimeoutError):
+        complete(gw, timeout=0.1)
+
+
+def test_stream_fails_over_before_the_first_token():
+    primary, secondary = StubClient(failures=[api_error(502)]), StubClient("hello from secondary")
+    gw = gateway(primary, secondary)
+
+    async def run():
+        return [delta async for delta in gw.stream(MESSAGES, model="m", timeout=5)]
+
+    assert asyncio.run(run()) == ["hello", "from", "secondary"]
+    assert gw.counters["failovers"] == 1
+    assert gw.backends[1].limiter.in_flight == 0
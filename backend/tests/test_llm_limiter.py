@@ -0,0 +1,140 @@
+"""AdaptiveLimiter: AIMD limit, priority queue, deadlines and slot hand-off"""
+import asyncio
+
+import pytest
+
+from llm_limiter import AdaptiveLimiter, LimiterQueueFull
+
+
+def test_calls_under_the_limit_take_a_slot_immediately():
+    limiter = AdaptiveLimiter(initial=2)
+
+    async def main():
+        await limiter.acquire(0, timeout=0)
+        await limiter.acquire(0, timeout=0)
+
+    asyncio.run(main())
+    assert limiter.in_flight == 2
+    assert limiter.stats["queued"] == 0
+
+
+def test_waiters_are_served_by_priority_then_arrival():
+    limiter = AdaptiveLimiter(initial=1)
+    order = []
+
+    async def waiter(name, priority):
+        await limiter.acquire(priority, timeout=5)
+        order.append(name)
+        await asyncio.sleep(0)
+        limiter.release("ignore")
+
+    async def main():
+        await limiter.acquire(0, timeout=0)
+        tasks = [asyncio.create_task(waiter(name, priority)) for name, priority in [("low", 5), ("a", 1), ("b", 1)]]
+        await asyncio.sleep(0)
+        assert limiter.queue_depth == 3
+        limiter.release("ignore")
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["a", "b", "low"]
+    assert limiter.in_flight == 0
+
+
+def test_deadline_passes_while_queued():
+    limiter = AdaptiveLimiter(initial=1)
+
+    async def main():
+        await limiter.acquire(0, timeout=0)
+        with pytest.raises(asyncio.TimeoutError):
+            await limiter.acquire(0, timeout=0.01)
+
+    asyncio.run(main())
+    assert limiter.stats["expired"] == 1
+    assert limiter.queue_depth == 0
+    assert limiter.in_flight == 1
+
+
+def test_full_queue_rejects_immediately():
+    limiter = AdaptiveLimiter(initial=1, max_queue=1)
+
+    async def main():
+        await limiter.acquire(0, timeout=0)
+        queued = asyncio.create_task(limiter.acquire(0, timeout=5))
+        await asyncio.sleep(0)
+        with pytest.raises(LimiterQueueFull):
+            await limiter.acquire(0, timeout=5)
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+
+    asyncio.run(main())
+    assert limiter.stats["rejected"] == 1
+    assert limiter.queue_depth == 0
+
+
+def test_slot_granted_as_the_wait_ends_is_handed_on():
+    limiter = AdaptiveLimiter(initial=1)
+
+    async def main():
+        await limiter.acquire(0, timeout=0)
+        first = asyncio.create_task(limiter.acquire(0, timeout=5))
+        second = asyncio.create_task(limiter.acquire(0, timeout=5))
+        await asyncio.sleep(0)
+        # `first` is cancelled and granted the slot in the same loop iteration
+        first.cancel()
+        limiter.release("ignore")
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.wait_for(second, timeout=1)
+        return first
+
+    first = asyncio.run(main())
+    assert first.cancelled()
+    assert limiter.in_flight == 1
+    assert limiter.queue_depth == 0
+
+
+def test_overload_cuts_the_limit_once_per_cooldown():
+    limiter = AdaptiveLimiter(initial=8, cooldown=60)
+    limiter.in_flight = 2
+
+    limiter.release("overload")
+    limiter.release("overload")
+
+    assert limiter.limit == 4
+    assert limiter.stats["throttled"] == 1
+
+
+def test_overload_never_goes_below_the_minimum():
+    limiter = AdaptiveLimiter(initial=1.5, min_limit=1, cooldown=0)
+    for _ in range(3):
+        limiter.in_flight = 1
+        limiter.release("overload")
+    assert limiter.limit == 1
+
+
+def test_healthy_utilized_calls_grow_the_limit():
+    limiter = AdaptiveLimiter(initial=2, max_limit=3)
+    for _ in range(20):
+        limiter.in_flight = 2
+        limiter.release("ok", latency=0.1)
+    assert limiter.limit == 3
+
+
+def test_idle_calls_do_not_grow_the_limit():
+    limiter = AdaptiveLimiter(initial=8)
+    limiter.in_flight = 1
+    limiter.release("ok", latency=0.1)
+    assert limiter.limit == 8
+
+
+def test_rising_latency_backs_off():
+    limiter = AdaptiveLimiter(initial=8, cooldown=0)
+    for _ in range(20):
+        limiter.in_flight = 1
+        limiter.release("ok", latency=0.1, key="m")
+    for _ in range(10):
+        limiter.in_flight = 1
+        limiter.release("ok", latency=2.0, key="m")
+
+    assert limiter.stats["latencyBackoffs"] >= 1
+    assert limiter.limit < 8
@@ -0,0 +1,86 @@
+"""Local memory-check pre-scoring: only clear-cut cases are scored without the LLM"""
+import pytest
+
+from memory_prescore import MemoryPrescorer, looks_like_code, normalize_tokens, profile_solution, renamed_only
+
+TWO_SUM = """def two_sum(nums, target):
+    seen = {}
+    for i, n in enumerate(nums):
+        if target - n in seen:
+            return [seen[target - n], i]
+        seen[n] = i
+    return []
+"""
+
+HASH_MAP_EXPLANATION = (
+    "Use a hash map to store each number and its index as you iterate over the list. For each "
+    "number, check whether its complement is already in the map; if it is, return both indices."
+)
+
+
+def score(original, reconstruction):
+    prescorer = MemoryPrescorer()
+    return prescorer.score(prescorer.original(original), profile_solution(reconstruction))
+
+
+def test_unrelated_prose_is_left_to_the_llm():
+    unrelated = (
+        "My cat sat on the sofa today and chased every mouse in the house, then for a while "
+        "it slept in the sun by the window and ignored all of us."
+    )
+    assert score(HASH_MAP_EXPLANATION, unrelated) is None
+
+
+def test_identical_prose_is_still_left_to_the_llm():
+    assert score(HASH_MAP_EXPLANATION, HASH_MAP_EXPLANATION) is None
+
+
+def test_swapped_operands_and_operator_are_left_to_the_llm():
+    buggy = TWO_SUM.replace("target - n in", "target + n in").replace("seen[n] = i", "seen[i] = n")
+    assert score(TWO_SUM, buggy) is None
+
+
+def test_swapped_operands_alone_are_left_to_the_llm():
+    assert score(TWO_SUM, TWO_SUM.replace("seen[n] = i", "seen[i] = n")) is None
+
+
+def test_reformatted_copy_is_scored_locally():
+    reformatted = TWO_SUM.replace("    ", "  ").replace("target - n", "target-n") + "# the end\n"
+    result = score(TWO_SUM, reformatted)
+    assert result is not None
+    assert result["logicScore"] == 100
+    assert result["missedConcepts"] == []
+
+
+def test_renaming_that_merges_two_names_is_left_to_the_llm():
+    assert score(TWO_SUM, TWO_SUM.replace("seen", "nums")) is None
+
+
+def test_empty_reconstruction_scores_zero():
+    result = score(TWO_SUM, "")
+    assert result["logicScore"] == 0
+    assert "hash map lookup" in result["missedConcepts"]
+
+
+@pytest.mark.parametrize("text, is_code", [
+    (TWO_SUM, True),
+    ("for (int i = 0; i < n; i++) { total += a[i]; }", True),
+    (HASH_MAP_EXPLANATION, False),
+    ("First sort the array (ascending), then walk it with two pointers - one from each end.", False),
+])
+def test_looks_like_code(text, is_code):
+    assert looks_like_code(normalize_tokens(text)) is is_code
+
+
+def test_renamed_only_requires_a_one_to_one_mapping():
+    assert renamed_only(["x", "=", "y"], ["a", "=", "b"])
+    assert not renamed_only(["x", "=", "y"], ["a", "=", "a"])
+    assert not renamed_only(["s", "[", "n", "]", "=", "i", "n"], ["s", "[", "i", "]", "=", "n", "n"])
+    assert not renamed_only(["x", "-", "y"], ["x", "+", "y"])
+
+
+def test_originals_are_cached_by_normalized_text():
+    prescorer = MemoryPrescorer()
+    first = prescorer.original(TWO_SUM)
+    assert prescorer.original(TWO_SUM.replace("    ", "\t") + "\n# comment\n") is first
+    assert prescorer.stats["originalHits"] == 1
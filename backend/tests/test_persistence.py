@@ -0,0 +1,166 @@
+"""FirestoreWriteQueue against an in-process fake Firestore"""
+import asyncio
+
+from persistence import FirestoreWriteQueue, WriteOp
+from tests.fake_firestore import FakeFirestore, Increment
+
+
+class RecordingFirestore(FakeFirestore):
+    """Remembers how many writes each committed batch held"""
+
+    def __init__(self):
+        super().__init__(latency=0)
+        self.batch_sizes = []
+
+    def batch(self):
+        batch = super().batch()
+        commit = batch.commit
+
+        def recording_commit():
+            commit()
+            self.batch_sizes.append(len(batch.writes))
+        batch.commit = recording_commit
+        return batch
+
+
+class FlakyFirestore(FakeFirestore):
+    """Fails the first `failures` commits, then behaves"""
+
+    def __init__(self, failures):
+        super().__init__(latency=0)
+        self.failures = failures
+
+    def batch(self):
+        batch = super().batch()
+        commit = batch.commit
+
+        def flaky_commit():
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("UNAVAILABLE: injected failure")
+            commit()
+        batch.commit = flaky_commit
+        return batch
+
+
+def test_merge_sets_to_one_document_coalesce_and_sum_increments():
+    db = FakeFirestore(latency=0)
+    queue = FirestoreWriteQueue(db)
+    user = db.collection("users").document("u")
+    ops = [WriteOp(user, {"total": Increment(1), "name": "a"}, merge=True) for _ in range(3)]
+    ops.append(WriteOp(user, {"total": Increment(2), "name": "b"}, merge=True))
+
+    coalesced = queue._coalesce(ops)
+
+    assert len(coalesced) == 1
+    assert coalesced[0].data["total"].value == 5
+    assert coalesced[0].data["name"] == "b"
+    # The queued ops themselves are left untouched
+    assert ops[0].data["total"].value == 1
+
+
+def test_plain_set_breaks_a_merge_run():
+    db = FakeFirestore(latency=0)
+    queue = FirestoreWriteQueue(db)
+    doc = db.collection("sessions").document("s")
+    ops = [
+        WriteOp(doc, {"n": Increment(1)}, merge=True),
+        WriteOp(doc, {"reset": True}),
+        WriteOp(doc, {"n": Increment(1)}, merge=True),
+        WriteOp(doc, {"n": Increment(1)}, merge=True),
+    ]
+
+    coalesced = queue._coalesce(ops)
+
+    assert [op.merge for op in coalesced] == [True, False, True]
+    assert coalesced[2].data["n"].value == 2
+
+
+def test_stop_drains_every_pending_write_in_batches():
+    db = RecordingFirestore()
+
+    async def run():
+        # A flush interval far longer than the test: only the drain can write these
+        queue = FirestoreWriteQueue(db, max_batch_size=50, flush_interval=60)
+        queue.start()
+        messages = db.collection("sessions").document("s").collection("messages")
+        for i in range(120):
+            await queue.add(messages, {"turn": i})
+            await queue.set(db.collection("users").document("u"), {"turns": Increment(1)}, merge=True)
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(run())
+
+    messages = [doc for path, doc in db.docs.items() if "/messages/" in path]
+    assert sorted(doc["turn"] for doc in messages) == list(range(120))
+    assert db.docs["users/u"]["turns"] == 120
+    assert queue.depth == 0
+    assert queue.stats["enqueued"] == 240
+    assert queue.stats["dropped"] == 0
+    assert queue.stats["batches"] == db.commits
+    assert max(db.batch_sizes) <= 50
+    # Merge-sets to the user document that share a batch collapse into one write
+    assert queue.stats["written"] == sum(db.batch_sizes) < 240
+
+
+def test_failed_commits_are_retried():
+    db = FlakyFirestore(failures=2)
+
+    async def run():
+        queue = FirestoreWriteQueue(db, flush_interval=0.01, base_backoff=0.001)
+        queue.start()
+        await queue.set(db.collection("sessions").document("s"), {"mode": "learning"})
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(run())
+
+    assert db.docs["sessions/s"] == {"mode": "learning"}
+    assert queue.stats["retries"] == 2
+    assert queue.stats["dropped"] == 0
+
+
+def test_batch_is_dropped_after_max_retries():
+    db = FlakyFirestore(failures=10)
+
+    async def run():
+        queue = FirestoreWriteQueue(db, flush_interval=0.01, max_retries=2, base_backoff=0.001)
+        queue.start()
+        await queue.set(db.collection("sessions").document("s"), {"mode": "learning"})
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(run())
+
+    assert "sessions/s" not in db.docs
+    assert queue.stats["dropped"] == 1
+
+
+def test_writes_go_straight_through_when_not_running():
+    db = FakeFirestore(latency=0)
+    queue = FirestoreWriteQueue(db)
+
+    asyncio.run(queue.set(db.collection("sessions").document("s"), {"mode": "chat"}))
+
+    assert db.docs["sessions/s"] == {"mode": "chat"}
+    assert queue.stats["enqueued"] == 0
+
+
+def test_full_queue_drops_after_the_enqueue_timeout():
+    db = FakeFirestore(latency=0)
+
+    async def run():
+        queue = FirestoreWriteQueue(db, flush_interval=60, max_pending=2, enqueue_timeout=0.05)
+        queue.start()
+        doc = db.collection("sessions").document("s")
+        for i in range(3):
+            await queue.set(doc, {"i": i})
+        dropped = queue.stats["dropped"]
+        await queue.stop()
+        return queue, dropped
+
+    queue, dropped = asyncio.run(run())
+
+    assert dropped == 1
+    assert db.docs["sessions/s"] == {"i": 1}
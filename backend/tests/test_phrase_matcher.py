@@ -0,0 +1,52 @@
+"""PhraseMatcher must classify exactly like the per-category substring scans it replaced"""
+import pytest
+
+import phrase_matcher
+from phrase_matcher import ATTEMPT, FOLLOW_UP, GENERAL_CHAT, HINT_REQUEST, LEARNING, PhraseMatcher
+from tests.phrase_corpus import CORPUS, LEGACY_CHAT_KEYWORDS, LEGACY_PHRASES, fuzz_messages, legacy_classify
+
+
+def test_phrase_lists_still_match_the_baseline():
+    assert phrase_matcher.CATEGORY_PHRASES == LEGACY_PHRASES
+    assert phrase_matcher.CHAT_KEYWORDS == LEGACY_CHAT_KEYWORDS
+
+
+@pytest.mark.parametrize("message", CORPUS)
+def test_corpus_matches_legacy_scans(message):
+    msg_lower = message.lower().strip()
+    assert phrase_matcher.matcher.classify(msg_lower) == legacy_classify(msg_lower)
+
+
+def test_fuzzed_messages_match_legacy_scans():
+    for message in fuzz_messages(5000, seed=1):
+        msg_lower = message.lower().strip()
+        assert phrase_matcher.matcher.classify(msg_lower) == legacy_classify(msg_lower), msg_lower
+
+
+def test_overlapping_phrases_all_hit():
+    # "give me a hint" contains "hint" and is itself both a follow-up and a hint request
+    assert phrase_matcher.classify("Give me a hint") == {FOLLOW_UP, HINT_REQUEST}
+    assert phrase_matcher.classify("i think, how to explain it") == {ATTEMPT, LEARNING}
+
+
+@pytest.mark.parametrize("message, is_chat", [
+    ("hi", True), ("hi!", True), ("hi there", True), ("  HI  ", True),
+    ("hint", False), ("hiking is fun", False), ("oks", False), ("thankyou", False),
+])
+def test_chat_keywords_only_match_as_first_word(message, is_chat):
+    assert (GENERAL_CHAT in phrase_matcher.classify(message)) is is_chat
+
+
+def test_prefix_categories_are_folded_in():
+    matcher = PhraseMatcher({"short": ["abc"], "long": ["abcdef"]}, [])
+    assert matcher.classify("xxabcdefxx") == {"short", "long"}
+    assert matcher.classify("xxabcxx") == {"short"}
+
+
+@pytest.mark.parametrize("message, topic", [
+    ("How to reverse a linked list", "reverse linked list"),
+    ("explain dynamic programming for knapsack problems", "dynamic programming knapsack"),
+    ("hi", ""),
+])
+def test_extract_topic(message, topic):
+    assert phrase_matcher.extract_topic(message) == topic
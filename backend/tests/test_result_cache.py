@@ -0,0 +1,78 @@
+"""ExecutionResultCache: only runs that repeat exactly are stored and served"""
+import asyncio
+import shutil
+
+import pytest
+
+from executor import ExecutionOutcome
+from interpreter_pool import InterpreterPool
+from result_cache import ExecutionResultCache, is_deterministic
+from workspace import WorkspaceManager
+
+
+def outcome(output):
+    return ExecutionOutcome(output=output, error=None, success=True)
+
+
+@pytest.mark.parametrize("language, code", [
+    ("python", "import random\nprint(random.random())"),
+    ("python", "import os\nprint(os.environ.get('HOME'))"),
+    ("python", "import socket\nprint(socket.gethostname())"),
+    ("python", "print(id(object()))"),
+    ("javascript", "console.log(process.env.HOME)"),
+    ("c", '#include <stdlib.h>\nint main(){puts(getenv("HOME"));}'),
+    ("java", 'class Main { public static void main(String[] a) { System.out.println(System.getenv("HOME")); } }'),
+])
+def test_nondeterministic_programs_are_never_served_from_the_cache(language, code):
+    cache = ExecutionResultCache()
+    # Even with an entry under the program's key, lookup refuses to use it
+    cache.put(cache.key(language, code, None), outcome("stale"), 0.1)
+
+    key, cached = cache.lookup(language, code, None)
+
+    assert (key, cached) == (None, None)
+    assert not is_deterministic(language, code)
+    assert cache.snapshot()["bypassed"] == 1
+
+
+def test_deterministic_programs_are_served_from_the_cache():
+    cache = ExecutionResultCache()
+    code = "print(sum(range(10)))"
+    key, cached = cache.lookup("python", code, "")
+    assert cached is None
+    cache.put(key, outcome("45\n"), 0.1)
+
+    key, cached = cache.lookup("python", code, "")
+
+    assert cached.outcome.output == "45\n"
+    assert cache.snapshot()["hits"] == 1
+
+
+@pytest.mark.parametrize("output", [
+    "<__main__.Node object at 0x7f3a5c2d1e50>\n",
+    "Node@1b6d3586\n",
+    "ptr=0x55d4c3a2b2a0\n",
+])
+def test_output_with_memory_addresses_is_not_stored(output):
+    cache = ExecutionResultCache()
+    key = cache.key("python", "print(Node())", None)
+
+    cache.put(key, outcome(output), 0.1)
+
+    assert cache.get(key) is None
+    assert cache.snapshot()["unstable"] == 1
+
+
+@pytest.mark.skipif(shutil.which("python3") is None, reason="needs python3")
+def test_python_workers_iterate_string_sets_in_the_same_order(tmp_path):
+    code = "print(list({'apple', 'banana', 'cherry', 'date', 'elderberry', 'fig'}))"
+
+    async def run_twice():
+        pool = InterpreterPool("python", size=0, workspaces=WorkspaceManager(str(tmp_path)))
+        results = [await pool.run(code, None, timeout=10) for _ in range(2)]
+        await pool.stop()
+        return [result.stdout for result in results]
+
+    first, second = asyncio.run(run_twice())
+    assert first == second
+    assert "apple" in first
@@ -0,0 +1,86 @@
+"""SessionStore turn recording: ownership, compare-and-set versions and history offsets"""
+import asyncio
+
+import pytest
+
+from sessions import SessionOwnershipError, SessionState, SessionStore, SessionVersionConflict
+
+
+def store(**options):
+    sessions = SessionStore(db=None, **options)
+    # Every session is new; nothing is read from Firestore
+    sessions._load = lambda session_id: SessionState(uid=None)
+    return sessions
+
+
+def record(sessions, text, expected_version=None, history=None, uid="u1", offset=0):
+    return sessions.record_turn(
+        "s1", uid, history or [], text, f"reply to {text}", {}, None,
+        offset=offset, expected_version=expected_version,
+    )
+
+
+def test_interleaved_turns_on_the_same_version_conflict():
+    sessions = store()
+    record(sessions, "start")
+
+    async def turn(text, reads, both_read):
+        session = await sessions.get("s1")
+        version, history = session.version, list(session.history)
+        reads.append(text)
+        if len(reads) == 2:
+            both_read.set()
+        # Stands in for the model call: both turns hold the same snapshot before either records
+        await both_read.wait()
+        return record(sessions, text, version, history)
+
+    async def run():
+        reads, both_read = [], asyncio.Event()
+        return await asyncio.gather(turn("first", reads, both_read), turn("second", reads, both_read),
+                                    return_exceptions=True)
+
+    results = dict(zip(["first", "second"], asyncio.run(run())))
+
+    winners = [text for text, result in results.items() if result == 2]
+    losers = [result for result in results.values() if isinstance(result, SessionVersionConflict)]
+    assert len(winners) == 1 and len(losers) == 1
+    assert losers[0].version == 2
+    # The loser's turn is refused rather than silently dropping the winner's
+    history = [m["text"] for m in sessions.peek("s1").history]
+    assert history == ["start", "reply to start", winners[0], f"reply to {winners[0]}"]
+
+
+def test_recording_on_the_current_version_succeeds():
+    sessions = store()
+    assert record(sessions, "one", expected_version=0) == 1
+    history = sessions.peek("s1").history
+    assert record(sessions, "two", expected_version=1, history=history) == 2
+    assert len(sessions.peek("s1").history) == 4
+
+
+def test_evicted_session_continues_from_the_version_the_turn_saw():
+    sessions = store(max_sessions=1)
+    record(sessions, "one")
+    sessions.record_turn("other", "u2", [], "x", "y", {}, None)
+    assert sessions.peek("s1") is None
+
+    assert record(sessions, "two", expected_version=1) == 2
+
+
+def test_another_users_session_is_not_taken_over():
+    sessions = store()
+    record(sessions, "mine", uid="u1")
+    with pytest.raises(SessionOwnershipError):
+        record(sessions, "theirs", uid="u2")
+    assert sessions.peek("s1").uid == "u1"
+
+
+def test_offset_counts_messages_trimmed_off_the_front():
+    sessions = store(max_history=4)
+    history = []
+    for turn in range(3):
+        record(sessions, f"q{turn}", history=history)
+        history = sessions.peek("s1").history
+    state = sessions.peek("s1")
+    assert [m["text"] for m in state.history] == ["q1", "reply to q1", "q2", "reply to q2"]
+    assert state.offset == 2
@@ -0,0 +1,74 @@
+"""
+Private scratch directories for executed code.
+Every job (and every warm interpreter worker) gets its own directory under a
+memory-backed root, /dev/shm when it is available, so files a program writes
+never touch the container's overlay filesystem and concurrent jobs can't see
+or clobber each other's files. Directories are removed when the job ends;
+leftovers from a crashed process are swept at startup.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "thinkfirst-job-"
+
+# Workspaces older than this belong to a process that died without cleaning up
+STALE_WORKSPACE_SECONDS = 3600
+
+
+def default_root() -> str:
+    """/dev/shm when it's a writable directory, otherwise the system temp dir"""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK | os.X_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+class WorkspaceManager:
+    """Creates and removes per-job directories under one root"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = os.path.abspath(root or default_root())
+        self.stats = {"created": 0, "removed": 0, "active": 0}
+        os.makedirs(self.root, exist_ok=True)
+        self._sweep()
+
+    @classmethod
+    def from_env(cls) -> "WorkspaceManager":
+        """Build a manager from EXEC_WORKSPACE_ROOT (defaults to /dev/shm)"""
+        return cls(os.getenv("EXEC_WORKSPACE_ROOT") or None)
+
+    def _sweep(self) -> None:
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if name.startswith(PREFIX) and now - os.path.getmtime(path) > STALE_WORKSPACE_SECONDS:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+
+    def create(self) -> str:
+        path = tempfile.mkdtemp(prefix=PREFIX, dir=self.root)
+        self.stats["created"] += 1
+        self.stats["active"] += 1
+        return path
+
+    def remove(self, path: str) -> None:
+        shutil.rmtree(path, ignore_errors=True)
+        self.stats["removed"] += 1
+        self.stats["active"] -= 1
+
+    @contextmanager
+    def job(self) -> Iterator[str]:
+        """A fresh directory that is removed however the job ends"""
+        path = self.create()
+        try:
+            yield path
+        finally:
+            self.remove(path)